@@ -0,0 +1,432 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseNotModified,
+    HttpResponsePermanentRedirect,
+    HttpResponseRedirect,
+)
+from django.urls import get_resolver, resolve
+from django.utils.http import parse_http_date_safe
+from wagtail.contrib.redirects.middleware import RedirectMiddleware
+from wagtail.contrib.redirects.models import Redirect
+from wagtail.views import serve as wagtail_serve
+
+from core.redirects import RedirectTable, redirects_version
+from core.routing import current_table, request_table
+from core.storage import COMPRESSIBLE_EXTENSIONS
+from core.versions import bump_version, get_version
+
+# Hashed files never change, so they can be cached forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+mimetypes.add_type("font/woff2", ".woff2")
+
+PRECOMPUTED_VERSION_KEY = "precomputed-responses:version"
+NOT_FOUND_VERSION_KEY = "not-found:version"
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get("If-None-Match")
+    return if_none_match is not None and (
+        if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+    )
+
+
+def accepts_encoding(request, encoding):
+    """
+    Whether the request's Accept-Encoding allows `encoding`, by name or
+    `*`, without a q-value of 0 (e.g. `br;q=0` refuses brotli).
+    """
+    qualities = {}
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        name, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+    return qualities.get(encoding, qualities.get("*", 0.0)) > 0
+
+
+def invalidate_precomputed_responses():
+    """
+    Make every process render its PrecomputedResponseMiddleware responses
+    again on their next request.
+    """
+    bump_version(PRECOMPUTED_VERSION_KEY)
+
+
+def invalidate_not_found():
+    """
+    Make every process forget the paths it's seen 404, e.g. when a page is
+    published at one of them.
+    """
+    bump_version(NOT_FOUND_VERSION_KEY)
+
+
+class StaticFile:
+    __slots__ = ("path", "content_type", "size", "mtime", "etag", "immutable", "encodings")
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.etag = f'"{self.mtime:x}-{self.size:x}"'
+        self.immutable = immutable
+        # Precompressed variants, in order of preference
+        self.encodings = [
+            (encoding, path + suffix, os.path.getsize(path + suffix))
+            for encoding, suffix in (("br", ".br"), ("gzip", ".gz"))
+            if os.path.isfile(path + suffix)
+        ]
+
+
+class StaticFilesMiddleware:
+    """
+    Serve collected static files straight from STATIC_ROOT, before the rest
+    of the middleware stack runs. Uses the .br/.gz variants written by
+    PrecompressedManifestStaticFilesStorage when the client accepts them, and
+    marks hashed files as immutable.
+    """
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.STATIC_ROOT:
+            # runserver serves static files from the finders instead
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.static_url = settings.STATIC_URL
+        self.max_age = getattr(settings, "STATIC_MAX_AGE", 3600)
+        self.files = None
+
+    def load_files(self):
+        root = os.path.realpath(settings.STATIC_ROOT)
+        hashed = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+
+        files = {}
+        for dirpath, _dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith((".gz", ".br")) and os.path.isfile(os.path.join(dirpath, filename[:-3])):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, root).replace(os.sep, "/")
+                # django-compressor names its bundles by content hash too
+                immutable = name in hashed or name.startswith(getattr(settings, "COMPRESS_OUTPUT_DIR", "CACHE") + "/")
+                files[self.static_url + name] = StaticFile(path, immutable)
+        return files
+
+    def __call__(self, request):
+        if request.method not in ("GET", "HEAD") or not request.path_info.startswith(self.static_url):
+            return self.get_response(request)
+
+        if self.files is None:
+            self.files = self.load_files()
+
+        static_file = self.files.get(request.path_info)
+        if static_file is None:
+            return self.get_response(request)
+
+        return self.serve(request, static_file)
+
+    def serve(self, request, static_file):
+        path, size, etag = static_file.path, static_file.size, static_file.etag
+        encoding = None
+        for candidate, encoded_path, encoded_size in static_file.encodings:
+            if accepts_encoding(request, candidate):
+                encoding, path, size = candidate, encoded_path, encoded_size
+                # Each encoding is a different representation, so needs its own ETag
+                etag = f'{etag[:-1]}-{encoding}"'
+                break
+
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if static_file.immutable else f"public, max-age={self.max_age}",
+            "ETag": etag,
+            "Last-Modified": formatdate(static_file.mtime, usegmt=True),
+            "Accept-Ranges": "bytes",
+        }
+        if os.path.splitext(static_file.path)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            headers["Vary"] = "Accept-Encoding"
+
+        if self.not_modified(request, etag, static_file.mtime):
+            return HttpResponseNotModified(headers=headers)
+
+        if encoding:
+            headers["Content-Encoding"] = encoding
+
+        range_header = request.headers.get("Range")
+        if range_header and request.headers.get("If-Range", etag) == etag:
+            match = RANGE_RE.match(range_header.strip())
+            # Multiple or malformed ranges are ignored and the whole file sent
+            if match and match.groups() != ("", ""):
+                return self.serve_range(request, path, size, match.groups(), static_file.content_type, headers)
+
+        headers["Content-Length"] = str(size)
+        if request.method == "HEAD":
+            return HttpResponse(content_type=static_file.content_type, headers=headers)
+        response = FileResponse(open(path, "rb"), content_type=static_file.content_type, headers=headers)
+        # FileResponse would otherwise advertise the .br/.gz filename
+        response.headers.pop("Content-Disposition", None)
+        return response
+
+    def not_modified(self, request, etag, mtime):
+        if "If-None-Match" in request.headers:
+            return etag_matches(request, etag)
+        if_modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+        return if_modified_since is not None and mtime <= if_modified_since
+
+    def serve_range(self, request, path, size, range_spec, content_type, headers):
+        start, end = range_spec
+        if start == "":
+            start, end = max(0, size - int(end)), size - 1
+        else:
+            start, end = int(start), min(int(end) if end else size - 1, size - 1)
+
+        if start >= size or start > end:
+            headers["Content-Range"] = f"bytes */{size}"
+            return HttpResponse(status=416, headers=headers)
+
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        if request.method == "HEAD":
+            return HttpResponse(status=206, content_type=content_type, headers=headers)
+        with open(path, "rb") as f:
+            f.seek(start)
+            content = f.read(end - start + 1)
+        return HttpResponse(content, status=206, content_type=content_type, headers=headers)
+
+
+class PrecomputedResponse:
+    __slots__ = ("content", "gzipped", "content_type", "etag", "cache_control")
+
+    def __init__(self, content, content_type, cache_control):
+        self.content = content
+        self.gzipped = gzip.compress(content, mtime=0)
+        self.content_type = content_type
+        self.etag = f'"{hashlib.sha1(content, usedforsecurity=False).hexdigest()[:20]}"'
+        self.cache_control = cache_control
+
+
+class PrecomputedResponseMiddleware:
+    """
+    Answer the small, frequently polled files in PRECOMPUTED_RESPONSES
+    (robots.txt, the service worker etc) from memory, ahead of the session and
+    auth middleware. Each is rendered once per host by its normal view, and
+    again after invalidate_precomputed_responses(), e.g. when a Site changes.
+    """
+
+    # Hosts come from the request, so don't let them grow without bound
+    max_entries = 100
+
+    def __init__(self, get_response):
+        if settings.DEBUG:
+            # Templates change during development
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.paths = getattr(settings, "PRECOMPUTED_RESPONSES", {})
+        self.responses = {}
+        self.version = None
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        if request.method not in ("GET", "HEAD") or request.path_info not in self.paths:
+            return self.get_response(request)
+
+        version = get_version(PRECOMPUTED_VERSION_KEY)
+        key = (request.get_host(), request.path_info)
+        with self.lock:
+            if version != self.version:
+                self.responses = {}
+                self.version = version
+            precomputed = self.responses.get(key)
+
+        if precomputed is None:
+            precomputed = self.render(request)
+            if precomputed is None:
+                return self.get_response(request)
+            with self.lock:
+                if len(self.responses) >= self.max_entries:
+                    self.responses = {}
+                self.responses[key] = precomputed
+
+        return self.serve(request, precomputed)
+
+    def render(self, request):
+        match = resolve(request.path_info)
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, "render"):
+            response.render()
+        if response.status_code != 200:
+            return None
+        return PrecomputedResponse(
+            response.content,
+            response["Content-Type"],
+            self.paths[request.path_info] or response.get("Cache-Control", "no-cache"),
+        )
+
+    def serve(self, request, precomputed):
+        content, etag = precomputed.content, precomputed.etag
+        headers = {
+            "Cache-Control": precomputed.cache_control,
+            "Vary": "Accept-Encoding",
+            "X-Content-Type-Options": "nosniff",
+        }
+        if accepts_encoding(request, "gzip"):
+            content, etag = precomputed.gzipped, f'{etag[:-1]}-gzip"'
+            headers["Content-Encoding"] = "gzip"
+        headers["ETag"] = etag
+
+        if etag_matches(request, etag):
+            headers.pop("Content-Encoding", None)
+            return HttpResponseNotModified(headers=headers)
+
+        headers["Content-Length"] = str(len(content))
+        if request.method == "HEAD":
+            content = b""
+        return HttpResponse(content, content_type=precomputed.content_type, headers=headers)
+
+
+class RedirectTableMiddleware(RedirectMiddleware):
+    """
+    Wagtail's RedirectMiddleware, looking redirects up in a RedirectTable
+    held in memory rather than querying for every 404. The table's rebuilt
+    after invalidate_redirects(), whichever process made the change.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.table = None
+        self.lock = threading.Lock()
+
+    def get_table(self):
+        version = redirects_version()
+        with self.lock:
+            if self.table is None or self.table.version != version:
+                self.table = RedirectTable.build(version)
+            return self.table
+
+    def process_response(self, request, response):
+        if response.status_code != 404:
+            return response
+
+        table = self.get_table()
+        site_id = table.site_id_for_request(request)
+        path = Redirect.normalise_path(request.get_full_path(), decode_unicode=False)
+        target = table.find(site_id, path)
+        if target is None:
+            path_without_query = urlparse(path).path
+            if path_without_query != path:
+                target = table.find(site_id, path_without_query)
+        if target is None:
+            return response
+
+        link, is_permanent = target
+        if is_permanent:
+            return HttpResponsePermanentRedirect(link)
+        return HttpResponseRedirect(link)
+
+
+class NotFoundCacheMiddleware:
+    """
+    Remember the paths that recently got the 404 page, and answer repeat
+    requests for them with it straight away, skipping the rest of the
+    middleware, Wagtail's routing and the redirect table. Only responses from
+    a handler404 that sets `cacheable_not_found` are remembered.
+    """
+
+    def __init__(self, get_response):
+        if settings.DEBUG:
+            # Django shows its technical 404 page instead of handler404
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.max_entries = getattr(settings, "NOT_FOUND_CACHE_SIZE", 10000)
+        self.missed = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        if request.method not in ("GET", "HEAD"):
+            return self.get_response(request)
+
+        key = (request.get_host(), request.get_full_path())
+        # Only misses pay for checking the version
+        if key in self.missed and self.is_missed(key):
+            response = get_resolver().resolve_error_handler(404)(request, None)
+            # The first miss was logged, don't write a line for every repeat
+            response._has_been_logged = True
+            return response
+
+        response = self.get_response(request)
+        if response.status_code == 404 and getattr(response, "cacheable_not_found", False):
+            self.remember(key)
+        return response
+
+    def check_version(self):
+        version = get_version(NOT_FOUND_VERSION_KEY)
+        if version != self.version:
+            self.missed.clear()
+            self.version = version
+
+    def is_missed(self, key):
+        with self.lock:
+            self.check_version()
+            if key not in self.missed:
+                return False
+            self.missed.move_to_end(key)
+            return True
+
+    def remember(self, key):
+        with self.lock:
+            if self.version is None:
+                self.check_version()
+            self.missed[key] = None
+            self.missed.move_to_end(key)
+            while len(self.missed) > self.max_entries:
+                self.missed.popitem(last=False)
+
+
+class RoutingCacheMiddleware:
+    """
+    Route requests for Wagtail pages from a RoutingTable held in memory,
+    rather than Wagtail walking the page tree with a query per URL segment.
+    Wagtail's serve view then picks the route up from the request as if it
+    had found it itself, and routes as normal whenever the table can't help.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Once per request, page URLs use the same table while rendering
+        with request_table():
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if view_func is not wagtail_serve or hasattr(request, "_wagtail_route_for_request"):
+            return None
+        path = view_args[0] if view_args else view_kwargs.get("path", "")
+        route = current_table().route(request, path)
+        if route is not False:
+            request._wagtail_route_for_request = route
+        return None
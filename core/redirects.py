@@ -0,0 +1,93 @@
+from django.utils.encoding import iri_to_uri, uri_to_iri
+from wagtail.contrib.redirects.models import Redirect
+from wagtail.models import Site
+
+from core.sites import match_site
+from core.versions import bump_version, get_version
+
+VERSION_KEY = "redirects:version"
+
+
+def redirects_version():
+    return get_version(VERSION_KEY)
+
+
+def invalidate_redirects():
+    """
+    Make every process rebuild its RedirectTable on the next 404.
+    """
+    bump_version(VERSION_KEY)
+
+
+def path_variants(old_path):
+    """
+    The other spellings of a stored path a request might normalise to, e.g.
+    for rows written without going through Redirect.normalise_path().
+    """
+    normalised = Redirect.normalise_path(old_path)
+    return [normalised, iri_to_uri(normalised)]
+
+
+class RedirectTable:
+    """
+    Every Redirect, as `{site id: {old path: (link, is permanent)}}`, with
+    `None` for the redirects that apply to all sites, plus what's needed to
+    find a request's site without a query.
+    """
+
+    __slots__ = ("version", "sites", "redirects")
+
+    def __init__(self, version, sites, redirects):
+        self.version = version
+        self.sites = sites
+        self.redirects = redirects
+
+    @classmethod
+    def build(cls, version):
+        sites = list(Site.objects.only("hostname", "port", "is_default_site"))
+
+        exact, variants = {}, {}
+        for redirect in Redirect.objects.select_related("redirect_page").iterator():
+            link = redirect.link
+            if link is None:
+                continue
+            target = (link, redirect.is_permanent)
+            exact.setdefault(redirect.site_id, {})[redirect.old_path] = target
+            for variant in path_variants(redirect.old_path):
+                variants.setdefault(redirect.site_id, {}).setdefault(variant, target)
+
+        # A path stored exactly always beats another redirect's variant of it
+        redirects = {site_id: {**paths, **exact.get(site_id, {})} for site_id, paths in variants.items()}
+        return cls(version, sites, redirects)
+
+    def site_id_for_request(self, request):
+        """
+        The same site Site.find_for_request() would pick.
+        """
+        if hasattr(request, "_wagtail_site"):
+            return request._wagtail_site.pk if request._wagtail_site else None
+
+        site = match_site(self.sites, request)
+        return site.pk if site else None
+
+    def find(self, site_id, path):
+        """
+        `(link, is permanent)` for the redirect from `path` on the site, or
+        None. Like Wagtail's, the percent-decoded path is tried too.
+        """
+        if "\0" in path:
+            return None
+        paths = [path]
+        if (decoded := uri_to_iri(path)) != path:
+            paths.append(decoded)
+
+        if site_id is None:
+            # Without a site, Wagtail looks through every redirect
+            tables = list(self.redirects.values())
+        else:
+            tables = [self.redirects.get(site_id, {}), self.redirects.get(None, {})]
+        for candidate in paths:
+            for table in tables:
+                if candidate in table:
+                    return table[candidate]
+        return None
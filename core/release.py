@@ -0,0 +1,31 @@
+import functools
+import hashlib
+import json
+import os
+
+from compressor.cache import get_offline_manifest
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+
+
+@functools.cache
+def release_version():
+    """
+    A token that changes with each release that changes what pages look
+    like, for the ETags of pages that are otherwise only versioned by their
+    content. It's made from the static files' manifest, which covers every
+    asset's hashed name, the compressed bundles, and the project's
+    templates, and worked out once per process.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(getattr(staticfiles_storage, "manifest_hash", "").encode())
+    digest.update(json.dumps(get_offline_manifest(), sort_keys=True).encode())
+    for directory in settings.TEMPLATES[0]["DIRS"]:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                digest.update(os.path.relpath(path, directory).encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
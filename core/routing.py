@@ -0,0 +1,239 @@
+import contextvars
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from django.contrib.contenttypes.models import ContentType
+from django.http import Http404, HttpRequest
+from django.urls import reverse
+from django.utils.http import RFC3986_SUBDELIMS
+from wagtail.contrib.routable_page.models import RoutablePageMixin
+from wagtail.models import Page, Site
+
+from core.sites import match_site
+from core.versions import bump_version, get_version
+
+VERSION_KEY = "routing:version"
+
+# Seconds the table is used outside a request, e.g. by a task worker,
+# before checking it's still up to date
+CHECK_SECONDS = 1
+
+_lock = threading.Lock()
+_table = None
+_checked = 0.0
+# The table for the request being handled, see request_table()
+_request_table = contextvars.ContextVar("request_table", default=None)
+
+
+def routing_version():
+    return get_version(VERSION_KEY)
+
+
+def get_table():
+    """
+    This process's RoutingTable, rebuilt first if it's out of date.
+    """
+    global _table, _checked
+    version = routing_version()
+    with _lock:
+        if _table is None or _table.version != version:
+            _table = RoutingTable.build(version)
+        _checked = time.monotonic()
+        return _table
+
+
+@contextmanager
+def request_table():
+    """
+    Bring the table up to date and use it for everything in the block,
+    which RoutingCacheMiddleware wraps each request in, so the many page
+    URLs in a render don't each check the version.
+    """
+    token = _request_table.set(get_table())
+    try:
+        yield
+    finally:
+        _request_table.reset(token)
+
+
+def current_table():
+    """
+    The request's table, or outside a request, e.g. in a long running task
+    worker, this process's table, checked at most every CHECK_SECONDS.
+    """
+    table = _request_table.get()
+    if table is not None:
+        return table
+    if _table is None or time.monotonic() - _checked > CHECK_SECONDS:
+        return get_table()
+    return _table
+
+
+def invalidate_routing():
+    """
+    Make every process rebuild its RoutingTable on its next request.
+    """
+    global _table
+    # This process sees its own changes straight away
+    _table = None
+    _request_table.set(None)
+    bump_version(VERSION_KEY)
+
+
+class RoutingTable:
+    """
+    Every live page, as `{site id: {path: (page id, content type id, live
+    revision id)}}`, the path being relative to the site's root page with no
+    leading or trailing slash. The sites are kept too, with their root pages,
+    so a request's site can be found without a query.
+
+    Turned around it gives every live page's URL, see url_parts().
+    `urls_version` only changes when those URLs do, whereas publishing any
+    page changes the version.
+    """
+
+    __slots__ = ("version", "urls_version", "sites", "pages", "url_paths", "serve_prefix", "urls")
+
+    def __init__(self, version, sites, pages, url_paths):
+        self.version = version
+        self.sites = sites
+        self.pages = pages
+        self.url_paths = url_paths
+        self.urls_version = self.hash_urls(sites, url_paths)
+        self.serve_prefix = reverse("wagtail_serve", args=("",))
+        # Page id -> [(site id, root url, page path)] for each site the page
+        # is under, filled in as URLs are asked for
+        self.urls = {}
+
+    @classmethod
+    def build(cls, version):
+        # The order Site.get_site_root_paths() uses, so pages under several
+        # sites get the same one Wagtail would pick
+        sites = list(Site.objects.select_related("root_page").order_by("-root_page__url_path", "-is_default_site"))
+        pages, url_paths = {}, {}
+        for site in sites:
+            root_path = site.root_page.url_path
+            pages[site.pk] = {}
+            for url_path, page_id, content_type_id, revision_id in (
+                Page.objects.live()
+                .descendant_of(site.root_page, inclusive=True)
+                .values_list("url_path", "id", "content_type_id", "live_revision_id")
+                .iterator()
+            ):
+                pages[site.pk][url_path[len(root_path) :].strip("/")] = (page_id, content_type_id, revision_id)
+                url_paths[page_id] = url_path
+        return cls(version, sites, pages, url_paths)
+
+    @staticmethod
+    def hash_urls(sites, url_paths):
+        # The same in every process, unlike hash()
+        digest = hashlib.blake2b(digest_size=8)
+        for site in sites:
+            digest.update(f"{site.pk} {site.root_url} {site.root_page.url_path}\n".encode())
+        for page_id, url_path in sorted(url_paths.items()):
+            digest.update(f"{page_id} {url_path}\n".encode())
+        return digest.hexdigest()
+
+    def url_parts(self, page, request=None):
+        """
+        What Page.get_url_parts() returns for a live page, without working
+        out the site root paths again, or None if the page isn't in the table.
+        """
+        url_path = self.url_paths.get(page.pk)
+        # Unsaved changes to the page, e.g. in a preview, need Wagtail's answer
+        if url_path is None or url_path != page.url_path:
+            return None
+
+        if page.pk not in self.urls:
+            self.urls[page.pk] = [
+                (
+                    site.pk,
+                    site.root_url,
+                    self.serve_prefix
+                    + quote(url_path[len(site.root_page.url_path) :], safe=RFC3986_SUBDELIMS + "/~:@"),
+                )
+                for site in self.sites
+                if url_path.startswith(site.root_page.url_path)
+            ]
+        options = self.urls[page.pk]
+        if not options:
+            return None
+
+        # Like Wagtail, prefer the request's site for pages under more than one
+        if len(options) > 1 and isinstance(request, HttpRequest):
+            site = Site.find_for_request(request)
+            for option in options:
+                if site and option[0] == site.pk:
+                    return option
+        return options[0]
+
+    def find(self, request, path):
+        """
+        `(site, (page id, content type id, live revision id), remaining path
+        components)` for the deepest live page `path` starts with, or None.
+        Like RoutablePageMixin.route(), a routable page's own routes come
+        before its child pages, so it's the one returned if they match.
+        """
+        site = match_site(self.sites, request)
+        if site is None:
+            return None
+        pages = self.pages.get(site.pk, {})
+        components = [component for component in path.split("/") if component]
+        found = None
+        for depth in range(len(components) + 1):
+            entry = pages.get("/".join(components[:depth]))
+            if entry is None:
+                continue
+            found = site, entry, components[depth:]
+            if depth < len(components) and self.has_subpage(entry[1], components[depth:]):
+                break
+        return found
+
+    @staticmethod
+    def has_subpage(content_type_id, components):
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None or not issubclass(model, RoutablePageMixin):
+            return False
+        try:
+            model.get_resolver().resolve("/" + "/".join(components) + "/")
+        except Http404:
+            return False
+        return True
+
+    def route(self, request, path):
+        """
+        What Page.route_for_request() would return for `request`, with a
+        single query to load the page. Returns False when the table can't
+        say, e.g. because the page has changed since it was built.
+        """
+        found = self.find(request, path)
+        if found is None:
+            return False
+        site, (page_id, content_type_id, revision_id), components = found
+
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            return False
+        page = model.objects.filter(pk=page_id).first()
+        if page is None or not page.live or page.live_revision_id != revision_id:
+            return False
+
+        request._wagtail_site = site
+        try:
+            # Routable pages resolve their own sub-URLs without queries
+            return page.route(request, components)
+        except Http404:
+            return None
+
+
+class CachedUrlMixin:
+    """
+    Look the page's URL up in the RoutingTable, which holds every live page's
+    path, rather than resolving the site root paths on every `page.url`.
+    """
+
+    def get_url_parts(self, request=None):
+        return current_table().url_parts(self, request) or super().get_url_parts(request)
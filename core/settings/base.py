@@ -38,12 +38,14 @@ INSTALLED_APPS = [
     "search",
     "users",
     "links",
+    "tasks",
     "wagtailseo",
     "wagtail.contrib.settings",
     "wagtailmenus",
     "wagtail.contrib.forms",
     "wagtail.contrib.redirects",
     "wagtail.contrib.search_promotions",
+    "wagtail.contrib.routable_page",
     "wagtail.contrib.styleguide",
     "wagtail.embeds",
     "wagtail.sites",
@@ -57,6 +59,7 @@ INSTALLED_APPS = [
     "modelcluster",
     "taggit",
     "sass_processor",
+    "compressor",
     "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
@@ -69,6 +72,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.StaticFilesMiddleware",
+    "core.middleware.PrecomputedResponseMiddleware",
+    "core.middleware.NotFoundCacheMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -76,8 +82,9 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "wagtail.contrib.redirects.middleware.RedirectMiddleware",
+    "core.middleware.RedirectTableMiddleware",
     "django_htmx.middleware.HtmxMiddleware",
+    "core.middleware.RoutingCacheMiddleware",
 ]
 
 ROOT_URLCONF = "core.urls"
@@ -173,20 +180,45 @@ SASS_PROCESSOR_INCLUDE_DIRS = [
     os.path.join(PROJECT_DIR, "scss"),
 ]
 
-SASS_PROCESSOR_AUTO_INCLUDE = False
+# main.scss is only referenced from Python (the main_stylesheet tag), and
+# compilescss only looks through Python files with this on
+SASS_PROCESSOR_AUTO_INCLUDE = True
 
 # ManifestStaticFilesStorage is recommended in production, to prevent outdated
 # Javascript / CSS assets being served from cache (e.g. after a Wagtail upgrade).
 # See https://docs.djangoproject.com/en/2.2/ref/contrib/staticfiles/#manifeststaticfilesstorage
+# Ours also writes gzip and brotli versions of each hashed file.
 STORAGES = {
     "default": {
         "BACKEND": "django.core.files.storage.FileSystemStorage",
     },
     "staticfiles": {
-        "BACKEND": "django.contrib.staticfiles.storage.ManifestStaticFilesStorage",
+        "BACKEND": "core.storage.PrecompressedManifestStaticFilesStorage",
     },
+    # Files rewritten in place, like the link directory's data (links.bundle)
+    "overwriting": {
+        "BACKEND": "core.storage.OverwritingFileSystemStorage",
+    },
+    "compressor": {
+        "BACKEND": "core.storage.PrecompressedCompressorFileStorage",
+    },
+}
+
+# Hashed files (and compressor bundles) are served with a far-future, immutable
+# Cache-Control header by StaticFilesMiddleware, anything else gets this max-age
+STATIC_MAX_AGE = 60 * 60
+
+# Rendered once per host and held in memory by PrecomputedResponseMiddleware,
+# with their Cache-Control (None keeps the view's own)
+PRECOMPUTED_RESPONSES = {
+    "/robots.txt": "public, max-age=86400",
+    "/serviceworker.js": None,
+    "/browserconfig.xml": "public, max-age=604800",
 }
 
+# How many recently missed paths NotFoundCacheMiddleware remembers per process
+NOT_FOUND_CACHE_SIZE = 10000
+
 
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 STATIC_URL = "/static/"
@@ -194,6 +226,24 @@ STATIC_URL = "/static/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
 
+# On disk so every worker process shares it. The version tokens that say
+# when cached menus, tables and fragments are out of date (see core.versions)
+# get a cache of their own: FileBasedCache culls a third of its entries at
+# random once it's full, and it mustn't take them with it.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, "cache"),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    "versions": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, "cache", "versions"),
+        # Well above the number of tokens there are, so none are culled
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+
 # Django 6 preperation
 FORMS_URLFIELD_ASSUME_HTTPS = True
 
@@ -211,6 +261,11 @@ WAGTAILADMIN_COMMENTS_ENABLED = False
 # Custom settings
 DATE_FORMAT = "jS F Y"
 
+# Request a page, its ancestors and any directory listings through the WSGI
+# app after it is published, so the first visitor doesn't hit cold caches
+WARMUP_ON_PUBLISH = False
+WARMUP_CONCURRENCY = 4
+
 WAGTAILADMIN_RICH_TEXT_EDITORS = {
     "default": {
         "WIDGET": "wagtail.admin.rich_text.DraftailRichTextArea",
@@ -238,6 +293,18 @@ WAGTAILSEARCH_BACKENDS = {
 
 WAGTAILADMIN_NOTIFICATION_FROM_EMAIL = "hello@digitaloxford.com"
 
+# Slow work is queued and run by `manage.py runtasks`, see tasks/queue.py.
+# Wagtail's own tasks, like updating the search index, go in the same queue.
+TASKS = {
+    "default": {
+        "BACKEND": "tasks.backends.QueueBackend",
+    }
+}
+
+# Emails are sent by a worker, through TASKS_EMAIL_BACKEND
+EMAIL_BACKEND = "tasks.mail.QueuedEmailBackend"
+TASKS_EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+
 # Django-taggit configuration
 TAG_LIMIT = 6
 TAGGIT_CASE_INSENSITIVE = True
@@ -9,6 +9,9 @@ X_FRAME_OPTIONS = "SAMEORIGIN"
 
 ALLOWED_HOSTS = [".digitaloxford.com"]
 
+# Bundles are built at deploy time with `manage.py compress`
+COMPRESS_OFFLINE = True
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -0,0 +1,21 @@
+from django.http.request import split_domain_port
+
+
+def match_site(sites, request):
+    """
+    The site from `sites` that Site.find_for_request() would pick for
+    `request`, following wagtail.models.sites.get_site_for_hostname(), but
+    without a query.
+    """
+    hostname = split_domain_port(request._get_raw_host())[0]
+    port = int(request.get_port())
+    hostname_matches = [site for site in sites if site.hostname == hostname]
+    for site in hostname_matches:
+        if site.port == port:
+            return site
+    for site in hostname_matches:
+        if site.is_default_site:
+            return site
+    if len(hostname_matches) == 1:
+        return hostname_matches[0]
+    return next((site for site in sites if site.is_default_site), None)
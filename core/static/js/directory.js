@@ -0,0 +1,139 @@
+// Filter and render the link directory from the data file served by
+// LinkIndexPage.directory_data, so changing the category doesn't need the
+// server (or a connection). Until the data has loaded, or if it can't be,
+// the form carries on making HTMX requests as before.
+(function () {
+    const form = document.querySelector('form.filter-links[data-directory-url]');
+    if (!form) {
+        return;
+    }
+
+    // Matches links.bundle.FORMAT_VERSION, anything else is left to HTMX
+    const formatVersion = 1;
+    const pageUrl = form.getAttribute('action');
+    // Each category has its own URL, LinkIndexPage.category_route
+    const categoryUrl = form.dataset.categoryUrl;
+    // Links are followed through links.views.go, which counts the clicks.
+    // This is link 0's URL, goUrlFor swaps the id in.
+    const goUrl = form.dataset.goUrl;
+    let directory = null;
+
+    function escapeHtml(value) {
+        return String(value)
+            .replace(/&/g, '&amp;')
+            .replace(/</g, '&lt;')
+            .replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;')
+            .replace(/'/g, '&#x27;');
+    }
+
+    function urlFor(slug) {
+        return slug ? categoryUrl + encodeURIComponent(slug) + '/' : pageUrl;
+    }
+
+    function goUrlFor(id) {
+        return goUrl.replace(/0\/$/, id + '/');
+    }
+
+    function slugFrom(url) {
+        const path = new URL(url, location.href).pathname;
+        return path.startsWith(categoryUrl) ? decodeURIComponent(path.slice(categoryUrl.length).split('/')[0]) : '';
+    }
+
+    // The data is in title order, other sorts are left to HTMX
+    function sorted() {
+        return Boolean(form.elements.sort && form.elements.sort.value);
+    }
+
+    function load(data) {
+        const field = name => data.fields.indexOf(name);
+        const categories = new Map(data.categories.map(([id, slug, name]) => [id, {id, slug, name}]));
+        const bySlug = new Map(data.categories.map(([id, slug]) => [slug, id]));
+        const links = data.links.map(row => ({
+            id: row[field('id')],
+            title: row[field('title')],
+            link: row[field('link')],
+            description: row[field('description')],
+            testimonial: row[field('testimonial')],
+            categories: row[field('categories')].map(id => categories.get(id)).filter(Boolean)
+        }));
+        return {links, bySlug};
+    }
+
+    // Mirrors the links-results partial in links/link_index_page.html
+    function renderLink(link) {
+        let html = '<li class="link"><h2><a href="' + escapeHtml(goUrlFor(link.id)) + '" rel="nofollow">' + escapeHtml(link.title) + '</a></h2>';
+        if (link.categories.length) {
+            html += '<div class="categories"><h3>Categor' + (link.categories.length === 1 ? 'y' : 'ies') + ':</h3>';
+            html += '<ul class="list-reset list-inline">';
+            for (const category of link.categories) {
+                html += '<li><a href="' + escapeHtml(urlFor(category.slug)) + '">' + escapeHtml(category.name) + '</a></li>';
+            }
+            html += '</ul></div>';
+        }
+        html += '<div class="details">';
+        if (link.description) {
+            html += '<p class="description">' + escapeHtml(link.description) + '</p>';
+        }
+        if (link.testimonial) {
+            html += '<blockquote>' + escapeHtml(link.testimonial) + '</blockquote>';
+        }
+        return html + '</div></li>';
+    }
+
+    function render(slug) {
+        const categoryId = directory.bySlug.get(slug);
+        const links = slug ? directory.links.filter(link => link.categories.some(category => category.id === categoryId)) : directory.links;
+        const list = document.querySelector('ul.links');
+        if (list) {
+            list.innerHTML = links.map(renderLink).join('');
+        }
+    }
+
+    function show(slug, push) {
+        const select = form.elements.category;
+        if (select) {
+            select.value = slug;
+        }
+        render(slug);
+        if (push) {
+            history.pushState({category: slug}, '', urlFor(slug));
+        }
+    }
+
+    // htmx:confirm fires before every HTMX request, cancelling it keeps the
+    // request from being made
+    form.addEventListener('htmx:confirm', event => {
+        if (directory && !sorted()) {
+            event.preventDefault();
+            show(form.elements.category ? form.elements.category.value : '', true);
+        }
+    });
+
+    document.addEventListener('click', event => {
+        const anchor = event.target.closest('ul.links .categories a');
+        if (!directory || sorted() || !anchor || event.metaKey || event.ctrlKey || event.shiftKey) {
+            return;
+        }
+        event.preventDefault();
+        show(slugFrom(anchor.href), true);
+        window.scrollTo(0, 0);
+    });
+
+    addEventListener('popstate', () => {
+        if (directory && !new URLSearchParams(location.search).has('sort')) {
+            show(slugFrom(location.href), false);
+        }
+    });
+
+    fetch(form.dataset.directoryUrl, {headers: {'Accept': 'application/json'}})
+        .then(response => response.ok ? response.json() : Promise.reject(response))
+        .then(data => {
+            if (data.format === formatVersion) {
+                directory = load(data);
+            }
+        })
+        .catch(() => {
+            // Leave HTMX in charge
+        });
+})();
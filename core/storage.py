@@ -0,0 +1,99 @@
+import gzip
+import os
+import uuid
+
+from compressor.storage import CompressorFileStorage
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".json", ".map", ".svg", ".txt", ".html", ".xml", ".ico", ".webmanifest"}
+
+# Below this it isn't worth sending Content-Encoding at all
+MIN_COMPRESS_SIZE = 256
+
+
+def write_compressed_variants(path):
+    """
+    Write .gz and (if the brotli package is installed) .br files alongside
+    `path`, skipping any variant that wouldn't be smaller than the original.
+    """
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return []
+
+    with open(path, "rb") as f:
+        content = f.read()
+    if len(content) < MIN_COMPRESS_SIZE:
+        return []
+
+    variants = [(".gz", gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", brotli.compress(content, quality=11)))
+
+    written = []
+    for suffix, compressed in variants:
+        if len(compressed) >= len(content):
+            continue
+        with open(path + suffix, "wb") as f:
+            f.write(compressed)
+        written.append(path + suffix)
+    return written
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also writes gzip and brotli versions of
+    every hashed file during collectstatic, for StaticFilesMiddleware to serve.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not dry_run and not isinstance(processed, Exception):
+                write_compressed_variants(self.path(hashed_name))
+            yield name, hashed_name, processed
+
+
+class PrecompressedCompressorFileStorage(CompressorFileStorage):
+    """
+    Storage for django-compressor's bundles, written at `compress` time with
+    gzip and brotli versions alongside.
+    """
+
+    def save(self, filename, content):
+        filename = super().save(filename, content)
+        write_compressed_variants(self.path(filename))
+        return filename
+
+
+class OverwritingFileSystemStorage(FileSystemStorage):
+    """
+    FileSystemStorage that replaces a file when it's saved again, rather
+    than saving under a new name. The new content is written to a temporary
+    file alongside and renamed over the old one, so readers always see a
+    whole file, and of two processes saving at once the last one wins.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        temp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(temp_path, "xb") as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return name
@@ -1,42 +1,61 @@
-const version = 'V1.6';
-const staticCacheName = version + '-staticfiles';
+// Generated by home.views.ServiceWorkerView, the version changes whenever
+// collectstatic produces a new static files manifest.
+const version = '{{ version }}';
+const precacheName = 'precache-' + version;
+const pagesCacheName = 'pages';
+const partialsCacheName = 'partials';
+const staticCacheName = 'static';
+const dataCacheName = 'data';
+
+const precacheUrls = {{ precache_urls|safe }};
+const offlineUrl = {{ offline_url|safe }};
+const staticUrl = {{ static_url|safe }};
+// The link directory data files, so the directory can be filtered offline
+const dataUrls = {{ data_urls|safe }};
+// The admin is never cached
+const excludedPaths = {{ excluded_paths|safe }};
+
+// How long to wait for the network before falling back to a cached page
+const networkTimeout = 3000;
+
+// Maximum number of entries in each runtime cache
+const cacheLimits = {
+    [pagesCacheName]: 50,
+    [partialsCacheName]: 50,
+    [staticCacheName]: 100,
+    [dataCacheName]: 10
+};
+
+// Hashed by ManifestStaticFilesStorage or django-compressor, so never change
+const hashedStaticFile = /\.[0-9a-f]{12}\.[a-z0-9]+$/;
 
 // Install event
 addEventListener('install', installEvent => {
-    console.log('The service worker is installing...');
     skipWaiting(); // Take over as soon as installed, don't wait for a restart.
     installEvent.waitUntil(
-        // Cache files
-        caches.open(staticCacheName)
-        .then(staticCache => {
-            // Nice to haves (don't block installation)
-            staticCache.addAll([
-                '/static/img/logo-do-white.png',
-                '/static/img/oxford-radcliffe-camera-w1200h675.jpg'
-            ]);
-            // Must-haves return immeadiately
-            return staticCache.addAll([
-                '/static/css/main.css',
-                '/static/offline.html'
-            ]);
-        })
-        .catch(error => {
-            // Not much we can do here, but I'll leave it in for learning about
-            // Promise structure.
-        })
+        caches.open(precacheName)
+        .then(precache => precache.addAll(precacheUrls))
+        .then(() => caches.open(dataCacheName))
+        // The data files change with every publish, so they're runtime
+        // cached, a failure here shouldn't stop the install
+        .then(dataCache => dataCache.addAll(dataUrls).catch(() => {}))
     );
 });
 
 // Activate event
 addEventListener('activate', activateEvent => {
-    console.log('The service worker is activated.');
     activateEvent.waitUntil(
         caches.keys()
         .then(cacheNames => {
             return Promise.all(
                 cacheNames.map(cacheName => {
-                    if (cacheName != staticCacheName) {
-                        // Delete old caches
+                    // Only the precache is versioned, the runtime caches
+                    // survive an update and are kept in check by trimCache()
+                    if (cacheName.startsWith('precache-') && cacheName != precacheName) {
+                        return caches.delete(cacheName);
+                    }
+                    if (!cacheName.startsWith('precache-') && !(cacheName in cacheLimits)) {
+                        // Caches from older versions of this service worker
                         return caches.delete(cacheName);
                     }
                 })
@@ -49,21 +68,133 @@ addEventListener('activate', activateEvent => {
     );
 });
 
-addEventListener('fetch', fetchEvent => {
-    const request = fetchEvent.request;
-    fetchEvent.respondWith(
-        caches.match(request)
-        .then(responseFromCache => {
-            // If we get a cache hit and it's not null, return the cached version
-            if (responseFromCache) {
-                return responseFromCache;
+// Evict the least recently used entries, cache.keys() returns entries in
+// insertion order and touch() re-inserts an entry whenever it's used
+function trimCache(cacheName) {
+    return caches.open(cacheName)
+    .then(cache => {
+        return cache.keys()
+        .then(keys => {
+            const excess = keys.length - cacheLimits[cacheName];
+            return Promise.all(keys.slice(0, Math.max(0, excess)).map(key => cache.delete(key)));
+        });
+    });
+}
+
+function store(cacheName, request, response) {
+    if (!response || !response.ok) {
+        return Promise.resolve();
+    }
+    return caches.open(cacheName)
+    .then(cache => cache.delete(request).then(() => cache.put(request, response)))
+    .then(() => trimCache(cacheName));
+}
+
+function touch(cacheName, request, response) {
+    return store(cacheName, request, response.clone());
+}
+
+function fromCache(cacheName, request) {
+    return caches.open(cacheName).then(cache => cache.match(request));
+}
+
+// HTML: try the network first so pages are never stale, but don't keep
+// people waiting on a bad connection
+function networkFirst(fetchEvent, request) {
+    return new Promise(resolve => {
+        let settled = false;
+        const fallback = () => {
+            if (settled) {
+                return;
+            }
+            fromCache(pagesCacheName, request)
+            .then(cached => {
+                if (cached) {
+                    settled = true;
+                    resolve(cached);
+                }
+            });
+        };
+        const timer = setTimeout(fallback, networkTimeout);
+
+        fetch(request)
+        .then(response => {
+            clearTimeout(timer);
+            fetchEvent.waitUntil(store(pagesCacheName, request, response.clone()));
+            if (!settled) {
+                settled = true;
+                resolve(response);
+            }
+        })
+        .catch(() => {
+            clearTimeout(timer);
+            fromCache(pagesCacheName, request)
+            .then(cached => cached || caches.match(offlineUrl))
+            .then(response => {
+                if (!settled) {
+                    settled = true;
+                    resolve(response);
+                }
+            });
+        });
+    });
+}
+
+// Directory partials and data: answer from the cache straight away and
+// refresh it in the background
+function staleWhileRevalidate(fetchEvent, request, cacheName) {
+    const network = fetch(request)
+    .then(response => {
+        fetchEvent.waitUntil(store(cacheName, request, response.clone()));
+        return response;
+    });
+    return fromCache(cacheName, request)
+    .then(cached => {
+        if (cached) {
+            fetchEvent.waitUntil(network.catch(() => {}));
+            return cached;
+        }
+        return network;
+    });
+}
+
+// Hashed static files never change, so the cache is always right
+function cacheFirst(fetchEvent, request) {
+    return fromCache(precacheName, request)
+    .then(precached => precached || fromCache(staticCacheName, request)
+        .then(cached => {
+            if (cached) {
+                fetchEvent.waitUntil(touch(staticCacheName, request, cached));
+                return cached;
             }
-            // Else fetch from the network
             return fetch(request)
-            .catch(error => {
-                // But if it barfs, we're offline
-                return caches.match('/static/offline.html');
+            .then(response => {
+                fetchEvent.waitUntil(store(staticCacheName, request, response.clone()));
+                return response;
             });
         })
     );
+}
+
+addEventListener('fetch', fetchEvent => {
+    const request = fetchEvent.request;
+    const url = new URL(request.url);
+
+    if (request.method !== 'GET' || url.origin !== location.origin) {
+        return;
+    }
+    if (excludedPaths.some(path => url.pathname.startsWith(path))) {
+        return;
+    }
+
+    if (request.headers.get('HX-Request')) {
+        fetchEvent.respondWith(staleWhileRevalidate(fetchEvent, request, partialsCacheName));
+    } else if (dataUrls.includes(url.pathname)) {
+        fetchEvent.respondWith(staleWhileRevalidate(fetchEvent, request, dataCacheName));
+    } else if (request.mode === 'navigate' || (request.headers.get('Accept') || '').includes('text/html')) {
+        fetchEvent.respondWith(networkFirst(fetchEvent, request));
+    } else if (url.pathname.startsWith(staticUrl) && hashedStaticFile.test(url.pathname)) {
+        fetchEvent.respondWith(cacheFirst(fetchEvent, request));
+    }
+    // Anything else goes straight to the network
 });
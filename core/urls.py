@@ -6,7 +6,8 @@ from wagtail import urls as wagtail_urls
 from wagtail.admin import urls as wagtailadmin_urls
 from wagtail.documents import urls as wagtaildocs_urls
 
-from home.views import RobotsView
+from home.views import RobotsView, ServiceWorkerView, sitemap
+from links import views as links_views
 from search import views as search_views
 
 urlpatterns = [
@@ -14,18 +15,12 @@ urlpatterns = [
     path("spires/", include(wagtailadmin_urls)),
     path("documents/", include(wagtaildocs_urls)),
     path("search/", search_views.search, name="search"),
+    path("go/<int:link_id>/", links_views.go, name="link_go"),
     path("robots.txt", RobotsView.as_view()),
+    path("sitemap.xml", sitemap, name="sitemap"),
+    path("sitemap-<str:section>.xml", sitemap, name="sitemap_section"),
     # Service worker
-    path(
-        r"serviceworker.js",
-        (
-            TemplateView.as_view(
-                template_name="serviceworker.js",
-                content_type="application/javascript",
-            )
-        ),
-        name="serviceworker.js",
-    ),
+    path(r"serviceworker.js", ServiceWorkerView.as_view(), name="serviceworker.js"),
     # Microsoft Tile config
     path(
         r"browserconfig.xml",
@@ -46,6 +41,7 @@ urlpatterns = [
     #    url(r'^pages/', include(wagtail_urls)),
 ]
 
+handler404 = "home.views.page_not_found"
 
 if settings.DEBUG:
     from django.conf.urls.static import static
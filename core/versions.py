@@ -0,0 +1,35 @@
+import time
+
+from django.core.cache import caches
+
+# Version tokens are kept in a cache of their own, see CACHES, which holds
+# nothing else and so never fills up and culls them
+VERSIONS_CACHE = "versions"
+
+
+def get_versions(*names):
+    """
+    The current version token for each of `names`, as `{name: token}`. A
+    name without one is given one, the same one whichever process gets there
+    first.
+    """
+    versions_cache = caches[VERSIONS_CACHE]
+    versions = versions_cache.get_many(names)
+    for name in names:
+        if name not in versions:
+            token = time.time_ns()
+            versions[name] = token if versions_cache.add(name, token, None) else versions_cache.get(name, token)
+    return versions
+
+
+def get_version(name):
+    return get_versions(name)[name]
+
+
+def bump_version(*names):
+    """
+    Give each of `names` a new version token, so whatever was cached or
+    built under the old one is out of date. Tokens are the time, rather than
+    a count, so a lost token can't come back as one that's been used before.
+    """
+    caches[VERSIONS_CACHE].set_many(dict.fromkeys(names, time.time_ns()), None)
@@ -0,0 +1,126 @@
+import re
+from html.parser import HTMLParser
+
+# Pseudo-classes/elements and attribute selectors don't change whether an
+# element is on the page, so they're ignored when matching
+IGNORED_SELECTOR_PARTS_RE = re.compile(r"::?[\w-]+(\([^)]*\))?|\[[^\]]*\]")
+COMBINATOR_RE = re.compile(r"\s*[>+~]\s*|\s+")
+TAG_RE = re.compile(r"^[a-zA-Z][\w-]*")
+CLASS_RE = re.compile(r"\.([\w-]+)")
+ID_RE = re.compile(r"#([\w-]+)")
+COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+
+# At-rules we keep whole, whatever the page contains
+KEEP_AT_RULES = ("@font-face", "@keyframes", "@charset", "@import")
+
+
+class FoldParser(HTMLParser):
+    """
+    Collect the tag names, classes and ids of the first `max_elements`
+    elements in the body, as a rough approximation of what's above the fold.
+    """
+
+    def __init__(self, max_elements):
+        super().__init__()
+        self.max_elements = max_elements
+        self.count = 0
+        self.in_body = False
+        self.tags = {"html", "body"}
+        self.classes = set()
+        self.ids = set()
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "body":
+            self.in_body = True
+        if not self.in_body or self.count >= self.max_elements:
+            return
+        self.count += 1
+        self.tags.add(tag)
+        for name, value in attrs:
+            if name == "class" and value:
+                self.classes.update(value.split())
+            elif name == "id" and value:
+                self.ids.add(value)
+
+
+def fold_selectors(html, max_elements=80):
+    parser = FoldParser(max_elements)
+    parser.feed(html)
+    return parser.tags, parser.classes, parser.ids
+
+
+def selector_matches(selector, tags, classes, ids):
+    selector = IGNORED_SELECTOR_PARTS_RE.sub("", selector).strip()
+    for compound in COMBINATOR_RE.split(selector):
+        if not compound or compound == "*":
+            continue
+        tag = TAG_RE.match(compound)
+        if tag and tag.group().lower() not in tags:
+            return False
+        if not set(CLASS_RE.findall(compound)) <= classes:
+            return False
+        if not set(ID_RE.findall(compound)) <= ids:
+            return False
+    return True
+
+
+def find_block_end(css, start):
+    """
+    Return the index just after the `}` closing the block opened at `start`.
+    """
+    depth = 0
+    quote = None
+    for i in range(start, len(css)):
+        char = css[i]
+        if quote:
+            if char == quote and css[i - 1] != "\\":
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return len(css)
+
+
+def extract_critical_css(css, tags, classes, ids):
+    """
+    Return the rules from `css` (as compiled with libsass's compressed style)
+    that could apply to an element with the given tags, classes and ids.
+    """
+    css = COMMENT_RE.sub("", css)
+    output = []
+    position = 0
+    while position < len(css):
+        brace = css.find("{", position)
+        semicolon = css.find(";", position)
+        if brace == -1:
+            break
+
+        prelude = css[position:brace].strip()
+        if prelude.startswith("@") and semicolon != -1 and semicolon < brace:
+            # A statement at-rule like @charset or @import
+            output.append(css[position : semicolon + 1].strip())
+            position = semicolon + 1
+            continue
+
+        end = find_block_end(css, brace)
+        body = css[brace + 1 : end - 1]
+        if prelude.startswith(KEEP_AT_RULES):
+            output.append(css[position:end].strip())
+        elif prelude.startswith("@"):
+            # @media, @supports etc, keep whichever nested rules match
+            nested = extract_critical_css(body, tags, classes, ids)
+            if nested:
+                output.append(f"{prelude}{{{nested}}}")
+        else:
+            selectors = [s.strip() for s in prelude.split(",")]
+            matching = [s for s in selectors if selector_matches(s, tags, classes, ids)]
+            if matching:
+                output.append(f"{','.join(matching)}{{{body}}}")
+        position = end
+
+    return "".join(output)
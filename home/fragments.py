@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+# Seconds a rendered fragment is kept after it was last rendered
+CACHE_SECONDS = getattr(settings, "FRAGMENT_CACHE_SECONDS", 60 * 60 * 24)
+
+
+def cached_fragment(key, token, render):
+    """
+    The HTML `render()` returns, from the cache when it was last rendered
+    under the same `token`, which should change whenever the HTML could.
+
+    The token is stored with the HTML rather than in the key, so each
+    render replaces the out of date copy instead of leaving it in the cache.
+    """
+    cached = cache.get(key)
+    if cached is not None and cached[0] == token:
+        return mark_safe(cached[1])
+    html = str(render())
+    cache.set(key, (token, html), CACHE_SECONDS)
+    return mark_safe(html)
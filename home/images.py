@@ -0,0 +1,119 @@
+from dataclasses import dataclass
+
+from wagtail.models import Page
+
+from tasks.queue import task
+
+# Modern formats, best first, the browser picks the first <source> it supports
+SOURCE_FORMATS = [("avif", "image/avif"), ("webp", "image/webp")]
+
+
+@dataclass(frozen=True)
+class RenditionPolicy:
+    """
+    The widths (and crop) an image is rendered at wherever it's used in a
+    particular slot, and the `sizes` attribute describing how wide that slot is.
+    """
+
+    operation: str
+    widths: tuple = ()
+    sizes: str = "100vw"
+    # Social networks don't all understand AVIF or WebP, so og:image only
+    # gets the fallback format
+    formats: tuple = tuple(name for name, _ in SOURCE_FORMATS)
+
+    def filter_spec(self, width, image_format=None):
+        spec = self.operation.format(width=width)
+        if image_format:
+            spec += f"|format-{image_format}"
+        return spec
+
+    def filter_specs(self, image):
+        specs = []
+        for width in self.widths_for(image):
+            specs.append(self.filter_spec(width))
+            specs += [self.filter_spec(width, image_format) for image_format in self.formats]
+        return specs
+
+    def widths_for(self, image):
+        # Renditions are never upscaled, so anything wider than the original
+        # is replaced by the original's width
+        widths = [width for width in self.widths if width < image.width]
+        if len(widths) < len(self.widths):
+            widths.append(image.width)
+        return widths
+
+
+POLICIES = {
+    "banner": RenditionPolicy("width-{width}", (480, 800, 1200, 1600), "100vw"),
+    "link": RenditionPolicy("fill-{width}x{width}", (320, 480, 800), "(min-width: 768px) 80ch, calc(100vw - 60px)"),
+    "og": RenditionPolicy("width-{width}", (1200,), formats=()),
+}
+
+# The image fields on our pages, and the policy for the slot each is shown in
+PAGE_IMAGE_FIELDS = {
+    "banner_image": "banner",
+    "link_image": "link",
+    "og_image": "og",
+}
+
+
+def get_renditions(image, policy_name):
+    """
+    Return `{format: [(width, rendition), ...]}` for `image` under the named
+    policy, `None` being the fallback format. Missing renditions are created.
+    """
+    policy = POLICIES[policy_name]
+    renditions = image.get_renditions(*policy.filter_specs(image))
+
+    sources = {}
+    for image_format in [None, *policy.formats]:
+        seen = set()
+        for width in policy.widths_for(image):
+            rendition = renditions[policy.filter_spec(width, image_format)]
+            # Small originals produce the same rendition for several widths
+            if rendition.width not in seen:
+                seen.add(rendition.width)
+                sources.setdefault(image_format, []).append((rendition.width, rendition))
+    return sources
+
+
+def og_rendition(image):
+    """
+    The rendition for og:image and twitter:image, pregenerated with the rest.
+    """
+    return get_renditions(image, "og")[None][-1][1]
+
+
+def page_images(page):
+    """
+    The (image, policy name) pairs shown on `page`.
+    """
+    images = []
+    for field_name, policy_name in PAGE_IMAGE_FIELDS.items():
+        image = getattr(page, field_name, None)
+        if image is not None:
+            images.append((image, policy_name))
+    return images
+
+
+def pregenerate_renditions(image, policy_name):
+    if image.is_svg():
+        return 0
+    return sum(len(renditions) for renditions in get_renditions(image, policy_name).values())
+
+
+def pregenerate_page_renditions(page):
+    for image, policy_name in page_images(page):
+        pregenerate_renditions(image, policy_name)
+
+
+@task(priority=-5, dedupe_key=lambda page_id: f"renditions:{page_id}")
+def pregenerate_renditions_for_page(page_id):
+    page = Page.objects.filter(pk=page_id).first()
+    if page is not None:
+        pregenerate_page_renditions(page.specific)
+
+
+def pregenerate_page_renditions_in_background(page):
+    pregenerate_renditions_for_page.enqueue(page.pk)
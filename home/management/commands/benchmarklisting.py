@@ -0,0 +1,77 @@
+import gc
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from links.listing import link_rows_queryset, to_link_rows
+from links.models import LinkIndexPage, LinkPage, LinkPageCategory
+
+
+def model_listing(index_page):
+    """
+    How the directory used to load its links, full LinkPages with their
+    categories prefetched.
+    """
+    links = list(
+        LinkPage.objects.descendant_of(index_page)
+        .live()
+        .order_by("title")
+        .prefetch_related(
+            Prefetch(
+                "categories",
+                queryset=LinkPageCategory.objects.select_related("link_category"),
+                to_attr="prefetched_categories",
+            )
+        )[:1000]
+    )
+    return links, sum(len(link.prefetched_categories) for link in links)
+
+
+def row_listing(index_page):
+    links = to_link_rows(link_rows_queryset(LinkPage.objects.descendant_of(index_page).live().order_by("title"))[:1000])
+    return links, sum(len(link.categories) for link in links)
+
+
+def measure(listing, index_page, repeat):
+    gc.collect()
+    collections = sum(stat["collections"] for stat in gc.get_stats())
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        links, categories = listing(index_page)
+        # Hold on to the results like a render would, then let them go
+        del links
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    collections = sum(stat["collections"] for stat in gc.get_stats()) - collections
+    return peak, elapsed / repeat, collections, categories
+
+
+class Command(BaseCommand):
+    help = "Compare the memory, time and GC runs of loading the directory as LinkPages and as LinkRows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="How many times to load each listing")
+
+    def handle(self, *args, **options):
+        index_page = LinkIndexPage.objects.live().first()
+        if index_page is None:
+            raise CommandError("There's no live link directory to load")
+
+        results = {}
+        for name, listing in (("LinkPage", model_listing), ("LinkRow", row_listing)):
+            peak, elapsed, collections, categories = measure(listing, index_page, options["repeat"])
+            results[name] = peak
+            self.stdout.write(
+                f"{name:<8} peak {peak / 1024:8.1f} KiB  {elapsed * 1000:7.1f} ms per load"
+                f"  {collections} GC runs  {categories} categories"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"LinkRows use {results['LinkPage'] / max(results['LinkRow'], 1):.1f}x less memory at peak"
+            )
+        )
@@ -0,0 +1,68 @@
+import os
+
+import sass
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from wagtail.models import Site
+
+from home.critical_css import extract_critical_css, fold_selectors
+from home.wsgi_client import WSGIClient, get_application
+from links.models import LinkIndexPage
+
+
+def critical_pages(site):
+    """
+    The representative page to render for each set of critical CSS, the name
+    is what templates pass to `{% main_stylesheet critical=... %}`.
+    """
+    pages = {"base": reverse("search"), "home": site.root_page.url}
+    index_page = LinkIndexPage.objects.live().descendant_of(site.root_page).first()
+    if index_page:
+        pages["links"] = index_page.relative_url(site)
+    return pages
+
+
+class Command(BaseCommand):
+    help = "Extract the CSS needed to render the top of each page type, for inlining in the <head>"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fold-elements",
+            type=int,
+            default=80,
+            help="How many elements from the top of the body count as above the fold",
+        )
+        parser.add_argument(
+            "--output-dir",
+            default=os.path.join(settings.PROJECT_DIR, "static", "css", "critical"),
+        )
+
+    def handle(self, *args, **options):
+        source = finders.find("main.scss")
+        if source is None:
+            raise CommandError("Couldn't find main.scss")
+        css = sass.compile(
+            filename=source,
+            include_paths=[str(path) for path in settings.SASS_PROCESSOR_INCLUDE_DIRS],
+            output_style="compressed",
+        )
+
+        site = Site.objects.filter(is_default_site=True).select_related("root_page").first()
+        if site is None:
+            raise CommandError("There's no default site to render pages from")
+
+        client = WSGIClient(get_application(), host=site.hostname, port=site.port)
+        os.makedirs(options["output_dir"], exist_ok=True)
+
+        for name, url in critical_pages(site).items():
+            result = client.get(url)
+            if result.status != 200:
+                raise CommandError(f"Rendering {url} for '{name}' returned {result.status}")
+
+            tags, classes, ids = fold_selectors(result.content.decode(), options["fold_elements"])
+            critical = extract_critical_css(css, tags, classes, ids)
+            with open(os.path.join(options["output_dir"], f"{name}.css"), "w") as f:
+                f.write(critical)
+            self.stdout.write(f"{name}: {len(critical) / 1024:.1f}KB of {len(css) / 1024:.1f}KB from {url}")
@@ -0,0 +1,160 @@
+import json
+import os
+import re
+import tempfile
+import urllib.request
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import slugify
+
+DEFAULT_FONTS = ["Montserrat:400", "PT Sans:400"]
+
+# Basic Latin, Latin-1 Supplement and the typographic punctuation editors
+# tend to paste in: dashes, curly quotes, ellipsis, bullet, euro, trade mark
+UNICODE_RANGES = [(0x20, 0x7E), (0xA0, 0xFF), (0x2013, 0x2014), (0x2018, 0x201E), (0x2022, 0x2022), (0x2026, 0x2026)]
+EXTRA_CODEPOINTS = [0x20AC, 0x2122]
+
+GOOGLE_FONTS_CSS_URL = "https://fonts.googleapis.com/css"
+FONT_URL_RE = re.compile(r"url\((https://fonts\.gstatic\.com/[^)]+)\)")
+
+
+def parse_font(value):
+    """
+    Parse `Family:weight[=path]`, e.g. `PT Sans:400` or `Montserrat:400=fonts/Montserrat-Regular.ttf`.
+    """
+    spec, _, path = value.partition("=")
+    family, _, weight = spec.partition(":")
+    if not family or not weight.isdigit():
+        raise CommandError(f"Invalid font '{value}', use Family:weight or Family:weight=path")
+    return family.strip(), int(weight), path or None
+
+
+def template_codepoints():
+    codepoints = set()
+    for template_dir in settings.TEMPLATES[0]["DIRS"]:
+        for path in Path(template_dir).rglob("*.html"):
+            codepoints.update(ord(char) for char in path.read_text(encoding="utf-8") if ord(char) >= 0x20)
+    return codepoints
+
+
+def unicode_range(codepoints):
+    ranges = []
+    for codepoint in sorted(codepoints):
+        if ranges and codepoint == ranges[-1][1] + 1:
+            ranges[-1][1] = codepoint
+        else:
+            ranges.append([codepoint, codepoint])
+    return ", ".join(f"U+{start:X}" if start == end else f"U+{start:X}-{end:X}" for start, end in ranges)
+
+
+def download_font(family, weight, directory):
+    # Without a browser User-Agent Google Fonts serves the full TrueType file,
+    # which is what we want to subset from
+    query = urlencode({"family": f"{family}:{weight}"})
+    with urllib.request.urlopen(f"{GOOGLE_FONTS_CSS_URL}?{query}", timeout=30) as response:
+        css = response.read().decode()
+    match = FONT_URL_RE.search(css)
+    if not match:
+        raise CommandError(f"Couldn't find a font file for {family} {weight} on Google Fonts")
+    path = os.path.join(directory, f"{slugify(family)}-{weight}.ttf")
+    urllib.request.urlretrieve(match[1], path)
+    return path
+
+
+class Command(BaseCommand):
+    help = "Download or read font files, subset them to the glyphs we use and write self-hosted woff2 files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--font",
+            action="append",
+            dest="fonts",
+            help="Family:weight[=path to a local font file], can be given more than once. "
+            f"Fonts without a path are downloaded from Google Fonts. Defaults to {', '.join(DEFAULT_FONTS)}",
+        )
+        parser.add_argument("--text", default="", help="Extra characters to keep in the subset")
+        parser.add_argument(
+            "--output-dir",
+            default=os.path.join(settings.PROJECT_DIR, "static", "fonts"),
+            help="Where to write the woff2 files and fonts.json",
+        )
+        parser.add_argument(
+            "--scss",
+            default=os.path.join(settings.PROJECT_DIR, "scss", "base", "_fonts.scss"),
+            help="Where to write the generated @font-face rules",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from fontTools import subset
+            from fontTools.ttLib import TTFont
+        except ImportError:
+            raise CommandError("buildfonts needs fonttools, install requirements/requirements-dev.txt")
+
+        fonts = [parse_font(value) for value in options["fonts"] or DEFAULT_FONTS]
+
+        codepoints = {c for start, end in UNICODE_RANGES for c in range(start, end + 1)}
+        codepoints.update(EXTRA_CODEPOINTS)
+        codepoints.update(template_codepoints())
+        codepoints.update(ord(char) for char in options["text"])
+
+        output_dir = options["output_dir"]
+        os.makedirs(output_dir, exist_ok=True)
+
+        subset_options = subset.Options()
+        subset_options.flavor = "woff2"
+        subset_options.layout_features = ["kern", "liga", "calt"]
+        subset_options.name_IDs = []
+
+        manifest = []
+        with tempfile.TemporaryDirectory() as download_dir:
+            for family, weight, path in fonts:
+                if path is None:
+                    self.stdout.write(f"Downloading {family} {weight}")
+                    path = download_font(family, weight, download_dir)
+
+                font = TTFont(path)
+                subsetter = subset.Subsetter(options=subset_options)
+                subsetter.populate(unicodes=codepoints)
+                subsetter.subset(font)
+                font.flavor = "woff2"
+
+                filename = f"{slugify(family)}-{weight}.woff2"
+                font.save(os.path.join(output_dir, filename))
+                size = os.path.getsize(os.path.join(output_dir, filename))
+                self.stdout.write(f"Wrote {filename} ({size / 1024:.1f}KB, from {os.path.getsize(path) / 1024:.1f}KB)")
+
+                # Only keep the codepoints the font actually has glyphs for
+                supported = codepoints & set(font.getBestCmap())
+                manifest.append(
+                    {
+                        "family": family,
+                        "weight": weight,
+                        "style": "normal",
+                        "file": f"fonts/{filename}",
+                        "unicode_range": unicode_range(supported),
+                    }
+                )
+
+        with open(os.path.join(output_dir, "fonts.json"), "w") as f:
+            json.dump(manifest, f, indent=4)
+            f.write("\n")
+
+        with open(options["scss"], "w") as f:
+            f.write("// Generated by `manage.py buildfonts`, don't edit by hand\n")
+            for font in manifest:
+                f.write(
+                    "\n@font-face {\n"
+                    f'    font-family: "{font["family"]}";\n'
+                    f"    font-style: {font['style']};\n"
+                    f"    font-weight: {font['weight']};\n"
+                    "    font-display: swap;\n"
+                    f'    src: url("{font["file"]}") format("woff2");\n'
+                    f"    unicode-range: {font['unicode_range']};\n"
+                    "}\n"
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(manifest)} fonts, run compilescss to rebuild the stylesheet"))
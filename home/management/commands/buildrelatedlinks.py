@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from links.related import update_related_links
+
+
+class Command(BaseCommand):
+    help = "Work out each link's related links, for the links published since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Redo every link, not just those published since")
+
+    def handle(self, *args, **options):
+        count = update_related_links(full=options["all"])
+        self.stdout.write(f"Updated the related links of {count} links")
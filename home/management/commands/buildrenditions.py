@@ -0,0 +1,57 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from wagtail.images import get_image_model
+from wagtail.models import Page
+
+from home.images import page_images, pregenerate_renditions
+
+
+def render_image(image_id, policy_name):
+    started = time.perf_counter()
+    image = get_image_model().objects.get(pk=image_id)
+    count = pregenerate_renditions(image, policy_name)
+    return image_id, policy_name, count, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = "Generate the responsive renditions of every image shown on a live page, ahead of the first request"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="How many images to encode at once, AVIF encoding is CPU bound",
+        )
+
+    def handle(self, *args, **options):
+        jobs = set()
+        for page in Page.objects.live().specific().iterator():
+            jobs.update((image.pk, policy_name) for image, policy_name in page_images(page))
+
+        if not jobs:
+            self.stdout.write("There are no images on live pages")
+            return
+
+        # Forked workers mustn't share the parent's database connection
+        connections.close_all()
+        started = time.perf_counter()
+        total = 0
+        with ProcessPoolExecutor(options["processes"], mp_context=multiprocessing.get_context("fork")) as executor:
+            futures = [executor.submit(render_image, *job) for job in sorted(jobs)]
+            for future in as_completed(futures):
+                image_id, policy_name, count, elapsed = future.result()
+                total += count
+                self.stdout.write(f"Image {image_id} ({policy_name}): {count} renditions in {elapsed:.1f}s")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total} renditions of {len(jobs)} images in {time.perf_counter() - started:.1f}s"
+                f" with {options['processes']} processes"
+            )
+        )
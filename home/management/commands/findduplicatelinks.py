@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from links.duplicates import near_duplicates
+from links.models import LinkPage
+
+
+class Command(BaseCommand):
+    help = "List links to the same site, and links with much the same title and description"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.5,
+            help="How alike, from 0 to 1, a title and description must be to another to be listed",
+        )
+
+    def handle(self, *args, **options):
+        hashes = (
+            LinkPage.objects.exclude(link_hash="")
+            .values("link_hash")
+            .annotate(count=Count("pk"))
+            .filter(count__gt=1)
+            .values_list("link_hash", flat=True)
+        )
+        links = {}
+        for link_hash, pk, title, link in LinkPage.objects.filter(link_hash__in=hashes).values_list(
+            "link_hash", "pk", "title", "link"
+        ):
+            links.setdefault(link_hash, []).append((pk, title, link))
+
+        self.stdout.write(f"{len(links)} sites with more than one link")
+        for duplicates in links.values():
+            self.stdout.write("")
+            for pk, title, link in duplicates:
+                self.stdout.write(f"  {pk}: {title} <{link}>")
+
+        texts = {}
+        titles = {}
+        for pk, title, description in LinkPage.objects.values_list("pk", "title", "description").iterator():
+            texts[pk] = f"{title} {description}"
+            titles[pk] = title
+
+        pairs = near_duplicates(texts, options["threshold"])
+        self.stdout.write(f"\n{len(pairs)} pairs of links with similar titles and descriptions")
+        for similarity, pk, other in pairs:
+            self.stdout.write(f"  {similarity:.0%} {pk}: {titles[pk]} / {other}: {titles[other]}")
@@ -0,0 +1,71 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from wagtail.contrib.redirects.models import Redirect
+from wagtail.models import Site
+
+from core.redirects import invalidate_redirects
+
+TEMPORARY_VALUES = {"302", "307", "false", "0", "no", "temporary"}
+
+
+def parse_row(row):
+    """
+    `(old path, link, is permanent)` for a CSV row of old path, new URL and
+    optionally whether it's permanent, or None for rows that aren't redirects
+    (like a header).
+    """
+    if len(row) < 2:
+        return None
+    old_path, link = row[0].strip(), row[1].strip()
+    if not old_path.startswith(("/", "http://", "https://")) or not link:
+        return None
+    is_permanent = len(row) < 3 or not row[2].strip() or row[2].strip().lower() not in TEMPORARY_VALUES
+    return Redirect.normalise_path(old_path), link, is_permanent
+
+
+class Command(BaseCommand):
+    help = "Create redirects in bulk from a CSV file of old path, new URL and (optionally) permanent"
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="The CSV file to import")
+        parser.add_argument("--site", help="Hostname of the site the redirects are for, rather than every site")
+        parser.add_argument("--batch-size", type=int, default=1000, help="How many redirects to insert at once")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be imported without saving")
+
+    def handle(self, *args, **options):
+        site = None
+        if options["site"]:
+            try:
+                site = Site.objects.get(hostname=options["site"])
+            except Site.DoesNotExist as e:
+                raise CommandError(f"There is no site with the hostname {options['site']}") from e
+
+        existing = set(Redirect.objects.filter(site=site).values_list("old_path", flat=True))
+        redirects, skipped = [], 0
+        try:
+            with open(options["file"], newline="", encoding="utf-8-sig") as f:
+                for row in csv.reader(f):
+                    parsed = parse_row(row)
+                    if parsed is None or parsed[0] in existing:
+                        skipped += 1
+                        continue
+                    old_path, link, is_permanent = parsed
+                    existing.add(old_path)
+                    redirects.append(
+                        Redirect(old_path=old_path, site=site, redirect_link=link, is_permanent=is_permanent)
+                    )
+        except OSError as e:
+            raise CommandError(f"Couldn't read {options['file']}: {e}") from e
+
+        if options["dry_run"]:
+            self.stdout.write(f"Would import {len(redirects)} redirects, skipping {skipped} rows")
+            return
+
+        with transaction.atomic():
+            Redirect.objects.bulk_create(redirects, batch_size=options["batch_size"])
+            # bulk_create doesn't send post_save
+            transaction.on_commit(invalidate_redirects)
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(redirects)} redirects, skipping {skipped} rows"))
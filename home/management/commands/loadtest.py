@@ -0,0 +1,220 @@
+import multiprocessing
+import random
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from wagtail.contrib.search_promotions.models import Query
+from wagtail.models import Site
+
+from home.models import ModelCategory
+from home.wsgi_client import WSGIClient, get_application
+from links.models import LinkIndexPage, LinkPage
+
+URL_KINDS = ["home", "directory", "partial", "link", "search", "robots", "serviceworker"]
+
+DEFAULT_MIX = "home=4,directory=3,partial=3,link=4,search=2,robots=1,serviceworker=1"
+
+# Upper bounds (in milliseconds) of the latency histogram buckets
+HISTOGRAM_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        kind, _, weight = item.strip().partition("=")
+        if kind not in URL_KINDS:
+            raise CommandError(f"Unknown URL kind '{kind}', choose from: {', '.join(URL_KINDS)}")
+        try:
+            mix[kind] = int(weight or 1)
+        except ValueError:
+            raise CommandError(f"Invalid weight for '{kind}': {weight}")
+    if not any(mix.values()):
+        raise CommandError("The URL mix needs at least one non-zero weight")
+    return mix
+
+
+def histogram(latencies, buckets=HISTOGRAM_BUCKETS):
+    counts = Counter()
+    for latency in latencies:
+        ms = latency * 1000
+        bound = next((b for b in buckets if ms <= b), None)
+        counts[bound] += 1
+    return [(bound, counts[bound]) for bound in buckets + [None]]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class URLSource:
+    """
+    Picks URLs for each kind of request in the mix from the live site content.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.index_page = LinkIndexPage.objects.live().first()
+        self.directory_url = self.index_page.url if self.index_page else None
+        self.categories = list(
+            ModelCategory.objects.filter(link_pages__isnull=False).distinct().values_list("slug", flat=True)
+        )
+        self.link_urls = [page.url for page in LinkPage.objects.live().only("id", "url_path")]
+        self.queries = list(Query.objects.values_list("query_string", flat=True)[:200]) or [
+            page.title for page in LinkPage.objects.live().only("title")[:200]
+        ]
+
+    def directory_path(self):
+        if not self.directory_url:
+            return "/"
+        if self.categories and self.rng.random() < 0.75:
+            # The category's own URL, as ?category= redirects to it
+            return self.index_page.category_url(self.rng.choice(self.categories))
+        return self.directory_url
+
+    def build(self, kind):
+        headers = {}
+        if kind == "home":
+            path = "/"
+        elif kind == "directory":
+            path = self.directory_path()
+        elif kind == "partial":
+            path = self.directory_path()
+            headers = {"HX-Request": "true", "HX-Current-URL": self.directory_url or "/"}
+        elif kind == "link":
+            path = self.rng.choice(self.link_urls) if self.link_urls else "/"
+        elif kind == "search":
+            query = self.rng.choice(self.queries) if self.queries else "oxford"
+            path = "/search/?" + urlencode({"query": query})
+        elif kind == "robots":
+            path = "/robots.txt"
+        else:
+            path = "/serviceworker.js"
+        return kind, path, headers
+
+
+def _run(client, plan):
+    results = []
+    for kind, path, headers in plan:
+        result = client.get(path, headers)
+        results.append((kind, result.status, result.elapsed, result.is_error, result.is_lock_timeout))
+    return results
+
+
+def _run_in_worker(args):
+    host, port, plan = args
+    return _run(WSGIClient(get_application(), host=host, port=port), plan)
+
+
+class Command(BaseCommand):
+    help = "Drive the WSGI application in-process with a concurrent mix of requests and report on the results"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Total number of requests to make")
+        parser.add_argument("--concurrency", type=int, default=8, help="Number of threads or worker processes")
+        parser.add_argument("--mode", choices=["thread", "fork"], default="thread")
+        parser.add_argument(
+            "--mix",
+            default=DEFAULT_MIX,
+            help=f"Comma separated kind=weight pairs, kinds are: {', '.join(URL_KINDS)}",
+        )
+        parser.add_argument("--host", help="Host header to send, defaults to the default site's hostname")
+        parser.add_argument("--port", type=int, help="Port to send, defaults to the default site's port")
+        parser.add_argument("--warmup", type=int, default=0, help="Number of untimed requests to make first")
+        parser.add_argument("--seed", type=int, help="Random seed, for repeatable URL sequences")
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options["mix"])
+        concurrency = max(1, options["concurrency"])
+        rng = random.Random(options["seed"])
+
+        site = Site.objects.filter(is_default_site=True).first()
+        host = options["host"] or (site.hostname if site else "localhost")
+        port = options["port"] or (site.port if site else 80)
+
+        source = URLSource(rng)
+        kinds = list(mix)
+        weights = [mix[kind] for kind in kinds]
+        plan = [source.build(kind) for kind in rng.choices(kinds, weights=weights, k=options["requests"])]
+
+        application = get_application()
+        if options["warmup"]:
+            warmup_client = WSGIClient(application, host=host, port=port)
+            _run(
+                warmup_client, [source.build(kind) for kind in rng.choices(kinds, weights=weights, k=options["warmup"])]
+            )
+
+        self.stdout.write(
+            f"Running {len(plan)} requests against {host}:{port} with {concurrency} {options['mode']} workers"
+        )
+
+        start = time.perf_counter()
+        if options["mode"] == "fork":
+            # Forked workers mustn't share the parent's database connections
+            connections.close_all()
+            chunks = [(host, port, plan[i::concurrency]) for i in range(concurrency)]
+            with multiprocessing.get_context("fork").Pool(concurrency) as pool:
+                results = [row for chunk in pool.map(_run_in_worker, chunks) for row in chunk]
+        else:
+            client = WSGIClient(application, host=host, port=port)
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = [row for row in executor.map(lambda item: _run(client, [item])[0], plan)]
+        wall_time = time.perf_counter() - start
+
+        self.report(results, wall_time)
+
+    def report(self, results, wall_time):
+        total = len(results)
+        if not total:
+            self.stdout.write("No requests were made")
+            return
+
+        latencies = sorted(row[2] for row in results)
+        errors = sum(1 for row in results if row[3])
+        lock_timeouts = sum(1 for row in results if row[4])
+
+        self.stdout.write("")
+        self.stdout.write(f"Requests:       {total} in {wall_time:.2f}s")
+        self.stdout.write(f"Throughput:     {total / wall_time:.1f} req/s")
+        self.stdout.write(f"Errors:         {errors} ({errors / total:.2%})")
+        self.stdout.write(f"Lock timeouts:  {lock_timeouts}")
+        self.stdout.write(
+            "Latency (ms):   "
+            f"mean {statistics.mean(latencies) * 1000:.1f}, "
+            + ", ".join(f"p{p} {percentile(latencies, p) * 1000:.1f}" for p in (50, 90, 95, 99))
+            + f", max {latencies[-1] * 1000:.1f}"
+        )
+
+        self.stdout.write("")
+        self.stdout.write("Status codes:")
+        for status, count in sorted(Counter(row[1] for row in results).items()):
+            self.stdout.write(f"  {status}: {count}")
+
+        self.stdout.write("")
+        self.stdout.write("By kind:")
+        for kind in URL_KINDS:
+            rows = [row for row in results if row[0] == kind]
+            if not rows:
+                continue
+            kind_latencies = sorted(row[2] for row in rows)
+            self.stdout.write(
+                f"  {kind:<14} {len(rows):>6} reqs  "
+                f"p50 {percentile(kind_latencies, 50) * 1000:>8.1f}ms  "
+                f"p95 {percentile(kind_latencies, 95) * 1000:>8.1f}ms  "
+                f"errors {sum(1 for row in rows if row[3])}"
+            )
+
+        self.stdout.write("")
+        self.stdout.write("Latency histogram:")
+        buckets = histogram(latencies)
+        widest = max(count for _, count in buckets) or 1
+        for bound, count in buckets:
+            label = f"<= {bound}ms" if bound is not None else f"> {HISTOGRAM_BUCKETS[-1]}ms"
+            self.stdout.write(f"  {label:>10} {count:>6} {'#' * round(40 * count / widest)}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from links.scores import refresh_link_scores
+
+
+class Command(BaseCommand):
+    help = "Recalculate each link's popularity from its recent clicks, run daily so older clicks count for less"
+
+    def handle(self, *args, **options):
+        count = refresh_link_scores()
+        self.stdout.write(f"Updated the popularity of {count} links")
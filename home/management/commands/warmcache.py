@@ -0,0 +1,64 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from wagtail.models import Site
+
+from home.warmup import search_urls, site_urls, warm
+
+DURATION_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_since(value):
+    """
+    Accept either a duration like `15m`, `2h` or `1d`, or an ISO 8601 datetime.
+    """
+    match = re.fullmatch(r"(\d+)([smhd])", value)
+    if match:
+        return timezone.now() - timedelta(**{DURATION_UNITS[match[2]]: int(match[1])})
+
+    since = parse_datetime(value)
+    if since is None:
+        raise CommandError(f"Invalid --since value '{value}', use a duration like 15m or an ISO 8601 datetime")
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+class Command(BaseCommand):
+    help = "Request every live page, directory filter and popular search through the WSGI application to warm caches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of requests in flight")
+        parser.add_argument(
+            "--since",
+            help="Only warm pages published since this duration ago (e.g. 15m, 2h, 1d) or ISO 8601 datetime",
+        )
+        parser.add_argument(
+            "--searches", type=int, default=20, help="Number of popular search queries to warm, ignored with --since"
+        )
+
+    def handle(self, *args, **options):
+        since = parse_since(options["since"]) if options["since"] else None
+
+        total = 0
+        slowest = None
+        for site in Site.objects.select_related("root_page").order_by("-is_default_site", "hostname"):
+            urls = site_urls(site, since=since)
+            if site.is_default_site and since is None:
+                urls += search_urls(options["searches"])
+
+            self.stdout.write(f"Warming {len(urls)} URLs on {site.hostname}:{site.port}")
+            for result in warm(site, urls, options["concurrency"]):
+                style = self.style.SUCCESS if result.status < 400 else self.style.ERROR
+                self.stdout.write(f"  {style(str(result.status))} {result.elapsed * 1000:>8.1f}ms  {result.path}")
+                total += 1
+                if slowest is None or result.elapsed > slowest.elapsed:
+                    slowest = result
+
+        if slowest is not None:
+            self.stdout.write(f"Warmed {total} URLs, slowest was {slowest.path} at {slowest.elapsed * 1000:.1f}ms")
+        else:
+            self.stdout.write("Nothing to warm")
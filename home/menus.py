@@ -0,0 +1,102 @@
+from urllib.parse import urlparse
+
+from django.core.cache import cache
+from django.template import Context
+from wagtail.models import Site
+from wagtailmenus.conf import settings as menu_settings
+
+from core.versions import bump_version, get_version
+
+VERSION_KEY = "menus:version"
+
+
+def menus_version():
+    return get_version(VERSION_KEY)
+
+
+def invalidate_menus():
+    """
+    Make every process rebuild its menus on their next render. Cheaper than
+    working out which menus a page appears in.
+    """
+    bump_version(VERSION_KEY)
+
+
+def _menu_items(items):
+    return [
+        {
+            "text": item.text,
+            "href": item.href,
+            "page_id": getattr(item, "link_page_id", None) or getattr(item, "pk", None),
+            "children": _menu_items(item.sub_menu.get_menu_items_for_rendering()) if item.sub_menu else [],
+        }
+        for item in items
+    ]
+
+
+def build_menu(menu_class, request, site, **options):
+    """
+    Let wagtailmenus work out the items the menu shows, with no active
+    classes, and keep only what the templates need.
+    """
+    context = Context({"request": request, "site": site})
+    menu = menu_class._get_render_prepared_object(
+        context,
+        max_levels=None,
+        apply_active_classes=False,
+        allow_repeating_parents=True,
+        use_absolute_page_urls=False,
+        # So every item's sub menu is created up front
+        add_sub_menus_inline=True,
+        template_name="",
+        **options,
+    )
+    if menu is None:
+        return None
+    return {
+        "heading": getattr(menu, "heading", ""),
+        "items": _menu_items(menu.get_menu_items_for_rendering()),
+    }
+
+
+def get_menu(request, name, menu_class, **options):
+    """
+    The menu structure for the request's host, from the cache if it's
+    there. The version is kept with it rather than in the key, so each
+    rebuild replaces the menu it supersedes.
+    """
+    key = f"menus:{request.get_host()}:{name}"
+    version = menus_version()
+    cached = cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    menu = build_menu(menu_class, request, Site.find_for_request(request), **options) or {}
+    cache.set(key, (version, menu), None)
+    return menu
+
+
+def active_class(href, path):
+    """
+    wagtailmenus' rules for custom URLs, which hold for pages too as their
+    URLs follow the page tree.
+    """
+    href = urlparse(href)
+    if href.netloc:
+        return ""
+    if path == href.path:
+        return menu_settings.ACTIVE_CLASS
+    if path.startswith(href.path) and href.path != "/":
+        return menu_settings.ACTIVE_ANCESTOR_CLASS
+    return ""
+
+
+def with_active_classes(items, path, apply_active_classes=True):
+    return [
+        {
+            **item,
+            "active_class": active_class(item["href"], path) if apply_active_classes else "",
+            "has_children_in_menu": bool(item["children"]),
+            "children": with_active_classes(item["children"], path, apply_active_classes),
+        }
+        for item in items
+    ]
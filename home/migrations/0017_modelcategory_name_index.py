@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0016_remove_basicpage_struct_org_actions_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='modelcategory',
+            index=models.Index(fields=['name'], name='home_category_name_idx'),
+        ),
+    ]
@@ -8,8 +8,11 @@ from wagtail.models import Page
 from wagtail.snippets.models import register_snippet
 from wagtailseo.models import SeoMixin
 
+from core.routing import CachedUrlMixin
+from home.images import og_rendition
 
-class BasicPage(SeoMixin, Page):
+
+class BasicPage(CachedUrlMixin, SeoMixin, Page):
     parent_page_types = ["HomePage"]
     subpage_types = []
 
@@ -24,7 +27,7 @@ class BasicPage(SeoMixin, Page):
     @cached_property
     def seo_image_url(self):
         if self.og_image:
-            image_url = self.og_image.get_rendition("width-1200").url
+            image_url = og_rendition(self.og_image).url
             return settings.BASE_URL + image_url
 
         return ""
@@ -34,7 +37,7 @@ class BasicPage(SeoMixin, Page):
         return settings.BASE_URL + self.url
 
 
-class HomePage(SeoMixin, Page):
+class HomePage(CachedUrlMixin, SeoMixin, Page):
     subpage_types = ["BasicPage", "links.LinkIndexPage"]
 
     banner_image = models.ForeignKey(
@@ -58,7 +61,7 @@ class HomePage(SeoMixin, Page):
     @cached_property
     def seo_image_url(self):
         if self.og_image:
-            image_url = self.og_image.get_rendition("width-1200").url
+            image_url = og_rendition(self.og_image).url
             return settings.BASE_URL + image_url
 
         return ""
@@ -80,6 +83,8 @@ class ModelCategory(models.Model):
 
     class Meta:
         ordering = ["name"]
+        # Categories are listed in name order
+        indexes = [models.Index(fields=["name"], name="home_category_name_idx")]
         verbose_name = "Category"
         verbose_name_plural = "Categories"
 
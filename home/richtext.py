@@ -0,0 +1,44 @@
+from wagtail.templatetags.wagtailcore_tags import richtext
+
+from core.routing import current_table
+from core.sites import match_site
+from core.versions import bump_version, get_version
+from home.fragments import cached_fragment
+
+VERSION_KEY = "richtext:version"
+
+
+def richtext_version():
+    return get_version(VERSION_KEY)
+
+
+def invalidate_richtext():
+    """
+    Make every page expand its rich text again, for when a document, image
+    or page it could embed or link to changes.
+    """
+    bump_version(VERSION_KEY)
+
+
+def cached_richtext(request, page, field_name):
+    """
+    What `page.<field_name>|richtext` renders, from the cache when the page's
+    live revision has been rendered for the request's site before.
+
+    Internal links are expanded to page URLs, so the cached HTML is
+    rendered again when the routing table's URLs change, which publishing
+    a page doesn't unless it moves. RoutingCacheMiddleware brings the table
+    up to date for each request. Previews and pages without a live revision
+    aren't cached, as the key can't tell their content apart.
+    """
+    value = getattr(page, field_name)
+    revision_id = getattr(page, "live_revision_id", None)
+    if request is None or getattr(request, "is_preview", False) or revision_id is None:
+        return richtext(value)
+
+    table = current_table()
+    site = match_site(table.sites, request)
+    key = f"richtext:{site.pk if site else ''}:{page.pk}:{field_name}"
+    token = (table.urls_version, richtext_version(), revision_id)
+    # Wagtail resolves the links of each type in one query
+    return cached_fragment(key, token, lambda: richtext(value))
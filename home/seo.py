@@ -0,0 +1,54 @@
+from wagtail.models import Page
+
+from core.routing import current_table
+from core.sites import match_site
+from core.versions import bump_version, get_version
+from home.fragments import cached_fragment
+
+VERSION_KEY = "seo:version"
+
+
+def seo_version():
+    return get_version(VERSION_KEY)
+
+
+def invalidate_seo():
+    """
+    Make every page render its SEO tags again, for when the SEO settings,
+    an image they could use, or a category or tag a title is made from
+    change.
+    """
+    bump_version(VERSION_KEY)
+
+
+def render_seo_template(context, template_name):
+    """
+    What `{% include template_name %}` renders, from the cache when this
+    revision of the page has been rendered at this path before.
+
+    The tags depend on the page's live revision, its URL, the site and its
+    SEO settings. The path is in the key as routable pages change their
+    title and canonical URL for each route. Anything other than a live
+    page, e.g. a preview or the search page, is rendered each time.
+    """
+    request = context.get("request")
+    page = context.get("self")
+    template = context.template.engine.get_template(template_name)
+    if (
+        request is None
+        or getattr(request, "is_preview", False)
+        or not isinstance(page, Page)
+        or page.live_revision_id is None
+    ):
+        with context.push():
+            return template.render(context)
+
+    def render():
+        with context.push():
+            return template.render(context)
+
+    table = current_table()
+    site = match_site(table.sites, request)
+    key = f"seo:{site.pk if site else ''}:{page.pk}:{request.path}:{template_name}"
+    token = (table.urls_version, seo_version(), page.live_revision_id)
+    return cached_fragment(key, token, render)
@@ -0,0 +1,161 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from taggit.models import Tag
+from wagtail.contrib.redirects.models import Redirect
+from wagtail.documents import get_document_model
+from wagtail.images import get_image_model
+from wagtail.models import Page, Site
+from wagtail.signals import page_published, page_slug_changed, page_unpublished, post_page_move
+from wagtailmenus.conf import settings as menu_settings
+from wagtailseo.models import SeoSettings
+
+from core.middleware import invalidate_not_found, invalidate_precomputed_responses
+from core.redirects import invalidate_redirects
+from core.routing import invalidate_routing
+from home import sitemaps
+from home.images import pregenerate_page_renditions_in_background
+from home.menus import invalidate_menus
+from home.models import ModelCategory, ModelTag
+from home.richtext import invalidate_richtext
+from home.seo import invalidate_seo
+from home.warmup import warm_page_in_background
+from links.models import LinkIndexPage
+
+MAIN_MENU_MODEL = menu_settings.models.MAIN_MENU_MODEL
+FLAT_MENU_MODEL = menu_settings.models.FLAT_MENU_MODEL
+MENU_MODELS = [
+    MAIN_MENU_MODEL,
+    FLAT_MENU_MODEL,
+    MAIN_MENU_MODEL._meta.get_field(menu_settings.MAIN_MENU_ITEMS_RELATED_NAME).related_model,
+    FLAT_MENU_MODEL._meta.get_field(menu_settings.FLAT_MENU_ITEMS_RELATED_NAME).related_model,
+    Site,
+]
+
+
+@receiver(page_published)
+def warm_published_page(sender, instance, **kwargs):
+    if getattr(settings, "WARMUP_ON_PUBLISH", False):
+        transaction.on_commit(lambda: warm_page_in_background(instance))
+
+
+@receiver(page_published)
+def pregenerate_published_page_renditions(sender, instance, **kwargs):
+    # So the first visitor doesn't wait for a dozen AVIF encodes
+    pregenerate_page_renditions_in_background(instance)
+
+
+# Menus show page titles and URLs, and which pages are live
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_page_move)
+def invalidate_cached_menus(sender, **kwargs):
+    transaction.on_commit(invalidate_menus)
+
+
+for model in MENU_MODELS:
+    post_save.connect(invalidate_cached_menus, sender=model)
+    post_delete.connect(invalidate_cached_menus, sender=model)
+
+
+# robots.txt and the service worker depend on the site, and the service worker
+# lists the link directories' data URLs
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+@receiver(page_published, sender=LinkIndexPage)
+@receiver(page_unpublished, sender=LinkIndexPage)
+@receiver(post_page_move, sender=LinkIndexPage)
+def invalidate_site_files(sender, **kwargs):
+    transaction.on_commit(invalidate_precomputed_responses)
+
+
+# Publishing a page only changes its own sitemap, moving one or changing its
+# slug changes the URLs of everything below it too, in any section
+@receiver(page_published)
+@receiver(page_unpublished)
+def invalidate_page_sitemap(sender, instance, **kwargs):
+    section = sitemaps.section_for_page(instance)
+    transaction.on_commit(lambda: sitemaps.invalidate(section))
+
+
+@receiver(post_page_move)
+@receiver(page_slug_changed)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def invalidate_sitemaps(sender, **kwargs):
+    transaction.on_commit(sitemaps.invalidate)
+
+
+# The redirect table holds the URLs of the pages redirected to, and the sites
+# to match requests against
+@receiver(post_save, sender=Redirect)
+@receiver(post_delete, sender=Redirect)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+@receiver(post_page_move)
+def invalidate_redirect_table(sender, **kwargs):
+    transaction.on_commit(invalidate_redirects)
+
+
+@receiver(page_published)
+def invalidate_redirects_to_page(sender, instance, **kwargs):
+    # Publishing can change the slug, and so the URL of the page and
+    # everything below it
+    if Redirect.objects.filter(redirect_page__path__startswith=instance.path).exists():
+        transaction.on_commit(invalidate_redirects)
+
+
+# A path that 404ed can start working when a page is published or moved to it,
+# a redirect is added from it, or a directory category or tag is added at it
+@receiver(page_published)
+@receiver(post_page_move)
+@receiver(post_save, sender=Redirect)
+@receiver(post_save, sender=ModelCategory)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=ModelTag)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def invalidate_missed_paths(sender, **kwargs):
+    transaction.on_commit(invalidate_not_found)
+
+
+# Publishing can change a page's slug, and with it the paths of everything
+# below it
+@receiver(page_published)
+@receiver(page_unpublished)
+@receiver(post_page_move)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def invalidate_routing_table(sender, **kwargs):
+    transaction.on_commit(invalidate_routing)
+
+
+# Rich text embeds images and links to documents. Links to live pages are
+# kept up to date by the routing table's URLs, see home.richtext, but not
+# links to pages that aren't live, which can be moved or deleted. Deleting
+# any page deletes its Page row, so the signal is sent with sender=Page.
+@receiver(post_save, sender=get_document_model())
+@receiver(post_delete, sender=get_document_model())
+@receiver(post_save, sender=get_image_model())
+@receiver(post_delete, sender=get_image_model())
+@receiver(post_delete, sender=Page)
+@receiver(post_page_move)
+def invalidate_cached_richtext(sender, **kwargs):
+    transaction.on_commit(invalidate_richtext)
+
+
+# The SEO tags use the settings, and images for og:image and JSON-LD. The
+# directory's category and tag pages are titled with their names.
+@receiver(post_save, sender=SeoSettings)
+@receiver(post_delete, sender=SeoSettings)
+@receiver(post_save, sender=get_image_model())
+@receiver(post_delete, sender=get_image_model())
+@receiver(post_save, sender=ModelCategory)
+@receiver(post_delete, sender=ModelCategory)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=ModelTag)
+@receiver(post_delete, sender=ModelTag)
+def invalidate_cached_seo(sender, **kwargs):
+    transaction.on_commit(invalidate_seo)
@@ -0,0 +1,143 @@
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F, Max
+from django.utils.encoding import iri_to_uri
+from wagtail.models import Page
+
+from core.routing import current_table
+from core.versions import bump_version, get_versions
+from links.models import LinkPage
+
+# LinkPages are split into sitemaps by id range, so a page always stays in
+# the same shard and publishing it only invalidates that one
+SHARD_SIZE = getattr(settings, "SITEMAP_SHARD_SIZE", 1000)
+
+# Rows are read from the database in chunks this size, so memory stays flat
+# however many pages there are
+CHUNK_SIZE = 500
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+XMLNS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+VERSION_KEY = "sitemaps:version"
+
+
+def _version_key(section):
+    return f"{VERSION_KEY}:{section}"
+
+
+def get_version(section):
+    """
+    A token that changes whenever `section`'s content does, used for its
+    ETag and cache key. Every section depends on the global version too.
+    """
+    versions = get_versions(VERSION_KEY, _version_key(section))
+    return f"{versions[VERSION_KEY]:x}-{versions[_version_key(section)]:x}"
+
+
+def invalidate(*sections):
+    """
+    Invalidate the given sections (and the index, whose lastmods change with
+    them), or every section when none are given.
+    """
+    if not sections:
+        bump_version(VERSION_KEY)
+        return
+    bump_version(*{_version_key(section) for section in {*sections, "index"}})
+
+
+def section_for_page(page):
+    if page.specific_class is not None and issubclass(page.specific_class, LinkPage):
+        return f"links-{page.pk // SHARD_SIZE}"
+    return "pages"
+
+
+def _pages(site):
+    return Page.objects.live().public().descendant_of(site.root_page, inclusive=True)
+
+
+def _lastmod(value):
+    return value.date().isoformat() if value else None
+
+
+def _url(site, url_path):
+    # url_path is the path from the tree root, including the site root
+    # page's slug, which isn't part of its URLs. Unicode slugs are
+    # percent-encoded, as <loc> must be a URI
+    return site.root_url + iri_to_uri(url_path[len(site.root_page.url_path) - 1 :])
+
+
+def _urlset(site, rows):
+    yield XML_HEADER
+    yield f'<urlset xmlns="{XMLNS}">\n'
+    for url_path, last_published_at in rows:
+        yield f"<url><loc>{escape(_url(site, url_path))}</loc>"
+        if last_published_at:
+            yield f"<lastmod>{_lastmod(last_published_at)}</lastmod>"
+        yield "</url>\n"
+    yield "</urlset>\n"
+
+
+def shards(site):
+    """
+    `(shard number, lastmod)` for every LinkPage shard with a live page.
+    """
+    return [
+        (row["shard"], row["lastmod"])
+        for row in _pages(site)
+        .type(LinkPage)
+        .annotate(shard=F("pk") / SHARD_SIZE)
+        .values("shard")
+        .annotate(lastmod=Max("last_published_at"))
+        .order_by("shard")
+    ]
+
+
+def index(site):
+    pages_lastmod = _pages(site).not_type(LinkPage).aggregate(lastmod=Max("last_published_at"))["lastmod"]
+    entries = [("pages", pages_lastmod)] + [(f"links-{shard}", lastmod) for shard, lastmod in shards(site)]
+
+    yield XML_HEADER
+    yield f'<sitemapindex xmlns="{XMLNS}">\n'
+    for section, lastmod in entries:
+        yield f"<sitemap><loc>{escape(site.root_url)}/sitemap-{section}.xml</loc>"
+        if lastmod:
+            yield f"<lastmod>{_lastmod(lastmod)}</lastmod>"
+        yield "</sitemap>\n"
+    yield "</sitemapindex>\n"
+
+
+def has_section(site, name):
+    """
+    Whether `name` is the index or a section that could be in it, checked
+    against the RoutingTable rather than the database.
+    """
+    if name in ("index", "pages"):
+        return True
+    if not (name.startswith("links-") and name[6:].isdigit()):
+        return False
+    shard = int(name[6:])
+    content_type_id = ContentType.objects.get_for_model(LinkPage).pk
+    return any(
+        page_id // SHARD_SIZE == shard and page_content_type_id == content_type_id
+        for page_id, page_content_type_id, _revision_id in current_table().pages.get(site.pk, {}).values()
+    )
+
+
+def section(site, name):
+    """
+    Stream the sitemap for `name`, "pages" for everything but LinkPages, or
+    "links-<n>" for a LinkPage shard. Returns None for an unknown section.
+    """
+    if name == "pages":
+        queryset = _pages(site).not_type(LinkPage)
+    elif name.startswith("links-") and name[6:].isdigit():
+        shard = int(name[6:])
+        queryset = _pages(site).type(LinkPage).filter(pk__gte=shard * SHARD_SIZE, pk__lt=(shard + 1) * SHARD_SIZE)
+    else:
+        return None
+
+    rows = queryset.order_by("path").values_list("url_path", "last_published_at").iterator(chunk_size=CHUNK_SIZE)
+    return _urlset(site, rows)
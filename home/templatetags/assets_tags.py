@@ -0,0 +1,85 @@
+import json
+import re
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+from sass_processor.processor import sass_processor
+
+register = template.Library()
+
+GOOGLE_FONTS_URL = "https://fonts.googleapis.com/css?family=Montserrat|PT+Sans&display=swap"
+
+# Relative url()s in the critical CSS are relative to main.css, which lives at
+# the root of the static files, so they need resolving once it's inlined
+RELATIVE_URL_RE = re.compile(r"""url\((["']?)(?!data:|https?:|/)([^"')]+)\1\)""")
+
+_cache = {}
+
+
+def _cached(key, build):
+    # Everything here only changes at deploy time, apart from during development
+    if settings.DEBUG:
+        return build()
+    if key not in _cache:
+        _cache[key] = build()
+    return _cache[key]
+
+
+def _read_static(name):
+    path = finders.find(name)
+    if path is None:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _fonts():
+    manifest = _read_static("fonts/fonts.json")
+    return json.loads(manifest) if manifest else []
+
+
+def _critical_css(name):
+    css = _read_static(f"css/critical/{name}.css") or ""
+    return RELATIVE_URL_RE.sub(lambda match: f'url("{static(match[2])}")', css)
+
+
+@register.simple_tag
+def font_preloads():
+    """
+    Preload the self-hosted fonts built by `manage.py buildfonts`, falling back
+    to Google Fonts if they haven't been built.
+    """
+    fonts = _cached("fonts", _fonts)
+    if not fonts:
+        return format_html('<link href="{}" rel="stylesheet">', GOOGLE_FONTS_URL)
+    return format_html_join(
+        "\n",
+        '<link rel="preload" href="{}" as="font" type="font/woff2" crossorigin>',
+        ((static(font["file"]),) for font in fonts),
+    )
+
+
+@register.simple_tag
+def main_stylesheet(critical=None):
+    """
+    Inline the critical CSS for the page type built by `manage.py
+    buildcriticalcss` and load the full stylesheet without blocking rendering.
+    Without critical CSS the stylesheet is loaded as normal.
+    """
+    url = sass_processor("main.scss")
+    css = _cached(f"critical:{critical}", lambda: _critical_css(critical)) if critical else ""
+    if not css:
+        return format_html('<link rel="stylesheet" type="text/css" href="{}">', url)
+
+    return format_html(
+        "<style>{}</style>\n"
+        '<link rel="preload" href="{}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+        '<noscript><link rel="stylesheet" type="text/css" href="{}"></noscript>',
+        mark_safe(css),
+        url,
+        url,
+    )
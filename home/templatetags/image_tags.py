@@ -0,0 +1,57 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+from home.images import POLICIES, SOURCE_FORMATS, get_renditions
+
+register = template.Library()
+
+
+def _srcset(renditions):
+    return ", ".join(f"{rendition.url} {width}w" for width, rendition in renditions)
+
+
+@register.simple_tag
+def picture(image, policy, alt="", loading="lazy", **attrs):
+    """
+    Render `image` as a <picture> with AVIF and WebP sources and a fallback
+    <img>, at every width in the named policy from home.images. The <img> has
+    the intrinsic dimensions of the largest fallback so the browser can
+    reserve space for it before it loads.
+    """
+    if not image:
+        return ""
+
+    img_attrs = {"alt": alt, "loading": loading, "decoding": "async", **attrs}
+    if image.is_svg():
+        return format_html(
+            "<img{}>", flatatt({"src": image.file.url, "width": image.width, "height": image.height, **img_attrs})
+        )
+
+    sizes = POLICIES[policy].sizes
+    sources = get_renditions(image, policy)
+    fallback = sources[None]
+    largest = fallback[-1][1]
+
+    return format_html(
+        "<picture>{}<img{}></picture>",
+        format_html_join(
+            "",
+            '<source type="{}" srcset="{}" sizes="{}">',
+            (
+                (mime_type, _srcset(sources[image_format]), sizes)
+                for image_format, mime_type in SOURCE_FORMATS
+                if image_format in sources
+            ),
+        ),
+        flatatt(
+            {
+                "src": largest.url,
+                "srcset": _srcset(fallback),
+                "sizes": sizes,
+                "width": largest.width,
+                "height": largest.height,
+                **img_attrs,
+            }
+        ),
+    )
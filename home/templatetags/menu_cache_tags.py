@@ -0,0 +1,55 @@
+from django import template
+from django.template.loader import get_template
+from wagtailmenus.conf import settings as menu_settings
+
+from home.menus import get_menu, with_active_classes
+
+register = template.Library()
+
+
+def applies_active_classes(request):
+    # See home.views.render_not_found_page
+    return not getattr(request, "shared_between_paths", False)
+
+
+@register.simple_tag(takes_context=True)
+def cached_main_menu(context, template="menus/main_menu.html"):
+    """
+    A drop-in for wagtailmenus' `{% main_menu %}` that reads the menu from the
+    cache, so it costs no queries. Active classes come from the request path,
+    unless the page is shared between paths, like the 404 page.
+    """
+    request = context["request"]
+    menu = get_menu(request, "main", menu_settings.models.MAIN_MENU_MODEL)
+    return get_template(template).render(
+        {"menu_items": with_active_classes(menu.get("items", []), request.path, applies_active_classes(request))},
+        request,
+    )
+
+
+@register.simple_tag(takes_context=True)
+def cached_flat_menu(context, handle, apply_active_classes=False, show_menu_heading=True, template=None):
+    """
+    A drop-in for wagtailmenus' `{% flat_menu %}`, see `cached_main_menu`.
+    """
+    request = context["request"]
+    menu = get_menu(
+        request,
+        f"flat:{handle}",
+        menu_settings.models.FLAT_MENU_MODEL,
+        handle=handle,
+        fall_back_to_default_site_menus=menu_settings.FLAT_MENUS_FALL_BACK_TO_DEFAULT_SITE_MENUS,
+        show_menu_heading=show_menu_heading,
+    )
+    if not menu:
+        return ""
+    return get_template(template or f"menus/{handle}.html").render(
+        {
+            "menu_handle": handle,
+            "menu_heading": menu["heading"] if show_menu_heading else "",
+            "menu_items": with_active_classes(
+                menu["items"], request.path, apply_active_classes and applies_active_classes(request)
+            ),
+        },
+        request,
+    )
@@ -0,0 +1,14 @@
+from django import template
+
+from home.richtext import cached_richtext as get_cached_richtext
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cached_richtext(context, page, field_name):
+    """
+    A drop-in for `{{ page.<field_name>|richtext }}` that caches the expanded
+    HTML per revision, so links and embeds in it cost no queries.
+    """
+    return get_cached_richtext(context.get("request"), page, field_name)
@@ -0,0 +1,15 @@
+from django import template
+
+from home.seo import render_seo_template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cached_seo_include(context, template_name):
+    """
+    A drop-in for including wagtailseo's templates that caches what they
+    render per page revision, so the SEO settings aren't read from the
+    database and the JSON-LD isn't built again on every request.
+    """
+    return render_seo_template(context, template_name)
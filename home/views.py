@@ -1,6 +1,53 @@
+import hashlib
+import json
+import re
+
+from compressor.cache import get_offline_manifest
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseNotFound,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.template.loader import render_to_string
+from django.templatetags.static import static
+from django.urls import reverse
 from django.views.generic import TemplateView
+from sass_processor.processor import sass_processor
 from wagtail.models import Site
 
+from core.middleware import etag_matches
+from core.routing import current_table
+from core.sites import match_site
+from home import sitemaps
+from home.menus import menus_version
+from links.models import LinkIndexPage
+
+# Static files the service worker caches when it installs
+PRECACHE_STATIC_FILES = [
+    "offline.html",
+    "img/logo-do-white.png",
+    "img/oxford-radcliffe-camera-w1200h675.jpg",
+]
+
+ASSET_URL_RE = re.compile(r'(?:src|href)="([^"]+)"')
+
+# The request headers the 404 page depends on, the host and scheme
+NOT_FOUND_META = ["HTTP_HOST", "SERVER_NAME", "SERVER_PORT", "HTTPS", "wsgi.url_scheme", "HTTP_X_FORWARDED_PROTO"]
+
+# Characters of a sitemap that are cached, beyond which it's streamed from
+# the database each time instead of being held in memory to be cached
+SITEMAP_CACHE_MAX_SIZE = getattr(settings, "SITEMAP_CACHE_MAX_SIZE", 5 * 1024 * 1024)
+
+# (host, menus version) -> rendered 404 page
+_not_found_pages = {}
+
 
 class RobotsView(TemplateView):
     content_type = "text/plain"
@@ -11,3 +58,127 @@ class RobotsView(TemplateView):
         request = context["view"].request
         context["wagtail_site"] = Site.find_for_request(request)
         return context
+
+
+def get_precache_urls():
+    urls = [sass_processor("main.scss")]
+    urls += [static(name) for name in PRECACHE_STATIC_FILES]
+    # The JavaScript bundles built by `manage.py compress`
+    for html in get_offline_manifest().values():
+        urls += ASSET_URL_RE.findall(html)
+    # Self-hosted fonts, if they've been built
+    urls += [static(name) for name in getattr(staticfiles_storage, "hashed_files", {}) if name.endswith(".woff2")]
+    return list(dict.fromkeys(urls))
+
+
+def get_data_urls(site):
+    if site is None:
+        return []
+    return [
+        index_page.relative_url(site) + index_page.reverse_subpage("directory_data")
+        for index_page in LinkIndexPage.objects.live().descendant_of(site.root_page, inclusive=True)
+    ]
+
+
+class ServiceWorkerView(TemplateView):
+    content_type = "application/javascript"
+    template_name = "serviceworker.js"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        precache_urls = get_precache_urls()
+        # A new collectstatic changes the manifest hash, and with it the
+        # version, so browsers pick up the new service worker and assets
+        version = (
+            getattr(staticfiles_storage, "manifest_hash", "")
+            or hashlib.md5(json.dumps(precache_urls).encode(), usedforsecurity=False).hexdigest()
+        )
+        context["version"] = version[:12]
+        context["precache_urls"] = json.dumps(precache_urls)
+        context["offline_url"] = json.dumps(static("offline.html"))
+        context["static_url"] = json.dumps(settings.STATIC_URL)
+        context["data_urls"] = json.dumps(get_data_urls(Site.find_for_request(self.request)))
+        context["excluded_paths"] = json.dumps([reverse("wagtailadmin_home"), reverse("admin:index")])
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        response["Cache-Control"] = "no-cache"
+        return response
+
+
+def _stream_and_cache(chunks, key, version):
+    # Sitemaps too big to hold are streamed each time rather than cached
+    parts, size = [], 0
+    for chunk in chunks:
+        if parts is not None:
+            parts.append(chunk)
+            size += len(chunk)
+            if size > SITEMAP_CACHE_MAX_SIZE:
+                parts = None
+        yield chunk
+    if parts is not None:
+        cache.set(key, (version, "".join(parts)), None)
+
+
+def sitemap(request, section="index"):
+    """
+    The sitemap index, or one of the sitemaps it lists. Each is streamed
+    from the database the first time and cached until a page in it changes.
+    """
+    # Checked first, so made up sections don't each get a version token
+    site = match_site(current_table().sites, request)
+    if site is None or not sitemaps.has_section(site, section):
+        raise Http404
+
+    etag = f'"{sitemaps.get_version(section)}"'
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    # The version is kept with the sitemap, so the next one replaces it
+    key = f"sitemaps:{request.get_host()}:{section}"
+    cached = cache.get(key)
+    if cached is not None and cached[0] == etag:
+        response = HttpResponse(cached[1], content_type="application/xml; charset=utf-8")
+    else:
+        chunks = sitemaps.index(site) if section == "index" else sitemaps.section(site, section)
+        response = StreamingHttpResponse(
+            _stream_and_cache(chunks, key, etag), content_type="application/xml; charset=utf-8"
+        )
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def render_not_found_page(request):
+    # Rendered for a blank request to the host, so nothing about the visitor
+    # or the path they asked for ends up in the shared copy
+    blank = HttpRequest()
+    blank.method = "GET"
+    blank.path = blank.path_info = "/"
+    blank.META = {key: request.META[key] for key in NOT_FOUND_META if key in request.META}
+    blank.user = AnonymousUser()
+    # It's served at every path, so no menu item is the current page
+    blank.shared_between_paths = True
+    return render_to_string("404.html", request=blank)
+
+
+def page_not_found(request, exception=None):
+    """
+    handler404: the 404 page is rendered once per host, and again when the
+    menus change, then served from memory. NotFoundCacheMiddleware sends
+    repeat misses straight here.
+    """
+    key = (request.get_host(), menus_version())
+    content = _not_found_pages.get(key)
+    if content is None:
+        content = render_not_found_page(request)
+        # Hosts come from the request, so don't let them grow without bound
+        if len(_not_found_pages) >= 100:
+            _not_found_pages.clear()
+        _not_found_pages[key] = content
+    response = HttpResponseNotFound(content)
+    response.cacheable_not_found = True
+    return response
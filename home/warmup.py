@@ -0,0 +1,100 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.urls import reverse
+from wagtail.contrib.search_promotions.models import Query
+from wagtail.models import Page, Site
+
+from home.models import ModelCategory
+from home.wsgi_client import WSGIClient, get_application
+from links.models import LinkIndexPage
+
+logger = logging.getLogger(__name__)
+
+# Sent with every warm-up request, so views can skip side effects like
+# recording search hits
+WARMUP_HEADER = "X-Warmup"
+
+
+def directory_urls(index_page, site):
+    if not isinstance(index_page, LinkIndexPage):
+        return []
+
+    base_url = index_page.relative_url(site)
+    slugs = (
+        ModelCategory.objects.filter(link_pages__isnull=False)
+        .distinct()
+        .order_by("slug")
+        .values_list("slug", flat=True)
+    )
+    # category_url(), relative to the site being warmed
+    return [base_url] + [base_url + index_page.reverse_subpage("category", args=(slug,)) for slug in slugs]
+
+
+def search_urls(limit=20, date_since=None):
+    queries = Query.get_most_popular(date_since=date_since).values_list("query_string", flat=True)[:limit]
+    return [f"{reverse('search')}?{urlencode({'query': query})}" for query in queries]
+
+
+def ancestor_paths(pages):
+    return {page.path[:i] for page in pages for i in range(Page.steplen, len(page.path) + 1, Page.steplen)}
+
+
+def page_urls(site, pages):
+    urls = []
+    for page in pages.order_by("path").specific():
+        if isinstance(page, LinkIndexPage):
+            urls.extend(directory_urls(page, site))
+            continue
+        url = page.relative_url(site)
+        if url is not None:
+            urls.append(url)
+    return urls
+
+
+def site_urls(site, since=None):
+    """
+    Return the URLs of the live pages in a site, in tree order. If `since` is
+    given, only include the pages published since then and their ancestors.
+    """
+    pages = site.root_page.get_descendants(inclusive=True).live().public()
+    if since is not None:
+        changed = pages.filter(last_published_at__gte=since).only("path")
+        pages = pages.filter(path__in=ancestor_paths(changed))
+    return page_urls(site, pages)
+
+
+def warm(site, urls, concurrency=4):
+    """
+    Request each URL through the WSGI application with at most `concurrency`
+    requests in flight, returning the results in the order given.
+    """
+    client = WSGIClient(
+        get_application(),
+        host=site.hostname,
+        port=site.port,
+        scheme="https" if site.port == 443 else "http",
+    )
+    headers = {WARMUP_HEADER: "1"}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        return list(executor.map(lambda url: client.get(url, headers), urls))
+
+
+def warm_page(page):
+    """
+    Warm a newly published page, its ancestors and, for links, the directory
+    pages that list it.
+    """
+    concurrency = getattr(settings, "WARMUP_CONCURRENCY", 4)
+    paths = ancestor_paths([page])
+    for site in Site.objects.filter(root_page__path__in=paths).select_related("root_page"):
+        pages = site.root_page.get_descendants(inclusive=True).live().public().filter(path__in=paths)
+        for result in warm(site, page_urls(site, pages), concurrency):
+            logger.info("Warmed %s in %.1fms (%s)", result.path, result.elapsed * 1000, result.status)
+
+
+def warm_page_in_background(page):
+    threading.Thread(target=warm_page, args=(page,), daemon=True).start()
@@ -0,0 +1,115 @@
+import io
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from django.core.signals import got_request_exception
+from django.db import OperationalError
+
+# Exceptions raised inside the app are swallowed by Django's handler and turned
+# into 500s, so we record them per thread via the got_request_exception signal.
+_state = threading.local()
+
+
+def _record_exception(sender, request=None, **kwargs):
+    _state.exception = sys.exc_info()[1]
+
+
+def get_application():
+    # Imported lazily, core.wsgi calls get_wsgi_application() at import time
+    from core.wsgi import application
+
+    return application
+
+
+def is_lock_timeout(exc):
+    return isinstance(exc, OperationalError) and "locked" in str(exc)
+
+
+@dataclass
+class WSGIResult:
+    path: str
+    status: int
+    elapsed: float
+    content: bytes = b""
+    headers: dict = field(default_factory=dict)
+    exception: BaseException | None = None
+
+    @property
+    def body_size(self):
+        return len(self.content)
+
+    @property
+    def is_error(self):
+        return self.exception is not None or self.status >= 500
+
+    @property
+    def is_lock_timeout(self):
+        return is_lock_timeout(self.exception)
+
+
+class WSGIClient:
+    """
+    Call a WSGI application in-process, without a network server in between.
+    """
+
+    def __init__(self, application, host="localhost", port=80, scheme="http"):
+        self.application = application
+        self.host = host
+        self.port = str(port)
+        self.scheme = scheme
+        got_request_exception.connect(_record_exception, dispatch_uid="wsgi_client_exceptions")
+
+    def environ(self, path, headers=None):
+        url = urlsplit(path)
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "SCRIPT_NAME": "",
+            "PATH_INFO": url.path or "/",
+            "QUERY_STRING": url.query,
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": self.port,
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": self.host if self.port in ("80", "443") else f"{self.host}:{self.port}",
+            "REMOTE_ADDR": "127.0.0.1",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": self.scheme,
+            "wsgi.input": io.BytesIO(),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for name, value in (headers or {}).items():
+            environ["HTTP_" + name.upper().replace("-", "_")] = value
+        return environ
+
+    def get(self, path, headers=None):
+        captured = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            captured["status"] = int(status.split(" ", 1)[0])
+            captured["headers"] = dict(response_headers)
+
+        _state.exception = None
+        start = time.perf_counter()
+        try:
+            response = self.application(self.environ(path, headers), start_response)
+            try:
+                content = b"".join(response)
+            finally:
+                if hasattr(response, "close"):
+                    response.close()
+        except Exception as e:
+            return WSGIResult(path, 500, time.perf_counter() - start, exception=e)
+
+        return WSGIResult(
+            path,
+            captured.get("status", 500),
+            time.perf_counter() - start,
+            content=content,
+            headers=captured.get("headers", {}),
+            exception=_state.exception,
+        )
@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import json
+import threading
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+
+# Bumped whenever the shape of the bundle changes, so old clients can tell
+FORMAT_VERSION = 1
+
+# Link rows are positional to keep the file small, directory.js reads them
+# with the same indexes
+LINK_FIELDS = ["id", "title", "link", "description", "testimonial", "categories", "tags"]
+
+_lock = threading.Lock()
+# Index page id -> LoadedBundle, so requests don't hit storage for the content
+_loaded = {}
+
+
+class LoadedBundle:
+    __slots__ = ("modified", "content", "gzipped", "etag")
+
+    def __init__(self, modified, content, gzipped):
+        self.modified = modified
+        self.content = content
+        self.gzipped = gzipped
+        self.etag = '"{}"'.format(json.loads(content)["version"])
+
+
+def bundle_storage():
+    # Overwrites the files atomically, so requests never find one missing
+    return storages["overwriting"]
+
+
+def bundle_name(index_page):
+    return f"directory/links-{index_page.pk}.json"
+
+
+def build_bundle(index_page):
+    """
+    Everything directory.js needs to filter and render the live links under
+    `index_page`, without asking the server.
+    """
+    from home.models import ModelCategory
+
+    from .models import LinkPage, LinkPageCategory, LinkPageTag
+
+    links = list(
+        LinkPage.objects.descendant_of(index_page)
+        .live()
+        .order_by("title")
+        .values_list("id", "title", "link", "description", "testimonial")
+    )
+    link_ids = [link[0] for link in links]
+
+    categories = {}
+    for page_id, category_id in (
+        LinkPageCategory.objects.filter(page_id__in=link_ids)
+        .order_by("link_category__name")
+        .values_list("page_id", "link_category_id")
+    ):
+        categories.setdefault(page_id, []).append(category_id)
+
+    tags = {}
+    for page_id, tag_id in LinkPageTag.objects.filter(content_object_id__in=link_ids).values_list(
+        "content_object_id", "tag_id"
+    ):
+        tags.setdefault(page_id, []).append(tag_id)
+
+    used_categories = {category_id for ids in categories.values() for category_id in ids}
+    used_tags = {tag_id for ids in tags.values() for tag_id in ids}
+    tag_names = dict(LinkPageTag.tag_model().objects.filter(id__in=used_tags).values_list("id", "name"))
+
+    payload = {
+        "format": FORMAT_VERSION,
+        "fields": LINK_FIELDS,
+        "categories": [
+            list(category)
+            for category in ModelCategory.objects.filter(id__in=used_categories)
+            .order_by("name")
+            .values_list("id", "slug", "name")
+        ],
+        "tags": sorted([[tag_id, name] for tag_id, name in tag_names.items()], key=lambda tag: tag[1].lower()),
+        "links": [[*link, categories.get(link[0], []), sorted(tags.get(link[0], []))] for link in links],
+    }
+    content = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+    # The version doubles as the ETag, so it only changes with the content
+    payload["version"] = hashlib.sha1(content.encode(), usedforsecurity=False).hexdigest()[:16]
+    return payload
+
+
+def write_bundle(index_page):
+    """
+    Build the bundle for `index_page` and save it, with a gzipped copy, to
+    the bundle storage.
+    """
+    payload = build_bundle(index_page)
+    content = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+    name = bundle_name(index_page)
+    storage = bundle_storage()
+    # The gzipped copy first, as load_bundle() goes by the other's mtime
+    storage.save(f"{name}.gz", ContentFile(gzip.compress(content, compresslevel=9, mtime=0)))
+    storage.save(name, ContentFile(content))
+
+    with _lock:
+        _loaded.pop(index_page.pk, None)
+    return payload
+
+
+def load_bundle(index_page):
+    """
+    Return the saved bundle for `index_page`, building it if it's missing.
+    It's kept in memory until another process rewrites the file.
+    """
+    name = bundle_name(index_page)
+    storage = bundle_storage()
+    if not storage.exists(name) or not storage.exists(f"{name}.gz"):
+        write_bundle(index_page)
+
+    modified = storage.get_modified_time(name)
+    loaded = _loaded.get(index_page.pk)
+    if loaded is None or loaded.modified != modified:
+        with storage.open(name) as f:
+            content = f.read()
+        with storage.open(f"{name}.gz") as f:
+            gzipped = f.read()
+        loaded = LoadedBundle(modified, content, gzipped)
+        with _lock:
+            _loaded[index_page.pk] = loaded
+    return loaded
+
+
+def write_bundles_for_page(page):
+    """
+    Rebuild the bundle of every directory `page` appears in.
+    """
+    from .models import LinkIndexPage
+
+    for index_page in LinkIndexPage.objects.ancestor_of(page, inclusive=True):
+        write_bundle(index_page)
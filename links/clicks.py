@@ -0,0 +1,95 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .scores import refresh_link_scores
+
+logger = logging.getLogger(__name__)
+
+# Seconds clicks are counted in memory before a background thread writes
+# them to the database, together
+FLUSH_SECONDS = getattr(settings, "LINK_CLICKS_FLUSH_SECONDS", 60)
+
+_lock = threading.Lock()
+# (date, link id) -> clicks since the last flush
+_counts = Counter()
+# The process the flushing thread was started in. Threads don't survive a
+# fork, so a worker forked from a process that had one needs its own.
+_flusher_pid = None
+
+
+def record_click(link_id):
+    """
+    Count a click on a link, in this process's memory, so a click costs no
+    more than a dict update. A background thread writes the counts out
+    every FLUSH_SECONDS, see flush(), so a request never waits on the write.
+    """
+    global _flusher_pid
+    key = (timezone.localdate(), link_id)
+    with _lock:
+        _counts[key] += 1
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(target=flush_periodically, name="link-clicks", daemon=True).start()
+
+
+def flush_periodically():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception:
+            # The counts are kept, to be written with the next flush
+            logger.exception("Couldn't write link clicks")
+        finally:
+            connection.close()
+
+
+def flush():
+    """
+    Add the counted clicks to the daily totals, in one transaction, and start
+    counting again, then queue the links' popularity to be recalculated.
+    Returns how many (link, day) totals were updated. If the write fails,
+    e.g. as the database is locked, the clicks are counted again.
+    """
+    from .models import LinkClicks, LinkPage
+
+    with _lock:
+        counts = dict(_counts)
+        _counts.clear()
+    if not counts:
+        return 0
+
+    try:
+        # A link deleted since it was clicked has nowhere to put its clicks
+        link_ids = set(
+            LinkPage.objects.filter(pk__in={link_id for _date, link_id in counts}).values_list("pk", flat=True)
+        )
+        rows = [(link_id, date, clicks) for (date, link_id), clicks in counts.items() if link_id in link_ids]
+        if not rows:
+            return 0
+
+        table = connection.ops.quote_name(LinkClicks._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} (link_id, date, clicks) VALUES (%s, %s, %s) "
+                f"ON CONFLICT (link_id, date) DO UPDATE SET clicks = {table}.clicks + excluded.clicks",
+                rows,
+            )
+            refresh_link_scores.enqueue()
+    except Exception:
+        with _lock:
+            _counts.update(counts)
+        raise
+    return len(rows)
+
+
+# Don't lose the last few clicks when a process is stopped
+atexit.register(flush)
@@ -0,0 +1,110 @@
+import hashlib
+import random
+import re
+from collections import defaultdict
+from itertools import combinations
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Query parameters that only say where a visitor came from
+TRACKING_PARAMS = frozenset(["fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref", "_ga"])
+TRACKING_PREFIXES = ("utm_",)
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+# Words in a row that make a shingle, and the MinHash signature's length,
+# split into bands of rows for locality sensitive hashing. Two links whose
+# shingles are 50% the same share a band 2 times in 3, at 80% almost always.
+SHINGLE_WORDS = 2
+BANDS = 16
+ROWS = 4
+
+# Mersenne prime, bigger than any 32 bit shingle hash
+PRIME = (1 << 61) - 1
+# Fixed, so a link's signature is the same from one run to the next
+_random = random.Random(20240101)
+PERMUTATIONS = [(_random.randrange(1, PRIME), _random.randrange(PRIME)) for _ in range(BANDS * ROWS)]
+
+
+def canonical_url(url):
+    """
+    The URL less what doesn't change the site it's for: the scheme, `www.`,
+    default ports, a trailing slash, the fragment and tracking parameters,
+    with the rest of the query in order. Not itself a working URL.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and str(port) != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/")
+    path = re.sub(r"/index\.(html?|php)$", "", path)
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in TRACKING_PARAMS and not name.lower().startswith(TRACKING_PREFIXES)
+    )
+    return host + path + (f"?{urlencode(query)}" if query else "")
+
+
+def url_hash(url):
+    """
+    A short hash of the canonical URL, for LinkPage.link_hash, which is
+    indexed so duplicates are found without comparing every link.
+    """
+    return hashlib.sha1(canonical_url(url).encode(), usedforsecurity=False).hexdigest()[:16]
+
+
+def shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i : i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def minhash(shingle_set):
+    """
+    The smallest hash of the shingles under each permutation. The share of
+    two signatures that match estimates how alike their shingles are.
+    """
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=4).digest(), "big") for shingle in shingle_set
+    ]
+    return [min((a * value + b) % PRIME for value in hashes) for a, b in PERMUTATIONS]
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def near_duplicates(texts, threshold=0.5):
+    """
+    Pairs of `{id: text}` whose word shingles overlap by at least
+    `threshold`, as `(similarity, id, other id)`, most alike first. Only
+    pairs sharing a band of their MinHash signatures are compared, rather
+    than every pair.
+    """
+    shingle_sets = {pk: shingles(text) for pk, text in texts.items()}
+    buckets = defaultdict(list)
+    for pk, shingle_set in shingle_sets.items():
+        if not shingle_set:
+            continue
+        signature = minhash(shingle_set)
+        for band in range(BANDS):
+            buckets[band, tuple(signature[band * ROWS : (band + 1) * ROWS])].append(pk)
+
+    candidates = set()
+    for pks in buckets.values():
+        candidates.update(combinations(sorted(pks), 2))
+
+    pairs = []
+    for pk, other in candidates:
+        similarity = jaccard(shingle_sets[pk], shingle_sets[other])
+        if similarity >= threshold:
+            pairs.append((similarity, pk, other))
+    return sorted(pairs, key=lambda pair: (-pair[0], pair[1], pair[2]))
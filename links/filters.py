@@ -1,29 +1,56 @@
 import django_filters
 from django import forms
-from django.db.models import Count
+from django.db.models import Exists, OuterRef
 
 from home.models import ModelCategory
 
-from .models import LinkPage
+from .models import LinkPage, LinkPageCategory, slug_token
 
 category_choice = (
-    ModelCategory.objects.annotate(exists=Count("link_pages"))
-    .filter(exists__gt=0)
+    ModelCategory.objects.filter(Exists(LinkPageCategory.objects.filter(link_category=OuterRef("pk"))))
     .order_by("name")
     .values_list("slug", "name")
 )
 
+# Each sort's ordering, read in order from an index, see
+# LinkPage.Meta.indexes and links/migrations. Links with the same
+# popularity are in id order, the publish times are all but unique.
+SORTS = {
+    "popular": ("Most popular", ["-popularity", "-pk"]),
+    "added": ("Recently added", ["-first_published_at"]),
+    "updated": ("Recently updated", ["-last_published_at"]),
+}
+
 
 class LinkFilter(django_filters.FilterSet):
     category = django_filters.ChoiceFilter(
         label="Category",
-        field_name="categories__link_category__slug",
+        method="filter_category",
         empty_label="-- All --",
         required=False,
         choices=category_choice,
         widget=forms.Select(),
     )
+    sort = django_filters.ChoiceFilter(
+        label="Sort by",
+        method="sort_links",
+        empty_label="Title",
+        required=False,
+        choices=[(name, label) for name, (label, _ordering) in SORTS.items()],
+        widget=forms.Select(),
+    )
 
     class Meta:
         model = LinkPage
-        fields = ["category"]
+        fields = ["category", "sort"]
+
+    def filter_category(self, queryset, name, value):
+        # The page's own copy of its category slugs, so no joins or DISTINCT
+        return queryset.filter(category_slugs__contains=slug_token(value))
+
+    def sort_links(self, queryset, name, value):
+        if value == "popular":
+            # Always true, but it lets SQLite see that reading the links in
+            # popularity order costs less than sorting the live pages
+            queryset = queryset.filter(popularity__gte=0)
+        return queryset.order_by(*SORTS[value][1])
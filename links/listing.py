@@ -0,0 +1,91 @@
+from django.core.paginator import Paginator
+from django.db.models import Aggregate, F, Func, JSONField, OuterRef, Subquery
+
+# The columns the directory shows, in LinkRow's order
+LINK_COLUMNS = ["id", "title", "link", "description", "testimonial"]
+
+
+class JSONGroupArray(Aggregate):
+    """
+    Collect the values in a group into a JSON array.
+    """
+
+    function = "JSON_GROUP_ARRAY"
+    output_field = JSONField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function="JSON_AGG", **extra_context)
+
+
+class JSONArray(Func):
+    function = "JSON_ARRAY"
+    output_field = JSONField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function="JSON_BUILD_ARRAY", **extra_context)
+
+
+class CategoryRow:
+    __slots__ = ("slug", "name")
+
+    def __init__(self, slug, name):
+        self.slug = slug
+        self.name = name
+
+
+class LinkRow:
+    """
+    Just what the directory shows of a LinkPage, a fraction of the size of
+    the page itself.
+    """
+
+    __slots__ = ("id", "title", "link", "description", "testimonial", "categories")
+
+    def __init__(self, id, title, link, description, testimonial, categories):
+        self.id = id
+        self.title = title
+        self.link = link
+        self.description = description
+        self.testimonial = testimonial
+        self.categories = categories
+
+
+def with_categories(queryset):
+    """
+    Add each link's categories, as `[[slug, name], ...]`, to the query that
+    fetches it. It's a subquery so filtering on categories doesn't limit them.
+    """
+    from .models import LinkPageCategory
+
+    categories = (
+        LinkPageCategory.objects.filter(page=OuterRef("pk"))
+        .order_by()
+        .values("page")
+        .annotate(data=JSONGroupArray(JSONArray(F("link_category__slug"), F("link_category__name"))))
+        .values("data")
+    )
+    return queryset.annotate(category_data=Subquery(categories, output_field=JSONField()))
+
+
+def link_rows_queryset(queryset):
+    return with_categories(queryset).values_list(*LINK_COLUMNS, "category_data")
+
+
+def to_link_rows(rows):
+    """
+    LinkRows from the tuples link_rows_queryset() returns.
+    """
+    link_rows = []
+    for *columns, category_data in rows:
+        categories = sorted((CategoryRow(*category) for category in category_data or ()), key=lambda c: c.name)
+        link_rows.append(LinkRow(*columns, tuple(categories)))
+    return link_rows
+
+
+class LinkRowPaginator(Paginator):
+    """
+    Pages through link_rows_queryset(), handing out LinkRows.
+    """
+
+    def _get_page(self, object_list, *args, **kwargs):
+        return super()._get_page(to_link_rows(object_list), *args, **kwargs)
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:48
+
+from django.db import migrations, models
+
+# Indexes on Wagtail's page table for the directory and the Links admin
+# listing. Wagtail owns the table, so they're created with SQL rather than
+# through a model's Meta.
+PAGE_INDEXES = [
+    # Live links in title order, without sorting
+    (
+        "links_live_page_title_idx",
+        'CREATE INDEX IF NOT EXISTS "links_live_page_title_idx" ON "wagtailcore_page" ("title") WHERE "live"',
+    ),
+    # The admin listing's default ordering, and its Updated column
+    (
+        "links_page_last_published_idx",
+        'CREATE INDEX IF NOT EXISTS "links_page_last_published_idx" ON "wagtailcore_page" ("last_published_at")',
+    ),
+    (
+        "links_page_latest_revision_created_idx",
+        'CREATE INDEX IF NOT EXISTS "links_page_latest_revision_created_idx" '
+        'ON "wagtailcore_page" ("latest_revision_created_at")',
+    ),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0016_remove_basicpage_struct_org_actions_and_more'),
+        ('links', '0005_remove_linkindexpage_struct_org_actions_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='linkpagecategory',
+            index=models.Index(fields=['link_category', 'page'], name='links_category_page_idx'),
+        ),
+    ] + [
+        migrations.RunSQL(sql, reverse_sql=f'DROP INDEX IF EXISTS "{name}"') for name, sql in PAGE_INDEXES
+    ]
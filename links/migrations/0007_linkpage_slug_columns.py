@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:51
+
+from django.db import migrations, models
+
+
+def fill_slug_columns(apps, schema_editor):
+    LinkPage = apps.get_model("links", "LinkPage")
+    LinkPageCategory = apps.get_model("links", "LinkPageCategory")
+    LinkPageTag = apps.get_model("links", "LinkPageTag")
+
+    categories, tags = {}, {}
+    for page_id, slug in LinkPageCategory.objects.values_list("page_id", "link_category__slug"):
+        categories.setdefault(page_id, []).append(slug)
+    for page_id, slug in LinkPageTag.objects.values_list("content_object_id", "tag__slug"):
+        tags.setdefault(page_id, []).append(slug)
+
+    def column(slugs):
+        return "|{}|".format("|".join(sorted(set(slugs)))) if slugs else ""
+
+    pages = []
+    for page in LinkPage.objects.only("pk"):
+        page.category_slugs = column(categories.get(page.pk))
+        page.tag_slugs = column(tags.get(page.pk))
+        pages.append(page)
+    LinkPage.objects.bulk_update(pages, ["category_slugs", "tag_slugs"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0006_linkpagecategory_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='linkpage',
+            name='category_slugs',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='linkpage',
+            name='tag_slugs',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_slug_columns, migrations.RunPython.noop),
+    ]
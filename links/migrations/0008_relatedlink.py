@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0007_linkpage_slug_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='links.linkpage')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='links.linkpage')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('page', 'rank'), name='links_related_page_rank_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0008_relatedlink'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkClicks',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('clicks', models.PositiveIntegerField(default=0)),
+                ('link', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_clicks', to='links.linkpage')),
+            ],
+            options={
+                'verbose_name_plural': 'Link clicks',
+                'constraints': [models.UniqueConstraint(fields=('link', 'date'), name='links_clicks_link_date_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:09
+
+from django.db import migrations, models
+
+# The recently added sort, newest links first. The recently updated
+# sort uses links_page_last_published_idx from 0006.
+FIRST_PUBLISHED_INDEX = (
+    'CREATE INDEX IF NOT EXISTS "links_page_first_published_idx" '
+    'ON "wagtailcore_page" ("first_published_at")'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0009_linkclicks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='linkpage',
+            name='popularity',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='linkpage',
+            index=models.Index(fields=['popularity', 'page_ptr'], name='links_page_popularity_idx'),
+        ),
+        migrations.RunSQL(
+            FIRST_PUBLISHED_INDEX, reverse_sql='DROP INDEX IF EXISTS "links_page_first_published_idx"'
+        ),
+    ]
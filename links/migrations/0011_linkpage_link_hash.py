@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:12
+
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from django.db import migrations, models
+
+# A copy of links.duplicates.url_hash() as it was when this migration was
+# written, so later changes to it don't change what this migration does
+
+TRACKING_PARAMS = frozenset(["fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref", "_ga"])
+TRACKING_PREFIXES = ("utm_",)
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+
+def canonical_url(url):
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and str(port) != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/")
+    path = re.sub(r"/index\.(html?|php)$", "", path)
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in TRACKING_PARAMS and not name.lower().startswith(TRACKING_PREFIXES)
+    )
+    return host + path + (f"?{urlencode(query)}" if query else "")
+
+
+def url_hash(url):
+    return hashlib.sha1(canonical_url(url).encode(), usedforsecurity=False).hexdigest()[:16]
+
+
+def fill_link_hash(apps, schema_editor):
+    LinkPage = apps.get_model("links", "LinkPage")
+    pages = []
+    for page in LinkPage.objects.only("pk", "link"):
+        page.link_hash = url_hash(page.link)
+        pages.append(page)
+    LinkPage.objects.bulk_update(pages, ["link_hash"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0010_linkpage_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='linkpage',
+            name='link_hash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=16),
+        ),
+        migrations.RunPython(fill_link_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('links', '0011_linkpage_link_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='linkpage',
+            name='slugs_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,21 +1,41 @@
+import hashlib
+
 from django.conf import settings
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.paginator import EmptyPage, PageNotAnInteger
 from django.db import models
-from django.db.models import Prefetch
-from django.shortcuts import render
+from django.http import Http404, HttpResponse, HttpResponseNotModified, HttpResponsePermanentRedirect
+from django.shortcuts import get_object_or_404, render
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.utils.functional import cached_property
 from modelcluster.contrib.taggit import ClusterTaggableManager
 from modelcluster.fields import ParentalKey
 from taggit.models import TaggedItemBase
 from wagtail.admin.panels import FieldPanel, InlinePanel, MultiFieldPanel
-from wagtail.contrib.routable_page.models import RoutablePageMixin
+from wagtail.contrib.routable_page.models import RoutablePageMixin, path
 from wagtail.fields import RichTextField
 from wagtail.models import Page
 from wagtail.search import index
 from wagtailseo.models import SeoMixin
 
+from core.middleware import accepts_encoding, etag_matches
+from core.release import release_version
+from core.routing import CachedUrlMixin
+from home.images import og_rendition
+from home.menus import menus_version
+from home.models import ModelCategory
+from home.richtext import richtext_version
+from home.seo import seo_version
+
+from .duplicates import url_hash
+from .listing import LinkRowPaginator, link_rows_queryset
+from .related import update_related_links
+
+# Seconds shared caches may keep a directory page before checking its ETag
+DIRECTORY_CACHE_SECONDS = getattr(settings, "DIRECTORY_CACHE_SECONDS", 300)
 
-class LinkIndexPage(RoutablePageMixin, SeoMixin, Page):
+
+class LinkIndexPage(CachedUrlMixin, RoutablePageMixin, SeoMixin, Page):
     # Set parent_page_types to an empty list to prevent it from
     # being created in the editor interface.
     parent_page_types = ["home.HomePage"]
@@ -34,7 +54,7 @@ class LinkIndexPage(RoutablePageMixin, SeoMixin, Page):
 
     promote_panels = SeoMixin.seo_meta_panels + SeoMixin.seo_menu_panels
 
-    def get_context(self, request, *args, **kwargs):
+    def get_context(self, request, *args, category=None, tag=None, **kwargs):
         context = super().get_context(request, *args, **kwargs)
         context["links_page"] = self
 
@@ -42,25 +62,30 @@ class LinkIndexPage(RoutablePageMixin, SeoMixin, Page):
         # TODO: I could just define the filter in models.py
         from .filters import LinkFilter
 
-        links_list = (
-            LinkPage.objects.descendant_of(self)
-            .live()
-            .order_by("title")
-            .prefetch_related(
-                Prefetch(
-                    "categories",
-                    queryset=LinkPageCategory.objects.select_related("link_category"),
-                    to_attr="prefetched_categories",
-                )
-            )
-        )
-
-        queryset = links_list
-        link_page_filter = LinkFilter(request.GET, queryset=queryset)
-        filtered_queryset = link_page_filter.qs
+        # Only the columns the template shows, categories included
+        queryset = self.get_links()
+        if tag is not None:
+            queryset = queryset.filter(tag_slugs__contains=slug_token(tag.slug))
+
+        data = request.GET
+        if category is not None:
+            data = data.copy()
+            data["category"] = category.slug
+        link_page_filter = LinkFilter(data, queryset=queryset)
+        if not link_page_filter.is_valid() and "category" not in link_page_filter.errors:
+            # A made up sort is dropped, rather than a reason to 404 a
+            # category that exists
+            data = data.copy()
+            for name in link_page_filter.errors:
+                data.pop(name, None)
+            link_page_filter = LinkFilter(data, queryset=queryset)
+        if category is not None and not link_page_filter.is_valid():
+            # The category has no links
+            raise Http404
+        filtered_queryset = link_rows_queryset(link_page_filter.qs)
 
         page = request.GET.get("page")
-        paginator = Paginator(filtered_queryset, 1000)
+        paginator = LinkRowPaginator(filtered_queryset, 1000)
 
         try:
             links = paginator.page(page)
@@ -71,31 +96,145 @@ class LinkIndexPage(RoutablePageMixin, SeoMixin, Page):
 
         context["filter"] = link_page_filter
         context["links"] = links
+        context["category_url_prefix"] = self.category_url_prefix()
 
         return context
 
-    def serve(self, request, *args, **kwargs):
-        # Override the Page.serve() method if it's a HTMX request.
+    def category_url_prefix(self):
+        # category_route's path, less the slug, for the template to add
+        return f"{self.url}category/"
+
+    def category_url(self, slug):
+        return f"{self.category_url_prefix()}{slug}/"
+
+    def tag_url(self, slug):
+        return f"{self.url}tag/{slug}/"
+
+    @path("")
+    def index_route(self, request, *args, **kwargs):
+        # Override the default route if it's a HTMX request.
         # In Django this would normally go in your views.py file
 
+        # The filter form asks for ?category=, which has a URL of its own
+        # that's canonical, and that caches only need to hold once
+        if request.GET.get("category"):
+            from .filters import LinkFilter
+
+            # Only the category matters, a bad sort is dropped there
+            if "category" not in LinkFilter(request.GET).errors:
+                url = self.category_url(request.GET["category"])
+                query = request.GET.copy()
+                del query["category"]
+                if query:
+                    url = f"{url}?{query.urlencode()}"
+                if not request.htmx:
+                    return HttpResponsePermanentRedirect(url)
+                response = self.render_directory(request, "index")
+                response["HX-Push-Url"] = url
+                return response
+
+        return self.render_directory(request, "index")
+
+    @path("category/<slug:category>/", name="category")
+    def category_route(self, request, category):
+        category = get_object_or_404(ModelCategory.objects.only("slug", "name"), slug=category)
+        self.seo_title = f"{category.name} | {self.seo_pagetitle}"
+        self.seo_canonical_url = settings.BASE_URL + self.category_url(category.slug)
+        return self.render_directory(request, f"category:{category.slug}", category=category)
+
+    @path("tag/<slug:tag>/", name="tag")
+    def tag_route(self, request, tag):
+        tag = get_object_or_404(LinkPageTag.tag_model().objects.only("slug", "name"), slug=tag)
+        self.seo_title = f"{tag.name} | {self.seo_pagetitle}"
+        self.seo_canonical_url = settings.BASE_URL + self.tag_url(tag.slug)
+        return self.render_directory(request, f"tag:{tag.slug}", tag=tag)
+
+    def directory_etag(self, request, route):
+        """
+        Changes whenever something the directory shows does: the links (see
+        links.bundle), the page itself, the menus, the SEO tags, the rich
+        text or the release, and for the popular sort, the links' scores.
+        """
+        from .bundle import load_bundle
+        from .scores import scores_version
+
+        key = ":".join(
+            [
+                load_bundle(self).etag,
+                release_version(),
+                str(self.live_revision_id),
+                str(menus_version()),
+                str(seo_version()),
+                str(richtext_version()),
+                str(scores_version()) if request.GET.get("sort") == "popular" else "",
+                route,
+                "htmx" if request.htmx else "",
+                request.GET.urlencode(),
+            ]
+        )
+        return '"{}"'.format(hashlib.sha1(key.encode(), usedforsecurity=False).hexdigest()[:16])
+
+    def render_directory(self, request, route, **kwargs):
+        # Logged in editors get the userbar, so their pages can't be shared
+        etag = None
+        if not request.user.is_authenticated and not getattr(request, "is_preview", False):
+            etag = self.directory_etag(request, route)
+            if etag_matches(request, etag):
+                response = HttpResponseNotModified()
+                response["ETag"] = etag
+                return response
+
         if request.htmx:
-            context = self.get_context(request, *args, **kwargs)
-            if "links" in context:
-                result_dict = {"links": context["links"], "filter": context["filter"]}
-                return render(request, "links/link_index_page.html#links-results", result_dict)
-            else:
-                result_dict = {"links": None, "filter": context["filter"]}
-                return render(request, "links/link_index_page.html#links-results", result_dict)
+            context = self.get_context(request, **kwargs)
+            result_dict = {
+                "links": context["links"],
+                "filter": context["filter"],
+                "category_url_prefix": context["category_url_prefix"],
+            }
+            response = render(request, "links/link_index_page.html#links-results", result_dict)
+        else:
+            response = super().index_route(request, **kwargs)
+
+        if etag:
+            response["ETag"] = etag
+            # Browsers check back each time, shared caches can hold it a while
+            patch_cache_control(response, public=True, max_age=0, s_maxage=DIRECTORY_CACHE_SECONDS)
+
+        # The partial and the full page share a URL, so caches need to tell them apart
+        patch_vary_headers(response, ["HX-Request"])
+        return response
+
+    @path("data/", name="directory_data")
+    def directory_data(self, request):
+        """
+        The whole directory as compact JSON, for directory.js to filter and
+        render without a round trip per filter change.
+        """
+        from .bundle import load_bundle
+
+        bundle = load_bundle(self)
+        if request.headers.get("If-None-Match") == bundle.etag:
+            response = HttpResponseNotModified()
+        elif accepts_encoding(request, "gzip"):
+            response = HttpResponse(bundle.gzipped, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
         else:
-            return super().serve(request, *args, **kwargs)
+            response = HttpResponse(bundle.content, content_type="application/json")
+
+        response["ETag"] = bundle.etag
+        # Always revalidate, it's a cheap 304 until something is published
+        response["Cache-Control"] = "no-cache"
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
 
     def get_links(self):
+        # In title order, unless LinkFilter sorts them otherwise
         return LinkPage.objects.descendant_of(self).live().order_by("title")
 
     @cached_property
     def seo_image_url(self):
         if self.og_image:
-            image_url = self.og_image.get_rendition("width-1200").url
+            image_url = og_rendition(self.og_image).url
             return settings.BASE_URL + image_url
 
         return ""
@@ -105,7 +244,19 @@ class LinkIndexPage(RoutablePageMixin, SeoMixin, Page):
         return settings.BASE_URL + self.url
 
 
-class LinkPage(Page):
+def slug_column(slugs):
+    """
+    Slugs as a single column value, `|a|b|`, so a row with a slug can be
+    found with `contains=slug_token(slug)` rather than a join.
+    """
+    return "|{}|".format("|".join(sorted(slugs))) if slugs else ""
+
+
+def slug_token(slug):
+    return f"|{slug}|"
+
+
+class LinkPage(CachedUrlMixin, Page):
     parent_page_types = ["LinkIndexPage"]
 
     link = models.URLField()
@@ -124,6 +275,21 @@ class LinkPage(Page):
         related_name="+",
     )
 
+    # Copies of the categories' and tags' slugs, see slug_column(), kept up
+    # to date by save() and links.signals
+    category_slugs = models.TextField(blank=True, default="", editable=False)
+    tag_slugs = models.TextField(blank=True, default="", editable=False)
+    # When links.signals last changed them without the page being published,
+    # so update_related_links redoes the page
+    slugs_changed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Recent clicks per day, worked out by links.scores.refresh_link_scores
+    popularity = models.FloatField(default=0, editable=False)
+
+    # links.duplicates.url_hash() of the link, so links to the same site
+    # can be found with an index lookup
+    link_hash = models.CharField(max_length=16, blank=True, default="", editable=False, db_index=True)
+
     content_panels = Page.content_panels + [
         FieldPanel("link_image", help_text="I dunno, a logo maybe?"),
         FieldPanel("link"),
@@ -143,14 +309,91 @@ class LinkPage(Page):
 
     search_fields = Page.search_fields + [  # Inherit search_fields from Page
         index.SearchField("description"),
-        index.FilterField("tags"),
-        index.FilterField("categories"),
     ]
 
     class Meta:
         ordering = ["title"]
         verbose_name = "Link"
         verbose_name_plural = "Links"
+        indexes = [
+            # The directory's most popular sort, see links.filters.SORTS
+            models.Index(fields=["popularity", "page_ptr"], name="links_page_popularity_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Only when saving the whole page, i.e. its live content. Saving a
+        # draft updates a few fields and leaves the categories alone too.
+        if kwargs.get("update_fields") is None:
+            self.link_hash = url_hash(self.link)
+            self.category_slugs = slug_column(
+                {category.link_category.slug for category in self.categories.all() if category.link_category_id}
+            )
+            self.tag_slugs = slug_column({tag.slug for tag in self.tags.all()})
+        # The categories and tags are saved after the page, and needn't update it
+        self._saving_slugs = True
+        try:
+            return super().save(*args, **kwargs)
+        finally:
+            del self._saving_slugs
+
+    def get_duplicates(self):
+        """
+        Other links to the same site, ignoring differences like http or
+        https, `www.` and tracking parameters.
+        """
+        return LinkPage.objects.filter(link_hash=url_hash(self.link)).exclude(pk=self.pk).order_by("title")
+
+    def with_content_json(self, content):
+        # The popularity isn't edited, so a revision's copy of it is stale
+        obj = super().with_content_json(content)
+        obj.popularity = self.popularity
+        return obj
+
+    def get_context(self, request, *args, **kwargs):
+        context = super().get_context(request, *args, **kwargs)
+        # Worked out ahead of time, see links.related
+        context["related_links"] = [
+            related_link.related
+            for related_link in RelatedLink.objects.filter(page=self, related__live=True)
+            .order_by("rank")
+            .select_related("related")
+            .only("related__title", "related__url_path", "related__description")
+        ]
+        return context
+
+    @classmethod
+    def refresh_slugs(cls, page_ids):
+        """
+        Recalculate the pages' slug columns from their saved categories and
+        tags, e.g. after a category's slug changes, and queue their related
+        links to be redone.
+        """
+        page_ids = set(page_ids)
+        if not page_ids:
+            return
+        categories, tags = {}, {}
+        for page_id, slug in LinkPageCategory.objects.filter(page_id__in=page_ids).values_list(
+            "page_id", "link_category__slug"
+        ):
+            categories.setdefault(page_id, set()).add(slug)
+        for page_id, slug in LinkPageTag.objects.filter(content_object_id__in=page_ids).values_list(
+            "content_object_id", "tag__slug"
+        ):
+            tags.setdefault(page_id, set()).add(slug)
+        changed_at = timezone.now()
+        cls.objects.bulk_update(
+            [
+                cls(
+                    pk=page_id,
+                    category_slugs=slug_column(categories.get(page_id)),
+                    tag_slugs=slug_column(tags.get(page_id)),
+                    slugs_changed_at=changed_at,
+                )
+                for page_id in page_ids
+            ],
+            ["category_slugs", "tag_slugs", "slugs_changed_at"],
+        )
+        update_related_links.enqueue()
 
 
 class LinkPageCategory(models.Model):
@@ -163,6 +406,46 @@ class LinkPageCategory(models.Model):
 
     class Meta:
         unique_together = ("page", "link_category")
+        indexes = [
+            # Filtering the directory by category, then joining to the pages
+            models.Index(fields=["link_category", "page"], name="links_category_page_idx"),
+        ]
+
+
+class RelatedLink(models.Model):
+    """
+    One of a link's most similar links, worked out ahead of time by
+    links.related.update_related_links.
+    """
+
+    page = models.ForeignKey("links.LinkPage", on_delete=models.CASCADE, related_name="related_links")
+    related = models.ForeignKey("links.LinkPage", on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # Also the index a link page's related links are read with
+            models.UniqueConstraint(fields=["page", "rank"], name="links_related_page_rank_unique"),
+        ]
+
+
+class LinkClicks(models.Model):
+    """
+    How many times a link was followed from the directory on a day, added to
+    in batches by links.clicks.flush().
+    """
+
+    link = models.ForeignKey("links.LinkPage", on_delete=models.CASCADE, related_name="daily_clicks")
+    date = models.DateField()
+    clicks = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Link clicks"
+        constraints = [
+            # flush() adds to the day's row with INSERT ... ON CONFLICT
+            models.UniqueConstraint(fields=["link", "date"], name="links_clicks_link_date_unique"),
+        ]
 
 
 class LinkPageTag(TaggedItemBase):
@@ -0,0 +1,148 @@
+import heapq
+import math
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from tasks.queue import task
+
+# How many related links each link keeps
+RELATED_LINKS_COUNT = getattr(settings, "RELATED_LINKS_COUNT", 5)
+
+# Sharing a category says more than sharing a tag, which says more than
+# sharing a word in the description
+CATEGORY_WEIGHT = 3.0
+TAG_WEIGHT = 2.0
+TERM_WEIGHT = 1.0
+
+# When update_related_links last ran, so the next run only has to redo
+# the links changed since. Losing it just means a full rebuild.
+LAST_RUN_KEY = "related-links:last-run"
+
+STOP_WORDS = frozenset(
+    "and are but can for from has have how its not our that the their them they this was were what when which "
+    "who will with you your".split()
+)
+
+TERM_RE = re.compile(r"[a-z0-9]+")
+
+
+def link_features(description, category_slugs, tag_slugs):
+    """
+    A link's categories, tags and description words, each with the weight
+    it gets before IDF, from the columns LinkPage denormalises them into.
+    """
+    features = {}
+    for term in TERM_RE.findall(description.lower()):
+        if len(term) > 2 and term not in STOP_WORDS:
+            features[f"w:{term}"] = TERM_WEIGHT
+    for slug in filter(None, tag_slugs.split("|")):
+        features[f"t:{slug}"] = TAG_WEIGHT
+    for slug in filter(None, category_slugs.split("|")):
+        features[f"c:{slug}"] = CATEGORY_WEIGHT
+    return features
+
+
+def link_vectors(rows):
+    """
+    Unit length TF-IDF vectors, as `{feature: weight}`, from `(id,
+    description, category_slugs, tag_slugs)` rows, so that what most links
+    have in common counts for less than what only a few do.
+    """
+    features = {page_id: link_features(*columns) for page_id, *columns in rows}
+    document_frequency = defaultdict(int)
+    for page_features in features.values():
+        for feature in page_features:
+            document_frequency[feature] += 1
+
+    vectors = {}
+    for page_id, page_features in features.items():
+        vector = {
+            feature: weight * math.log(len(features) / document_frequency[feature])
+            for feature, weight in page_features.items()
+        }
+        length = math.sqrt(sum(weight * weight for weight in vector.values()))
+        vectors[page_id] = {feature: weight / length for feature, weight in vector.items() if weight} if length else {}
+    return vectors
+
+
+def inverted_index(vectors):
+    # Only features two links share can make them similar
+    index = defaultdict(list)
+    for page_id, vector in vectors.items():
+        for feature, weight in vector.items():
+            index[feature].append((page_id, weight))
+    return {feature: postings for feature, postings in index.items() if len(postings) > 1}
+
+
+def most_similar(vectors, index, page_id, count=RELATED_LINKS_COUNT):
+    """
+    The `count` links with the greatest cosine similarity to `page_id`, as
+    `(id, score)` pairs. Only the links sharing a feature with it are
+    scored, by walking that feature's postings.
+    """
+    scores = defaultdict(float)
+    for feature, weight in vectors[page_id].items():
+        for other_id, other_weight in index.get(feature, ()):
+            if other_id != page_id:
+                scores[other_id] += weight * other_weight
+    # Ties go to the older link, so reruns don't shuffle them
+    return heapq.nlargest(count, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+@task(priority=-10, dedupe_key="related-links")
+def update_related_links(full=False):
+    """
+    Recalculate the related links of the links published, or whose
+    categories or tags changed, since the last run, and of those whose
+    related links they could now be or stop being.
+    With `full`, or the first time, recalculate them all. Returns how many
+    links were recalculated.
+    """
+    from .models import LinkPage, RelatedLink
+
+    started = timezone.now()
+    since = None if full else cache.get(LAST_RUN_KEY)
+
+    vectors = link_vectors(
+        LinkPage.objects.live().values_list("id", "description", "category_slugs", "tag_slugs").iterator()
+    )
+    index = inverted_index(vectors)
+
+    if since is None:
+        page_ids = set(vectors)
+    else:
+        changed = set(
+            LinkPage.objects.filter(Q(last_published_at__gte=since) | Q(slugs_changed_at__gte=since)).values_list(
+                "id", flat=True
+            )
+        )
+        page_ids = changed & set(vectors)
+        # Links sharing something with a changed link now...
+        for page_id in list(page_ids):
+            for feature in vectors[page_id]:
+                page_ids.update(other_id for other_id, _weight in index.get(feature, ()))
+        # ...or which had one, or an unpublished link, among their related links
+        page_ids.update(
+            RelatedLink.objects.filter(related_id__in=changed).values_list("page_id", flat=True),
+            RelatedLink.objects.exclude(related_id__in=list(vectors)).values_list("page_id", flat=True),
+        )
+        page_ids &= set(vectors)
+
+    related_links = [
+        RelatedLink(page_id=page_id, related_id=related_id, rank=rank, score=score)
+        for page_id in page_ids
+        for rank, (related_id, score) in enumerate(most_similar(vectors, index, page_id))
+    ]
+    with transaction.atomic():
+        RelatedLink.objects.exclude(page_id__in=list(vectors)).delete()
+        RelatedLink.objects.filter(page_id__in=page_ids).delete()
+        RelatedLink.objects.bulk_create(related_links, batch_size=500)
+
+    cache.set(LAST_RUN_KEY, started, None)
+    return len(page_ids)
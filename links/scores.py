@@ -0,0 +1,64 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.versions import bump_version, get_version
+from tasks.queue import task
+
+# Days of clicks a link's popularity is worked out from
+POPULARITY_DAYS = getattr(settings, "LINK_POPULARITY_DAYS", 28)
+
+# Days after which a click counts half as much as one today
+HALF_LIFE_DAYS = getattr(settings, "LINK_POPULARITY_HALF_LIFE_DAYS", 7)
+
+VERSION_KEY = "link-scores:version"
+
+
+def scores_version():
+    return get_version(VERSION_KEY)
+
+
+def day_weight(age):
+    return 0.5 ** (age / HALF_LIFE_DAYS)
+
+
+def popularity(daily_clicks, days_live):
+    """
+    Clicks per day over the last POPULARITY_DAYS, from `{age in days:
+    clicks}`, with recent days counting for more. It's per day the link has
+    been live, so a new link isn't outranked just for being new.
+    """
+    exposure = sum(day_weight(age) for age in range(min(days_live, POPULARITY_DAYS)))
+    if not exposure:
+        return 0.0
+    return round(sum(clicks * day_weight(age) for age, clicks in daily_clicks.items()) / exposure, 4)
+
+
+@task(priority=-10, dedupe_key="link-scores")
+def refresh_link_scores():
+    """
+    Recalculate every link's popularity from its daily clicks, saving the
+    ones that have changed. Returns how many did.
+    """
+    from .models import LinkClicks, LinkPage
+
+    today = timezone.localdate()
+    clicks = defaultdict(dict)
+    for link_id, date, count in LinkClicks.objects.filter(date__gt=today - timedelta(days=POPULARITY_DAYS)).values_list(
+        "link_id", "date", "clicks"
+    ):
+        clicks[link_id][(today - date).days] = count
+
+    changed = []
+    for pk, first_published_at, current in LinkPage.objects.values_list("pk", "first_published_at", "popularity"):
+        days_live = (today - timezone.localdate(first_published_at)).days + 1 if first_published_at else 0
+        score = popularity(clicks.get(pk, {}), days_live)
+        if score != current:
+            changed.append(LinkPage(pk=pk, popularity=score))
+    LinkPage.objects.bulk_update(changed, ["popularity"], batch_size=500)
+    if changed:
+        # The directory's ETags for the popular sort depend on the scores
+        bump_version(VERSION_KEY)
+    return len(changed)
@@ -0,0 +1,76 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from taggit.models import Tag
+from wagtail.signals import page_published, page_unpublished
+
+from home.models import ModelCategory, ModelTag
+
+from .bundle import write_bundle, write_bundles_for_page
+from .models import LinkIndexPage, LinkPage, LinkPageCategory, LinkPageTag
+from .related import update_related_links
+
+
+@receiver(page_published, sender=LinkPage)
+@receiver(page_unpublished, sender=LinkPage)
+@receiver(post_delete, sender=LinkPage)
+def rebuild_directory_bundle(sender, instance, **kwargs):
+    transaction.on_commit(lambda: write_bundles_for_page(instance))
+
+
+@receiver(page_published, sender=LinkPage)
+@receiver(page_unpublished, sender=LinkPage)
+def queue_related_links_update(sender, instance, **kwargs):
+    update_related_links.enqueue()
+
+
+@receiver(post_save, sender=ModelCategory)
+@receiver(post_delete, sender=ModelCategory)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=ModelTag)
+@receiver(post_delete, sender=ModelTag)
+def rebuild_all_directory_bundles(sender, instance, **kwargs):
+    # Category and tag names are in every bundle
+    def rebuild():
+        for index_page in LinkIndexPage.objects.live():
+            write_bundle(index_page)
+
+    transaction.on_commit(rebuild)
+
+
+def refresh_slugs_for(instance, page_field):
+    page = instance._meta.get_field(page_field).get_cached_value(instance, None)
+    # Saving the page has already worked them out from its categories and tags
+    if not getattr(page, "_saving_slugs", False):
+        LinkPage.refresh_slugs([getattr(instance, f"{page_field}_id")])
+
+
+@receiver(post_save, sender=LinkPageCategory)
+@receiver(post_delete, sender=LinkPageCategory)
+def refresh_page_category_slugs(sender, instance, **kwargs):
+    refresh_slugs_for(instance, "page")
+
+
+@receiver(post_save, sender=LinkPageTag)
+@receiver(post_delete, sender=LinkPageTag)
+def refresh_page_tag_slugs(sender, instance, **kwargs):
+    refresh_slugs_for(instance, "content_object")
+
+
+@receiver(post_save, sender=ModelCategory)
+def refresh_category_slugs(sender, instance, created, **kwargs):
+    # A new category isn't on any pages yet
+    if not created:
+        LinkPage.refresh_slugs(
+            LinkPageCategory.objects.filter(link_category=instance).values_list("page_id", flat=True)
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=ModelTag)
+def refresh_tag_slugs(sender, instance, created, **kwargs):
+    if not created:
+        LinkPage.refresh_slugs(
+            LinkPageTag.objects.filter(tag_id=instance.pk).values_list("content_object_id", flat=True)
+        )
@@ -1 +1,20 @@
-# Create your views here.
+from django.http import Http404, HttpResponseRedirect
+from django.views.decorators.cache import never_cache
+
+from .clicks import record_click
+from .models import LinkPage
+
+
+@never_cache
+def go(request, link_id):
+    """
+    Send the visitor on to a link from the directory, counting that they
+    went. Not cached, or the clicks caches answered wouldn't be counted.
+    """
+    try:
+        url = LinkPage.objects.live().values_list("link", flat=True).get(pk=link_id)
+    except LinkPage.DoesNotExist:
+        raise Http404 from None
+
+    record_click(link_id)
+    return HttpResponseRedirect(url)
@@ -1,9 +1,13 @@
+from django.db.models import Exists, OuterRef
+from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from wagtail import hooks
+from wagtail.admin import messages
 from wagtail.admin.ui.tables import DateColumn
 from wagtail.admin.ui.tables.pages import BulkActionsColumn, PageStatusColumn, PageTitleColumn
 from wagtail.admin.views.pages.listing import IndexView
 from wagtail.admin.viewsets.pages import PageListingViewSet
+from wagtail.permissions import page_permission_policy
 
 from links.models import LinkPage
 
@@ -11,6 +15,14 @@ from links.models import LinkPage
 class LinkPageIndexView(IndexView):
     default_ordering = "-last_published_at"
 
+    def get_base_queryset(self):
+        # Wagtail's `pk IN (explorable pages)` is where SQLite starts the
+        # query from, so it sorts every page rather than reading them in
+        # order from the ordering's index. EXISTS is checked row by row.
+        explorable = page_permission_policy.explorable_instances(self.request.user)
+        pages = self.model.objects.filter(depth__gt=1).filter(Exists(explorable.filter(pk=OuterRef("pk"))))
+        return self.annotate_queryset(pages)
+
 
 class LinkPageListingViewSet(PageListingViewSet):
     model = LinkPage
@@ -52,3 +64,23 @@ linkpage_viewset = LinkPageListingViewSet()
 @hooks.register("register_admin_viewset")
 def register_admin_viewset():
     return linkpage_viewset
+
+
+@hooks.register("after_create_page")
+@hooks.register("after_edit_page")
+def warn_about_duplicate_links(request, page):
+    """
+    Saving still goes ahead, it may be a different part of the same site.
+    """
+    if not isinstance(page, LinkPage):
+        return
+    duplicates = list(page.get_duplicates()[:5])
+    if duplicates:
+        messages.warning(
+            request,
+            _("'%(title)s' looks like a link to the same site as another link.") % {"title": page.title},
+            buttons=[
+                messages.button(reverse("wagtailadmin_pages:edit", args=[duplicate.pk]), duplicate.title)
+                for duplicate in duplicates
+            ],
+        )
@@ -3,6 +3,14 @@ from django.shortcuts import render
 from wagtail.contrib.search_promotions.models import Query
 from wagtail.models import Page
 
+from home.warmup import WARMUP_HEADER
+from tasks.queue import task
+
+
+@task(priority=-10)
+def record_search_hit(search_query):
+    Query.get(search_query).add_hit()
+
 
 def search(request):
     search_query = request.GET.get("query", None)
@@ -11,10 +19,10 @@ def search(request):
     # Search
     if search_query:
         search_results = Page.objects.live().search(search_query)
-        query = Query.get(search_query)
 
-        # Record hit
-        query.add_hit()
+        # Record hit, unless this is the cache warmer
+        if WARMUP_HEADER not in request.headers:
+            record_search_hit.enqueue(search_query)
     else:
         search_results = Page.objects.none()
 
@@ -0,0 +1,55 @@
+import hashlib
+import json
+
+from django.utils import timezone
+from django_tasks import TaskResult, TaskResultStatus
+from django_tasks.backends.base import BaseTaskBackend
+from django_tasks.exceptions import InvalidTaskError
+from django_tasks.utils import get_random_id
+
+from .queue import enqueue
+
+
+class QueueBackend(BaseTaskBackend):
+    """
+    A django_tasks backend that puts tasks in our queue, so Wagtail's own,
+    like updating the search index, run in a worker too.
+
+    They're deduplicated on their arguments: they bring something up to
+    date, so two waiting to do the same thing is one too many.
+    """
+
+    supports_defer = True
+    supports_priority = True
+
+    def validate_task(self, task):
+        super().validate_task(task)
+        if task.takes_context:
+            raise InvalidTaskError("Backend does not support tasks that take context.")
+
+    def enqueue(self, task, args, kwargs):
+        self.validate_task(task)
+
+        arguments = json.dumps([args, kwargs], sort_keys=True, default=str).encode()
+        enqueue(
+            task.module_path,
+            args,
+            kwargs,
+            priority=task.priority,
+            dedupe_key=f"{task.module_path}:{hashlib.sha1(arguments, usedforsecurity=False).hexdigest()}",
+            run_after=task.run_after,
+        )
+        return TaskResult(
+            task=task,
+            id=get_random_id(),
+            status=TaskResultStatus.READY,
+            enqueued_at=timezone.now(),
+            started_at=None,
+            last_attempted_at=None,
+            finished_at=None,
+            args=args,
+            kwargs=kwargs,
+            backend=self.alias,
+            errors=[],
+            worker_ids=[],
+        )
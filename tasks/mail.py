@@ -0,0 +1,79 @@
+import base64
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .queue import task
+
+
+def message_data(message):
+    """
+    An EmailMessage as JSON serialisable data, or None if it has parts that
+    can't be, e.g. MIME attachments.
+    """
+    attachments = []
+    for attachment in message.attachments:
+        if not isinstance(attachment, tuple):
+            return None
+        filename, content, mimetype = attachment
+        if isinstance(content, str):
+            content = content.encode()
+        attachments.append([filename, base64.b64encode(content).decode(), mimetype])
+
+    return {
+        "subject": message.subject,
+        "body": message.body,
+        "from_email": message.from_email,
+        "to": message.to,
+        "cc": message.cc,
+        "bcc": message.bcc,
+        "reply_to": message.reply_to,
+        "headers": message.extra_headers,
+        "content_subtype": message.content_subtype,
+        "alternatives": [list(alternative) for alternative in getattr(message, "alternatives", [])],
+        "attachments": attachments,
+    }
+
+
+def delivery_connection():
+    return get_connection(getattr(settings, "TASKS_EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend"))
+
+
+@task(priority=10, max_attempts=5)
+def send_email(data):
+    message = EmailMultiAlternatives(
+        subject=data["subject"],
+        body=data["body"],
+        from_email=data["from_email"],
+        to=data["to"],
+        cc=data["cc"],
+        bcc=data["bcc"],
+        reply_to=data["reply_to"],
+        headers=data["headers"],
+        alternatives=[tuple(alternative) for alternative in data["alternatives"]],
+        connection=delivery_connection(),
+    )
+    message.content_subtype = data["content_subtype"]
+    for filename, content, mimetype in data["attachments"]:
+        message.attach(filename, base64.b64decode(content), mimetype)
+    message.send()
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Queue emails to be sent by a worker, through TASKS_EMAIL_BACKEND, so
+    sending them doesn't hold up the request.
+    """
+
+    def send_messages(self, email_messages):
+        unqueued = []
+        for message in email_messages:
+            data = message_data(message)
+            if data is None:
+                unqueued.append(message)
+            else:
+                send_email.enqueue(data)
+        if unqueued:
+            delivery_connection().send_messages(unqueued)
+        return len(email_messages)
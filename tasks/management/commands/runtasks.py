@@ -0,0 +1,69 @@
+import logging
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+
+from tasks.queue import claim, prune, requeue_abandoned, run
+
+logger = logging.getLogger(__name__)
+
+# Seconds between looking for abandoned tasks and pruning old ones
+HOUSEKEEPING_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = "Run queued tasks, one at a time, until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sleep", type=float, default=1, help="Seconds to wait when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="Stop when the queue is empty")
+        parser.add_argument("--max-tasks", type=int, help="Stop after running this many tasks")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        # Finish the current task before stopping
+        handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            ran, failed = self.work(f"{socket.gethostname()}:{os.getpid()}", options)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        self.stdout.write(f"Ran {ran} tasks, {failed} failed")
+
+    def work(self, worker_id, options):
+        ran = failed = 0
+        housekept = 0
+        while not self.stopping:
+            close_old_connections()
+            try:
+                if time.monotonic() - housekept > HOUSEKEEPING_INTERVAL:
+                    requeue_abandoned()
+                    prune()
+                    housekept = time.monotonic()
+
+                queued_task = claim(worker_id)
+            except OperationalError:
+                # Usually "database is locked", while another process writes
+                logger.warning("Couldn't claim a task, trying again", exc_info=True)
+                time.sleep(options["sleep"])
+                continue
+
+            if queued_task is None:
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+                continue
+
+            if not run(queued_task):
+                failed += 1
+            ran += 1
+            if options["max_tasks"] and ran >= options["max_tasks"]:
+                break
+        return ran, failed
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,196 @@
+import functools
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import QueuedTask
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Seconds before the first retry, doubling with each attempt after that
+RETRY_DELAY = getattr(settings, "TASKS_RETRY_DELAY", 30)
+
+# Seconds a worker has to finish a task before it's assumed to have died
+# and the task is given to another
+LEASE = getattr(settings, "TASKS_LEASE", 600)
+
+# Days finished tasks are kept for the admin
+KEEP_DAYS = getattr(settings, "TASKS_KEEP_DAYS", 7)
+
+
+class Task:
+    """
+    A function that can be queued up to run in a worker, with
+    `function.enqueue(*args, **kwargs)`. The arguments must be JSON
+    serialisable, so pass ids rather than model instances.
+    """
+
+    def __init__(self, func, priority=0, max_attempts=DEFAULT_MAX_ATTEMPTS, dedupe_key=None):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = f"{func.__module__}.{func.__qualname__}"
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.dedupe_key = dedupe_key
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def call(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs):
+        dedupe_key = self.dedupe_key(*args, **kwargs) if callable(self.dedupe_key) else self.dedupe_key
+        enqueue(
+            self.name,
+            args,
+            kwargs,
+            priority=self.priority,
+            max_attempts=self.max_attempts,
+            dedupe_key=dedupe_key,
+        )
+
+
+def task(func=None, *, priority=0, max_attempts=DEFAULT_MAX_ATTEMPTS, dedupe_key=None):
+    """
+    Make a module level function a Task. `dedupe_key` is a string, or a
+    function of the task's arguments returning one; while a task with the
+    same key is waiting to run, enqueueing another does nothing.
+    """
+
+    def decorator(func):
+        return Task(func, priority=priority, max_attempts=max_attempts, dedupe_key=dedupe_key)
+
+    return decorator(func) if func is not None else decorator
+
+
+def enqueue(
+    name, args=(), kwargs=None, *, priority=0, max_attempts=DEFAULT_MAX_ATTEMPTS, dedupe_key=None, run_after=None
+):
+    """
+    Queue up the task at dotted path `name`, with a single insert. It's
+    part of the current transaction, so workers only see it once that
+    commits, and not at all if it rolls back.
+    """
+    if getattr(settings, "TASKS_IMMEDIATE", False):
+        # Handy for development, where there's no worker running
+        transaction.on_commit(lambda: import_string(name).call(*args, **(kwargs or {})))
+        return
+
+    QueuedTask.objects.bulk_create(
+        [
+            QueuedTask(
+                name=name,
+                args=list(args),
+                kwargs=kwargs or {},
+                priority=priority,
+                max_attempts=max_attempts,
+                dedupe_key=dedupe_key or "",
+                run_after=run_after or timezone.now(),
+            )
+        ],
+        ignore_conflicts=bool(dedupe_key),
+    )
+
+
+def claim(worker_id):
+    """
+    Mark the next task that's ready to run as this worker's and return it,
+    or None if there isn't one.
+
+    A task is only claimed by the UPDATE that changes its status from
+    queued, which SQLite's write lock makes one worker at a time, so if
+    another worker gets there first this one moves on to the next task.
+    """
+    now = timezone.now()
+    candidates = (
+        QueuedTask.objects.filter(status=QueuedTask.Status.QUEUED, run_after__lte=now)
+        .order_by("-priority", "run_after", "id")
+        .values_list("pk", flat=True)[:10]
+    )
+    for pk in candidates:
+        claimed = QueuedTask.objects.filter(pk=pk, status=QueuedTask.Status.QUEUED).update(
+            status=QueuedTask.Status.RUNNING,
+            claimed_by=worker_id,
+            claimed_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return QueuedTask.objects.get(pk=pk)
+    return None
+
+
+def requeue(queued_task, run_after, error=""):
+    """
+    Put a task back in the queue, unless the same work has been queued
+    again since, in which case that will do.
+    """
+    try:
+        with transaction.atomic():
+            return QueuedTask.objects.filter(pk=queued_task.pk, claimed_by=queued_task.claimed_by).update(
+                status=QueuedTask.Status.QUEUED, run_after=run_after, claimed_by="", last_error=error
+            )
+    except IntegrityError:
+        return QueuedTask.objects.filter(pk=queued_task.pk, claimed_by=queued_task.claimed_by).update(
+            status=QueuedTask.Status.FAILED, finished_at=timezone.now(), last_error=error or "Queued again"
+        )
+
+
+def run(queued_task):
+    """
+    Run a claimed task, then record how it went. A failed task is retried
+    with exponential backoff until it's had max_attempts.
+    """
+    # Only the worker that still holds the claim records the outcome
+    mine = QueuedTask.objects.filter(pk=queued_task.pk, claimed_by=queued_task.claimed_by)
+    try:
+        import_string(queued_task.name).call(*queued_task.args, **queued_task.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Task %s (%s) failed", queued_task.pk, queued_task.name)
+        if queued_task.attempts < queued_task.max_attempts:
+            delay = RETRY_DELAY * 2 ** (queued_task.attempts - 1)
+            requeue(queued_task, timezone.now() + timedelta(seconds=delay), error)
+        else:
+            mine.update(status=QueuedTask.Status.FAILED, finished_at=timezone.now(), last_error=error)
+        return False
+
+    mine.update(status=QueuedTask.Status.SUCCEEDED, finished_at=timezone.now())
+    return True
+
+
+def requeue_abandoned():
+    """
+    Give the tasks of workers that have died to someone else, unless
+    they've had max_attempts, as a task that kills its worker, e.g. by
+    running out of memory, would otherwise be retried forever.
+    """
+    abandoned = QueuedTask.objects.filter(
+        status=QueuedTask.Status.RUNNING, claimed_at__lt=timezone.now() - timedelta(seconds=LEASE)
+    )
+    for queued_task in abandoned:
+        error = "Abandoned by " + queued_task.claimed_by
+        if queued_task.attempts < queued_task.max_attempts:
+            requeue(queued_task, timezone.now(), error)
+        else:
+            QueuedTask.objects.filter(pk=queued_task.pk, claimed_by=queued_task.claimed_by).update(
+                status=QueuedTask.Status.FAILED, finished_at=timezone.now(), last_error=error
+            )
+
+
+def prune():
+    """
+    Delete finished tasks older than KEEP_DAYS.
+    """
+    return QueuedTask.objects.filter(
+        status__in=[QueuedTask.Status.SUCCEEDED, QueuedTask.Status.FAILED],
+        finished_at__lt=timezone.now() - timedelta(days=KEEP_DAYS),
+    ).delete()[0]
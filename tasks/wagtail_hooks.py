@@ -0,0 +1,52 @@
+from django.db import IntegrityError
+from wagtail import hooks
+from wagtail.admin.views.generic import EditView
+from wagtail.admin.viewsets.model import ModelViewSet
+from wagtail.permission_policies import ModelPermissionPolicy
+
+from .models import QueuedTask
+
+
+class QueuedTaskPermissionPolicy(ModelPermissionPolicy):
+    def user_has_permission(self, user, action):
+        # Tasks are queued by code, not by hand
+        return action != "add" and super().user_has_permission(user, action)
+
+
+class QueuedTaskEditView(EditView):
+    def form_valid(self, form):
+        try:
+            return super().form_valid(form)
+        except IntegrityError:
+            # The form doesn't have dedupe_key, so it can't check the
+            # constraint on it itself
+            form.add_error("status", "The same task is already queued.")
+            self.produced_error_message = self.get_error_message()
+            return self.form_invalid(form)
+
+
+class QueuedTaskViewSet(ModelViewSet):
+    """
+    What's waiting, running and has failed. Editing a failed task's status
+    back to queued retries it.
+    """
+
+    model = QueuedTask
+    edit_view_class = QueuedTaskEditView
+    icon = "cogs"
+    menu_label = "Tasks"
+    add_to_settings_menu = True
+    copy_view_enabled = False
+    inspect_view_enabled = True
+    list_display = ["name", "status", "priority", "attempts", "run_after", "finished_at"]
+    list_filter = ["status"]
+    form_fields = ["status", "priority", "run_after", "max_attempts"]
+
+    @property
+    def permission_policy(self):
+        return QueuedTaskPermissionPolicy(self.model)
+
+
+@hooks.register("register_admin_viewset")
+def register_admin_viewset():
+    return QueuedTaskViewSet("tasks")
@@ -0,0 +1,341 @@
+import gzip
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.http import HttpResponse, HttpResponseNotFound
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from wagtail.contrib.redirects.models import Redirect
+from wagtail.models import Page, Site
+from wagtail.views import serve
+
+from core.middleware import (
+    IMMUTABLE_CACHE_CONTROL,
+    NotFoundCacheMiddleware,
+    PrecomputedResponseMiddleware,
+    RedirectTableMiddleware,
+    RoutingCacheMiddleware,
+    StaticFilesMiddleware,
+    invalidate_not_found,
+    invalidate_precomputed_responses,
+)
+from core.routing import VERSION_KEY as ROUTING_VERSION_KEY
+from core.routing import RoutingTable, current_table, invalidate_routing, request_table
+from core.storage import write_compressed_variants
+from core.versions import VERSIONS_CACHE, bump_version, get_version, get_versions
+from home import views as home_views
+from home.models import ModelCategory
+from home.views import page_not_found
+from links.models import LinkIndexPage, LinkPage
+from tests.utils import create_root_page, create_site
+
+
+class StaticFilesMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.static_root, "CACHE", "js"))
+        self.content = b"console.log('hello');\n" * 50
+        path = os.path.join(self.static_root, "CACHE", "js", "output.abc123.js")
+        with open(path, "wb") as f:
+            f.write(self.content)
+        write_compressed_variants(path)
+
+        self.settings = override_settings(DEBUG=False, STATIC_ROOT=self.static_root)
+        self.settings.enable()
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse("passed through"))
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.settings.disable()
+
+    def get(self, path="/static/CACHE/js/output.abc123.js", **headers):
+        return self.middleware(self.factory.get(path, headers=headers))
+
+    def test_serves_gzip_variant_with_immutable_headers(self):
+        response = self.get(accept_encoding="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), self.content)
+
+    def test_serves_identity_when_not_accepted(self):
+        response = self.get()
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+    def test_refused_encodings_not_served(self):
+        response = self.get(accept_encoding="br;q=0, gzip;q=0.5")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        response = self.get(accept_encoding="*;q=0.5, gzip;q=0, br;q=0")
+        self.assertNotIn("Content-Encoding", response)
+
+    def test_range_request(self):
+        response = self.get(range="bytes=0-6")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, b"console")
+        self.assertEqual(response["Content-Range"], f"bytes 0-6/{len(self.content)}")
+
+    def test_unsatisfiable_range(self):
+        response = self.get(range=f"bytes={len(self.content)}-")
+        self.assertEqual(response.status_code, 416)
+
+    def test_not_modified(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+
+    def test_unknown_files_are_passed_through(self):
+        self.assertEqual(self.get("/static/missing.js").content, b"passed through")
+
+
+class VersionTests(SimpleTestCase):
+    def test_versions_survive_the_default_cache(self):
+        version = get_version("test:version")
+        cache.clear()
+        self.assertEqual(get_version("test:version"), version)
+
+    def test_bumping_changes_the_version(self):
+        version = get_version("test:version")
+        bump_version("test:version")
+        self.assertNotEqual(get_version("test:version"), version)
+
+    def test_lost_versions_are_never_reused(self):
+        seen = set()
+        for _ in range(3):
+            seen.add(get_version("test:version"))
+            caches[VERSIONS_CACHE].clear()
+        self.assertEqual(len(seen), 3)
+
+    def test_get_versions(self):
+        bump_version("test:a", "test:b")
+        versions = get_versions("test:a", "test:b")
+        self.assertEqual(versions["test:a"], versions["test:b"])
+
+
+@override_settings(DEBUG=False, PRECOMPUTED_RESPONSES={"/robots.txt": "public, max-age=60"})
+class PrecomputedResponseMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.middleware = PrecomputedResponseMiddleware(lambda request: HttpResponse("passed through"))
+        self.factory = RequestFactory()
+
+    def get(self, path="/robots.txt", **headers):
+        return self.middleware(self.factory.get(path, headers=headers))
+
+    def test_serves_gzip_with_etag(self):
+        response = self.get(accept_encoding="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Cache-Control"], "public, max-age=60")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertIn(b"User-Agent: *", gzip.decompress(response.content))
+        self.assertTrue(response["ETag"].endswith('-gzip"'))
+
+    def test_refused_gzip_not_served(self):
+        response = self.get(accept_encoding="gzip;q=0")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertIn(b"User-Agent: *", response.content)
+
+    def test_not_modified(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+
+    def test_rendered_once(self):
+        self.get()
+        with self.assertNumQueries(0):
+            self.assertIn(b"User-Agent: *", self.get().content)
+
+    def test_invalidation(self):
+        self.get()
+        invalidate_precomputed_responses()
+        with self.assertNumQueries(1):
+            self.get()
+
+    def test_other_paths_are_passed_through(self):
+        self.assertEqual(self.get("/sitemap.xml").content, b"passed through")
+
+
+@override_settings(DEBUG=False)
+@mock.patch("home.views.render_not_found_page", return_value="<h2>Not found</h2>")
+class NotFoundCacheMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        home_views._not_found_pages.clear()
+        self.calls = []
+        self.middleware = NotFoundCacheMiddleware(self.get_response)
+        self.factory = RequestFactory()
+
+    def get_response(self, request):
+        self.calls.append(request.path)
+        if request.path == "/exists/":
+            return HttpResponse("found")
+        return page_not_found(request)
+
+    def get(self, path):
+        return self.middleware(self.factory.get(path))
+
+    def test_repeat_misses_skip_the_stack(self, render):
+        self.get("/wp-login.php")
+        response = self.get("/wp-login.php")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.content, b"<h2>Not found</h2>")
+        self.assertEqual(self.calls, ["/wp-login.php"])
+        # Rendered once, then served from memory
+        render.assert_called_once()
+
+    def test_found_paths_are_not_remembered(self, render):
+        self.get("/exists/")
+        self.get("/exists/")
+        self.assertEqual(self.calls, ["/exists/", "/exists/"])
+
+    def test_invalidation(self, render):
+        self.get("/new-page/")
+        invalidate_not_found()
+        self.get("/new-page/")
+        self.assertEqual(self.calls, ["/new-page/", "/new-page/"])
+
+    def test_bounded(self, render):
+        self.middleware.max_entries = 2
+        for path in ["/a", "/b", "/c"]:
+            self.get(path)
+        self.assertEqual([path for _host, path in self.middleware.missed], ["/b", "/c"])
+
+
+class RedirectTableMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        root = create_root_page()
+        cls.site = Site.objects.create(hostname="testserver", root_page=root, is_default_site=True)
+        cls.other_site = Site.objects.create(hostname="other.example.com", root_page=root)
+        Redirect.add_redirect("/old", "https://example.com/new")
+        Redirect.add_redirect("/old", "https://other.example.com/new", site=cls.other_site)
+        Redirect.add_redirect("/temporary", "/somewhere/", is_permanent=False)
+
+    def setUp(self):
+        cache.clear()
+        self.middleware = RedirectTableMiddleware(lambda request: HttpResponseNotFound())
+        self.factory = RequestFactory()
+
+    def get(self, path, host="testserver"):
+        return self.middleware(self.factory.get(path, headers={"host": host}))
+
+    def test_redirects_without_queries(self):
+        self.get("/warm-up/")
+        with self.assertNumQueries(0):
+            response = self.get("/old/?utm_source=x")
+            self.assertEqual(response.status_code, 301)
+            self.assertEqual(response["Location"], "https://example.com/new")
+            self.assertEqual(self.get("/random-probe.php").status_code, 404)
+
+    def test_site_specific_redirects_win(self):
+        self.assertEqual(self.get("/old/", host="other.example.com")["Location"], "https://other.example.com/new")
+
+    def test_temporary(self):
+        self.assertEqual(self.get("/temporary").status_code, 302)
+
+    def test_changes_are_picked_up(self):
+        self.get("/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Redirect.add_redirect("/added", "/elsewhere/")
+        self.assertEqual(self.get("/added/")["Location"], "/elsewhere/")
+
+    def test_import_command(self):
+        path = os.path.join(tempfile.mkdtemp(), "redirects.csv")
+        with open(path, "w") as f:
+            f.write("from,to,permanent\n/legacy/One/,/one/\n/legacy/two,/two/,302\n/old,/duplicate/\n")
+        self.get("/")
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("importredirects", path, stdout=StringIO())
+        self.assertEqual(Redirect.objects.count(), 5)
+        self.assertEqual(self.get("/legacy/One")["Location"], "/one/")
+        self.assertEqual(self.get("/legacy/two/").status_code, 302)
+
+
+class RoutingCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = create_site()
+        home = cls.site.root_page
+        cls.index_page = home.add_child(instance=LinkIndexPage(title="Links", slug="links"))
+        cls.link_page = cls.index_page.add_child(
+            instance=LinkPage(title="Oxford Geek Nights", slug="ogn", link="https://example.com", description="Talks")
+        )
+
+    def setUp(self):
+        cache.clear()
+        invalidate_routing()
+        self.table = RoutingTable.build(1)
+
+    def route(self, path):
+        return self.table.route(RequestFactory().get("/" + path), path)
+
+    def test_hit_is_one_query(self):
+        self.route("links/")
+        with self.assertNumQueries(1):
+            page, args, kwargs = self.route("links/ogn/")
+        self.assertEqual(page, self.link_page)
+        self.assertIsInstance(page, LinkPage)
+
+    def test_routable_page_sub_urls(self):
+        page, args, kwargs = self.route("links/data/")
+        self.assertEqual(page, self.index_page)
+        self.assertEqual(args[0].__name__, "directory_data")
+
+    def test_routes_come_before_child_pages(self):
+        # As Wagtail routes them, see RoutablePageMixin.route()
+        for slug in ["data", "category"]:
+            self.index_page.add_child(
+                instance=LinkPage(title=slug, slug=slug, link="https://example.com", description="-")
+            )
+        self.table = RoutingTable.build(1)
+        ModelCategory.objects.create(name="Meetups", slug="meetups")
+        for path, view_name in [("links/data/", "directory_data"), ("links/category/meetups/", "category_route")]:
+            with self.subTest(path=path):
+                page, args, kwargs = self.route(path)
+                self.assertEqual(page, self.index_page)
+                self.assertEqual(args[0].__name__, view_name)
+                self.assertEqual(Page.route_for_request(RequestFactory().get("/" + path), "/" + path)[0], page)
+        # Paths its routes don't match still reach the child page
+        self.assertEqual(self.route("links/category/")[0].slug, "category")
+
+    def test_missing_page(self):
+        self.assertIsNone(self.route("links/ogn/nope/"))
+
+    def test_changed_pages_fall_back(self):
+        self.link_page.save_revision().publish()
+        self.assertIs(self.route("links/ogn/"), False)
+
+    def test_middleware_hands_the_route_to_wagtail(self):
+        request = RequestFactory().get("/links/ogn/")
+        RoutingCacheMiddleware(lambda request: None).process_view(request, serve, ("links/ogn/",), {})
+        self.assertEqual(request._wagtail_route_for_request[0], self.link_page)
+        self.assertEqual(request._wagtail_site, self.site)
+
+    def test_page_urls_come_from_the_table(self):
+        self.assertEqual(self.table.url_parts(self.link_page), (self.site.pk, "http://testserver", "/links/ogn/"))
+        self.link_page.url
+        with self.assertNumQueries(0):
+            self.assertEqual(self.link_page.url, "/links/ogn/")
+            self.assertEqual(self.index_page.full_url, "http://testserver/links/")
+
+    def test_workers_pick_up_other_processes_changes(self):
+        table = current_table()
+        # As another process's invalidate_routing() would
+        bump_version(ROUTING_VERSION_KEY)
+        self.assertIs(current_table(), table)
+        with mock.patch("core.routing.CHECK_SECONDS", 0):
+            self.assertIsNot(current_table(), table)
+
+    def test_requests_use_one_table(self):
+        with request_table():
+            table = current_table()
+            bump_version(ROUTING_VERSION_KEY)
+            with mock.patch("core.routing.CHECK_SECONDS", 0):
+                self.assertIs(current_table(), table)
+
+    def test_unsaved_changes_use_wagtail(self):
+        self.link_page.slug = "oxford-geek-nights"
+        self.link_page.set_url_path(self.index_page)
+        self.assertIsNone(self.table.url_parts(self.link_page))
+        self.assertEqual(self.link_page.url, "/links/oxford-geek-nights/")
@@ -1,7 +1,34 @@
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management.base import CommandError
+from django.http import Http404
+from django.template import Context, RequestContext, Template
+from django.templatetags.static import static
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from wagtail.contrib.redirects.models import Redirect
+from wagtail.images.models import Image
+from wagtail.images.tests.utils import get_test_image_file_jpeg
+from wagtail.models import Collection
 from wagtail.test.utils import WagtailPageTestCase
+from wagtailmenus.models import FlatMenu, FlatMenuItem, MainMenu, MainMenuItem
+from wagtailseo.models import SeoSettings
 
-from home.models import BasicPage, HomePage
-from links.models import LinkIndexPage
+from core.routing import get_table, invalidate_routing
+from core.versions import VERSIONS_CACHE
+from home import sitemaps
+from home.critical_css import extract_critical_css, fold_selectors
+from home.images import get_renditions
+from home.management.commands.loadtest import URLSource, histogram, parse_mix
+from home.management.commands.warmcache import parse_since
+from home.models import BasicPage, HomePage, ModelCategory
+from home.richtext import richtext_version
+from home.views import ServiceWorkerView, render_not_found_page, sitemap
+from links.models import LinkIndexPage, LinkPage, LinkPageCategory
+from tests.utils import create_site
 
 
 class HomePageTests(WagtailPageTestCase):
@@ -26,3 +53,387 @@ class BasicPageTests(WagtailPageTestCase):
     # def test_cant_create_under_job_index_page(self):
     #     # You can not create a BasicPage under the JobIndexPage
     #     self.assertCanNotCreateAt(BasicPage, JobIndexPage)
+
+
+class LoadTestCommandTests(SimpleTestCase):
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("home=3,robots"), {"home": 3, "robots": 1})
+
+    def test_parse_mix_rejects_unknown_kinds(self):
+        with self.assertRaises(CommandError):
+            parse_mix("home=1,admin=2")
+
+    def test_histogram_buckets(self):
+        buckets = dict(histogram([0.0005, 0.003, 0.003, 10.0]))
+        self.assertEqual(buckets[1], 1)
+        self.assertEqual(buckets[5], 2)
+        self.assertEqual(buckets[None], 1)
+
+
+class LoadTestURLSourceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        home = create_site().root_page
+        index_page = home.add_child(instance=LinkIndexPage(title="Links", slug="links"))
+        link_page = index_page.add_child(
+            instance=LinkPage(title="Oxford Geek Nights", slug="ogn", link="https://example.com", description="Talks")
+        )
+        LinkPageCategory.objects.create(
+            page=link_page, link_category=ModelCategory.objects.create(name="Meetups", slug="meetups")
+        )
+
+    def test_category_pages_at_their_own_urls(self):
+        rng = mock.Mock(random=lambda: 0, choice=lambda items: items[0])
+        self.assertEqual(URLSource(rng).directory_path(), "/links/category/meetups/")
+
+
+class WarmCacheCommandTests(SimpleTestCase):
+    def test_parse_since_duration(self):
+        since = parse_since("2h")
+        self.assertAlmostEqual((timezone.now() - since).total_seconds(), 7200, delta=5)
+
+    def test_parse_since_datetime(self):
+        self.assertEqual(parse_since("2024-01-02T03:04:05+00:00").year, 2024)
+
+    def test_parse_since_invalid(self):
+        with self.assertRaises(CommandError):
+            parse_since("yesterday")
+
+
+class CriticalCSSTests(SimpleTestCase):
+    css = (
+        "/*! comment */html{color:red}.links{margin:0}.footer a{color:blue}"
+        "@media screen and (min-width: 768px){.links li:hover{margin:1px}.other{margin:2px}}"
+        '@font-face{font-family:"PT Sans";src:url("fonts/pt-sans-400.woff2")}'
+    )
+
+    def test_fold_selectors_stop_at_the_fold(self):
+        tags, classes, ids = fold_selectors(
+            '<body><ul class="links" id="x"><li>One</li></ul><div class="footer"></div></body>', 3
+        )
+        self.assertEqual(classes, {"links"})
+        self.assertEqual(ids, {"x"})
+        self.assertIn("li", tags)
+
+    def test_extract_critical_css(self):
+        critical = extract_critical_css(self.css, {"html", "body", "ul", "li"}, {"links"}, set())
+        self.assertEqual(
+            critical,
+            "html{color:red}.links{margin:0}"
+            "@media screen and (min-width: 768px){.links li:hover{margin:1px}}"
+            '@font-face{font-family:"PT Sans";src:url("fonts/pt-sans-400.woff2")}',
+        )
+
+
+@override_settings(
+    STORAGES={
+        **settings.STORAGES,
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    }
+)
+class ServiceWorkerTests(TestCase):
+    def test_serviceworker_precaches_static_files(self):
+        response = ServiceWorkerView.as_view()(RequestFactory().get("/serviceworker.js")).render()
+        self.assertEqual(response["Content-Type"], "application/javascript")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertContains(response, f'"{static("offline.html")}"')
+        self.assertContains(response, "const version = '")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ResponsiveImageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Tests run without migrations, so there's no root collection
+        Collection.get_first_root_node() or Collection.add_root(name="Root")
+        cls.image = Image.objects.create(title="Banner", file=get_test_image_file_jpeg(size=(1000, 600)))
+
+    def test_widths_are_capped_at_the_original(self):
+        sources = get_renditions(self.image, "banner")
+        self.assertEqual(set(sources), {None, "avif", "webp"})
+        self.assertEqual([width for width, _ in sources["avif"]], [480, 800, 1000])
+        self.assertTrue(sources["avif"][0][1].url.endswith(".avif"))
+
+    def test_picture_tag(self):
+        html = Template('{% load image_tags %}{% picture image "banner" alt="Oxford" fetchpriority="high" %}').render(
+            Context({"image": self.image})
+        )
+        self.assertIn('<source type="image/avif" srcset="', html)
+        self.assertIn('<source type="image/webp" srcset="', html)
+        self.assertIn('width="1000"', html)
+        self.assertIn('height="600"', html)
+        self.assertIn('sizes="100vw"', html)
+        self.assertIn('alt="Oxford"', html)
+        self.assertIn('fetchpriority="high"', html)
+
+    def test_og_image_only_has_fallback(self):
+        self.assertEqual(list(get_renditions(self.image, "og")), [None])
+
+
+class MenuCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = create_site()
+        home = cls.site.root_page
+        cls.index_page = home.add_child(instance=LinkIndexPage(title="Links", slug="links", show_in_menus=True))
+        main_menu = MainMenu.objects.create(site=cls.site)
+        MainMenuItem.objects.create(menu=main_menu, link_page=cls.index_page, sort_order=0)
+        MainMenuItem.objects.create(menu=main_menu, link_url="/search/", link_text="Search", sort_order=1)
+        flat_menu = FlatMenu.objects.create(site=cls.site, title="Footer", handle="secondary_menu", heading="More")
+        FlatMenuItem.objects.create(menu=flat_menu, link_url="/privacy/", link_text="Privacy", sort_order=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, path, template="{% load menu_cache_tags %}{% cached_main_menu %}"):
+        return Template(template).render(RequestContext(RequestFactory().get(path)))
+
+    def test_active_classes_come_from_the_path(self):
+        self.assertRegex(self.render("/links/some-link/"), r'"navigation-item ancestor">\s*<a href="/links/">Links</a>')
+        self.assertRegex(self.render("/search/"), r'"navigation-item active">\s*<a href="/search/">Search</a>')
+
+    def test_not_found_page_has_no_active_item(self):
+        MainMenuItem.objects.create(menu=MainMenu.objects.get(), link_url="/", link_text="Home", sort_order=2)
+        self.assertRegex(self.render("/"), r'"navigation-item active">\s*<a href="/">Home</a>')
+        cache.clear()
+        # The page's template needs the static files collected otherwise
+        static = {"staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}}
+        with self.settings(STORAGES={**settings.STORAGES, **static}):
+            html = render_not_found_page(RequestFactory().get("/missing/"))
+        self.assertIn('<a href="/">Home</a>', html)
+        self.assertNotIn("navigation-item active", html)
+
+    def test_cached_render_runs_no_queries(self):
+        self.render("/")
+        with self.assertNumQueries(0):
+            self.render("/search/")
+
+    def test_publishing_invalidates(self):
+        self.render("/")
+        self.index_page.title = "Directory"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.index_page.save_revision().publish()
+        self.assertIn(">Directory</a>", self.render("/"))
+
+    def test_flat_menu(self):
+        html = self.render("/privacy/", "{% load menu_cache_tags %}{% cached_flat_menu 'secondary_menu' %}")
+        self.assertIn("<h4>More</h4>", html)
+        # Like wagtailmenus, flat menus don't get active classes by default
+        self.assertIn('<li class="navigation-item ">', html)
+
+
+class RichTextCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        home = create_site().root_page
+        cls.about = home.add_child(instance=BasicPage(title="About", slug="about"))
+        cls.page = home.add_child(
+            instance=BasicPage(
+                title="Contact", slug="contact", body=f'<p><a linktype="page" id="{cls.about.pk}">Us</a></p>'
+            )
+        )
+        cls.page.save_revision().publish()
+
+    def setUp(self):
+        cache.clear()
+        # The table could be from a test that's been rolled back since
+        invalidate_routing()
+        # As served, with its live revision
+        self.page = BasicPage.objects.get(pk=self.page.pk)
+
+    def render(self, page=None, **attrs):
+        # As RoutingCacheMiddleware does for each request
+        get_table()
+        request = RequestFactory().get("/contact/")
+        for name, value in attrs.items():
+            setattr(request, name, value)
+        template = Template('{% load richtext_tags %}{% cached_richtext page "body" %}')
+        return template.render(RequestContext(request, {"page": page or self.page}))
+
+    def test_cached_render_runs_no_queries(self):
+        html = self.render()
+        self.assertIn('<a href="/about/">Us</a>', html)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render(), html)
+
+    def test_linked_page_moving_invalidates(self):
+        self.render()
+        self.about.slug = "about-us"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.about.save_revision().publish()
+        self.assertIn('<a href="/about-us/">Us</a>', self.render())
+
+    def test_publishing_other_pages_keeps_the_cache(self):
+        self.render()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.about.save_revision().publish()
+        get_table()
+        with self.assertNumQueries(0):
+            self.render()
+
+    def test_only_page_deletes_invalidate(self):
+        version = richtext_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Redirect.objects.create(old_path="/old").delete()
+        self.assertEqual(richtext_version(), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.about.delete()
+        self.assertNotEqual(richtext_version(), version)
+        self.assertIn("<a>Us</a>", self.render())
+
+    def test_new_revision_and_previews_not_served_stale(self):
+        self.render()
+        self.page.body = "<p>Changed</p>"
+        self.assertIn("Changed", self.render(is_preview=True))
+        self.page.save_revision().publish()
+        self.assertIn("Changed", self.render(BasicPage.objects.get(pk=self.page.pk)))
+
+
+class SeoCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = create_site()
+        home = cls.site.root_page
+        cls.page = home.add_child(instance=BasicPage(title="About", slug="about"))
+        cls.page.save_revision().publish()
+
+    def setUp(self):
+        cache.clear()
+        # As served, with its live revision
+        self.page = BasicPage.objects.get(pk=self.page.pk)
+
+    def render(self, page=None, **attrs):
+        # As RoutingCacheMiddleware does for each request
+        get_table()
+        request = RequestFactory().get("/about/")
+        for name, value in attrs.items():
+            setattr(request, name, value)
+        page = page or self.page
+        template = Template(
+            '{% load seo_tags %}{% cached_seo_include "wagtailseo/meta.html" %}'
+            '{% cached_seo_include "wagtailseo/struct_org_data.html" %}'
+        )
+        return template.render(RequestContext(request, {"page": page, "self": page}))
+
+    def test_cached_render_runs_no_queries(self):
+        html = self.render()
+        self.assertIn("<title>About", html)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render(), html)
+
+    def test_settings_change_invalidates(self):
+        self.assertIn('<meta property="og:title" content="About', self.render())
+        with self.captureOnCommitCallbacks(execute=True):
+            seo_settings = SeoSettings.for_site(self.site)
+            seo_settings.og_meta = False
+            seo_settings.save()
+        self.assertNotIn("og:title", self.render())
+
+    def test_category_rename_invalidates(self):
+        # As LinkIndexPage's category route titles the page, for the same
+        # path and revision
+        category = ModelCategory.objects.create(name="Meetups", slug="meetups")
+        self.page.seo_title = category.name
+        self.assertIn("<title>Meetups", self.render())
+        with self.captureOnCommitCallbacks(execute=True):
+            category.name = "Gatherings"
+            category.save()
+        self.page.seo_title = category.name
+        self.assertIn("<title>Gatherings", self.render())
+
+    def test_publishing_and_previews_not_served_stale(self):
+        self.render()
+        self.page.title = "About us"
+        self.assertIn("<title>About us", self.render(is_preview=True))
+        self.page.save_revision().publish()
+        self.assertIn("<title>About us", self.render(BasicPage.objects.get(pk=self.page.pk)))
+
+    def test_non_page_context(self):
+        request = RequestFactory().get("/search/")
+        html = Template('{% load seo_tags %}{% cached_seo_include "wagtailseo/meta.html" %}').render(
+            RequestContext(request)
+        )
+        # Rendered as the include would be
+        self.assertIn("<title></title>", html)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class SitemapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        home = create_site().root_page
+        cls.index_page = home.add_child(instance=LinkIndexPage(title="Links", slug="links"))
+        cls.link_page = cls.index_page.add_child(
+            instance=LinkPage(title="Oxford Geek Nights", slug="ogn", link="https://example.com", description="Talks")
+        )
+        cls.link_page.save_revision().publish()
+
+    def setUp(self):
+        cache.clear()
+        invalidate_routing()
+
+    def get(self, section="index", **headers):
+        response = sitemap(RequestFactory().get("/sitemap.xml", headers=headers), section)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, content.decode()
+
+    def test_index_lists_shards(self):
+        response, content = self.get()
+        shard = self.link_page.pk // sitemaps.SHARD_SIZE
+        self.assertIn("<loc>http://testserver/sitemap-pages.xml</loc>", content)
+        self.assertIn(f"<loc>http://testserver/sitemap-links-{shard}.xml</loc>", content)
+        self.link_page.refresh_from_db()
+        self.assertIn(f"<lastmod>{self.link_page.last_published_at.date().isoformat()}</lastmod>", content)
+
+    def test_sections(self):
+        _, pages = self.get("pages")
+        self.assertIn("<loc>http://testserver/links/</loc>", pages)
+        self.assertNotIn("/links/ogn/", pages)
+        _, links = self.get(sitemaps.section_for_page(self.link_page))
+        self.assertIn("<loc>http://testserver/links/ogn/</loc>", links)
+        with self.assertRaises(Http404):
+            self.get("nonsense")
+
+    def test_unicode_slugs_percent_encoded(self):
+        page = self.index_page.get_parent().add_child(instance=BasicPage(title="Café", slug="café"))
+        page.save_revision().publish()
+        _, pages = self.get("pages")
+        self.assertIn("<loc>http://testserver/caf%C3%A9/</loc>", pages)
+
+    def test_unknown_shards_get_no_version(self):
+        shard = self.link_page.pk // sitemaps.SHARD_SIZE + 1
+        with self.assertRaises(Http404):
+            self.get(f"links-{shard}")
+        self.assertIsNone(caches[VERSIONS_CACHE].get(sitemaps._version_key(f"links-{shard}")))
+
+    def test_cached_with_conditional_get(self):
+        section = sitemaps.section_for_page(self.link_page)
+        response, content = self.get(section)
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(0):
+            cached, cached_content = self.get(section)
+            self.assertEqual(cached_content, content)
+            self.assertEqual(self.get(section, if_none_match=response["ETag"])[0].status_code, 304)
+
+    def test_publishing_only_invalidates_its_shard(self):
+        pages_etag = self.get("pages")[0]["ETag"]
+        links_etag = self.get(sitemaps.section_for_page(self.link_page))[0]["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.link_page.save_revision().publish()
+        self.assertEqual(self.get("pages")[0]["ETag"], pages_etag)
+        self.assertNotEqual(self.get(sitemaps.section_for_page(self.link_page))[0]["ETag"], links_etag)
+
+    def test_renaming_a_parent_invalidates_every_shard(self):
+        links_etag = self.get(sitemaps.section_for_page(self.link_page))[0]["ETag"]
+        self.index_page.slug = "directory"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.index_page.save_revision().publish()
+        response, content = self.get(sitemaps.section_for_page(self.link_page))
+        self.assertNotEqual(response["ETag"], links_etag)
+        self.assertIn("<loc>http://testserver/directory/ogn/</loc>", content)
+
+    def test_big_sitemaps_not_cached(self):
+        section = sitemaps.section_for_page(self.link_page)
+        with mock.patch("home.views.SITEMAP_CACHE_MAX_SIZE", 100):
+            self.assertTrue(self.get(section)[0].streaming)
+            self.assertTrue(self.get(section)[0].streaming)
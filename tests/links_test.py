@@ -1,7 +1,46 @@
+import gzip
+import importlib
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.session import SessionStorage
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.http import Http404
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django_htmx.middleware import HtmxDetails
+from taggit.models import Tag
+from wagtail.models import Site
 from wagtail.test.utils import WagtailPageTestCase
 
-from home.models import BasicPage, HomePage
-from links.models import LinkIndexPage, LinkPage
+from core.middleware import NOT_FOUND_VERSION_KEY
+from core.versions import get_version
+from home.models import BasicPage, HomePage, ModelCategory
+from home.richtext import invalidate_richtext
+from home.seo import invalidate_seo
+from home.warmup import directory_urls
+from links import clicks
+from links.bundle import bundle_name, bundle_storage, write_bundle
+from links.duplicates import canonical_url, near_duplicates, url_hash
+from links.filters import SORTS
+from links.listing import LinkRow
+from links.models import LinkClicks, LinkIndexPage, LinkPage, LinkPageCategory
+from links.related import LAST_RUN_KEY, update_related_links
+from links.scores import popularity, refresh_link_scores
+from links.views import go
+from links.wagtail_hooks import linkpage_viewset, warn_about_duplicate_links
+from tests.utils import create_home_page, create_site
 
 
 class LinkIndexPageTests(WagtailPageTestCase):
@@ -26,3 +65,535 @@ class LinkPageTests(WagtailPageTestCase):
     def test_link_page_parent_pages(self):
         # A LinkPage can only be created under a LinkIndexPage
         self.assertAllowedParentPageTypes(LinkPage, {LinkIndexPage})
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DirectoryDataTests(WagtailPageTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        home = create_site().root_page
+        cls.index_page = home.add_child(instance=LinkIndexPage(title="Links", slug="links"))
+        cls.category = ModelCategory.objects.create(name="Meetups", slug="meetups")
+        cls.link_page = cls.index_page.add_child(
+            instance=LinkPage(title="Oxford Geek Nights", slug="ogn", link="https://example.com", description="Talks")
+        )
+        LinkPageCategory.objects.create(page=cls.link_page, link_category=cls.category)
+
+    def test_bundle_contents(self):
+        data = write_bundle(self.index_page)
+        self.assertEqual(data["categories"], [[self.category.pk, "meetups", "Meetups"]])
+        link = dict(zip(data["fields"], data["links"][0]))
+        self.assertEqual(link["title"], "Oxford Geek Nights")
+        self.assertEqual(link["categories"], [self.category.pk])
+
+    def get_data(self, **headers):
+        return self.index_page.directory_data(RequestFactory().get("/links/data/", headers=headers))
+
+    def test_served_gzipped_with_etag(self):
+        response = self.get_data(accept_encoding="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(response["ETag"], f'"{data["version"]}"')
+        self.assertEqual(self.get_data(if_none_match=response["ETag"]).status_code, 304)
+
+    def test_rewritten_in_place(self):
+        write_bundle(self.index_page)
+        # As another process writing at the same time would
+        name = bundle_name(self.index_page)
+        self.assertEqual(bundle_storage().save(name, ContentFile(b"{}")), name)
+        write_bundle(self.index_page)
+        directory = os.path.join(settings.MEDIA_ROOT, "directory")
+        self.assertEqual(
+            sorted(os.listdir(directory)),
+            [f"links-{self.index_page.pk}.json", f"links-{self.index_page.pk}.json.gz"],
+        )
+
+    def test_deleting_a_category_rewrites(self):
+        write_bundle(self.index_page)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        self.assertEqual(json.loads(self.get_data().content)["categories"], [])
+
+    def test_renaming_a_tag_rewrites(self):
+        self.link_page.tags.add("Open Source")
+        self.link_page.save()
+        write_bundle(self.index_page)
+        tag = Tag.objects.get(name="Open Source")
+        tag.name = "Free Software"
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+        self.assertEqual(json.loads(self.get_data().content)["tags"], [[tag.pk, "Free Software"]])
+
+    def test_route(self):
+        self.assertEqual(self.index_page.reverse_subpage("directory_data"), "data/")
+        view, args, kwargs = self.index_page.resolve_subpage("/data/")
+        self.assertEqual(view.__name__, "directory_data")
+
+    def test_publishing_changes_version(self):
+        version = write_bundle(self.index_page)["version"]
+        self.link_page.title = "Oxford Geek Nights!"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.link_page.save_revision().publish()
+        response = self.get_data()
+        self.assertNotEqual(response["ETag"], f'"{version}"')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DirectoryRouteTests(WagtailPageTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        home = create_site().root_page
+        cls.index_page = home.add_child(instance=LinkIndexPage(title="Links", slug="links"))
+        meetups = ModelCategory.objects.create(name="Meetups", slug="meetups")
+        ModelCategory.objects.create(name="Empty", slug="empty")
+        link_page = LinkPage(title="Oxford Geek Nights", slug="ogn", link="https://example.com", description="Talks")
+        link_page.tags.add("Open Source")
+        cls.index_page.add_child(instance=link_page)
+        LinkPageCategory.objects.create(page=link_page, link_category=meetups)
+        cls.index_page.add_child(
+            instance=LinkPage(title="Uncategorised", slug="uncategorised", link="https://example.org", description="-")
+        )
+
+    def get(self, url, **headers):
+        request = RequestFactory().get(url, headers=headers)
+        request.user = AnonymousUser()
+        request.htmx = HtmxDetails(request)
+        page, args, kwargs = self.index_page.route(request, [part for part in request.path.split("/")[2:] if part])
+        return page.serve(request, *args, **kwargs)
+
+    def titles(self, response):
+        return [link.title for link in response.context_data["links"]]
+
+    def test_category(self):
+        response = self.get("/links/category/meetups/")
+        self.assertEqual(self.titles(response), ["Oxford Geek Nights"])
+        self.assertEqual(response.context_data["filter"].form["category"].value(), "meetups")
+        self.assertEqual(self.index_page.seo_canonical_url, f"{settings.BASE_URL}/links/category/meetups/")
+
+        response = self.get("/links/category/meetups/", if_none_match=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_tag(self):
+        response = self.get("/links/tag/open-source/")
+        self.assertEqual(self.titles(response), ["Oxford Geek Nights"])
+
+    def test_unknown_or_empty_category(self):
+        for url in ["/links/category/nope/", "/links/category/empty/", "/links/tag/nope/"]:
+            with self.subTest(url=url), self.assertRaises(Http404):
+                self.get(url)
+
+    def test_bad_sort_ignored(self):
+        response = self.get("/links/category/meetups/?sort=nope")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.titles(response), ["Oxford Geek Nights"])
+        self.assertFalse(response.context_data["filter"].form.errors)
+
+    def test_query_string_redirects(self):
+        response = self.get("/links/?category=meetups&page=1")
+        self.assertEqual((response.status_code, response["Location"]), (301, "/links/category/meetups/?page=1"))
+
+    def test_htmx_pushes_url(self):
+        response = self.get("/links/?category=meetups", hx_request="true")
+        self.assertEqual(response["HX-Push-Url"], "/links/category/meetups/")
+        self.assertContains(response, '<a href="/links/category/meetups/">Meetups</a>', html=True)
+        self.assertNotContains(response, "Uncategorised")
+        # Keeping the rest of the query
+        response = self.get("/links/?category=meetups&sort=popular", hx_request="true")
+        self.assertEqual(response["HX-Push-Url"], "/links/category/meetups/?sort=popular")
+
+    def test_etags_differ(self):
+        urls = ["/links/", "/links/category/meetups/", "/links/tag/open-source/"]
+        self.assertEqual(len({self.get(url)["ETag"] for url in urls}), len(urls))
+
+    def test_new_release_changes_etag(self):
+        etag = self.get("/links/")["ETag"]
+        with mock.patch("links.models.release_version", return_value="next"):
+            self.assertNotEqual(self.get("/links/")["ETag"], etag)
+
+    def test_seo_and_richtext_changes_change_etag(self):
+        for invalidate in [invalidate_seo, invalidate_richtext]:
+            with self.subTest(invalidate=invalidate.__name__):
+                etag = self.get("/links/")["ETag"]
+                invalidate()
+                self.assertNotEqual(self.get("/links/")["ETag"], etag)
+
+    def test_warmed_category_urls(self):
+        self.assertEqual(directory_urls(self.index_page, Site.objects.get()), ["/links/", "/links/category/meetups/"])
+
+    def test_new_category_forgets_missed_path(self):
+        version = get_version(NOT_FOUND_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            ModelCategory.objects.create(name="Talks", slug="talks")
+        self.assertNotEqual(get_version(NOT_FOUND_VERSION_KEY), version)
+
+    def test_new_scores_change_popular_etag(self):
+        link_page = LinkPage.objects.get(slug="ogn")
+        link_page.save_revision().publish()
+        etag, popular_etag = self.get("/links/")["ETag"], self.get("/links/?sort=popular")["ETag"]
+        LinkClicks.objects.create(link=link_page, date=timezone.localdate(), clicks=4)
+        self.assertEqual(refresh_link_scores(), 1)
+        self.assertEqual(self.get("/links/")["ETag"], etag)
+        self.assertNotEqual(self.get("/links/?sort=popular")["ETag"], popular_etag)
+
+
+class LinkListingTests(WagtailPageTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        home = create_site().root_page
+        cls.index_page = home.add_child(instance=LinkIndexPage(title="Links", slug="links"))
+        meetups = ModelCategory.objects.create(name="Meetups", slug="meetups")
+        events = ModelCategory.objects.create(name="Events", slug="events")
+        cls.link_page = cls.index_page.add_child(
+            instance=LinkPage(title="Oxford Geek Nights", slug="ogn", link="https://example.com", description="Talks")
+        )
+        LinkPageCategory.objects.create(page=cls.link_page, link_category=meetups)
+        LinkPageCategory.objects.create(page=cls.link_page, link_category=events)
+        cls.index_page.add_child(
+            instance=LinkPage(title="Uncategorised", slug="uncategorised", link="https://example.org", description="-")
+        )
+
+    def setUp(self):
+        # Page URLs are worked out once, then cached
+        self.index_page.url
+
+    def get_links(self, **params):
+        return self.index_page.get_context(RequestFactory().get("/links/", params))["links"]
+
+    def test_rows_in_one_query(self):
+        with self.assertNumQueries(2):
+            # The count for the paginator, then the rows with their categories
+            links = list(self.get_links())
+        self.assertIsInstance(links[0], LinkRow)
+        self.assertEqual([category.slug for category in links[0].categories], ["events", "meetups"])
+        self.assertEqual(links[1].categories, ())
+
+    def test_filtering_keeps_every_category(self):
+        links = list(self.get_links(category="meetups"))
+        self.assertEqual([link.title for link in links], ["Oxford Geek Nights"])
+        self.assertEqual(len(links[0].categories), 2)
+
+    def test_sorts(self):
+        LinkPage.objects.filter(pk=self.link_page.pk).update(popularity=1)
+        self.assertEqual([link.title for link in self.get_links(sort="popular")][0], "Oxford Geek Nights")
+        # Added after it
+        self.assertEqual([link.title for link in self.get_links(sort="added")][0], "Uncategorised")
+
+
+class SlugColumnTests(WagtailPageTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        home = create_home_page()
+        index_page = home.add_child(instance=LinkIndexPage(title="Links", slug="links"))
+        cls.meetups = ModelCategory.objects.create(name="Meetups", slug="meetups")
+        cls.events = ModelCategory.objects.create(name="Events", slug="events")
+        cls.link_page = index_page.add_child(
+            instance=LinkPage(title="Oxford Geek Nights", slug="ogn", link="https://example.com", description="Talks")
+        )
+        LinkPageCategory.objects.create(page=cls.link_page, link_category=cls.meetups)
+
+    def get_slugs(self):
+        return LinkPage.objects.values_list("category_slugs", "tag_slugs").get(pk=self.link_page.pk)
+
+    def test_categories_saved_separately(self):
+        self.assertEqual(self.get_slugs(), ("|meetups|", ""))
+
+    def test_publishing(self):
+        self.link_page.categories = [
+            LinkPageCategory(link_category=self.events),
+            LinkPageCategory(link_category=self.meetups),
+        ]
+        self.link_page.tags.add("Open Source")
+        self.link_page.save_revision().publish()
+        self.assertEqual(self.get_slugs(), ("|events|meetups|", "|open-source|"))
+
+    def test_draft_leaves_live_slugs(self):
+        self.link_page.categories = [LinkPageCategory(link_category=self.events)]
+        self.link_page.save_revision()
+        self.assertEqual(self.get_slugs(), ("|meetups|", ""))
+
+    def test_category_renamed(self):
+        self.meetups.slug = "meet-ups"
+        self.meetups.save()
+        self.assertEqual(self.get_slugs(), ("|meet-ups|", ""))
+
+    def test_category_deleted(self):
+        self.meetups.delete()
+        self.assertEqual(self.get_slugs(), ("", ""))
+
+
+class QueryPlanTests(WagtailPageTestCase):
+    """
+    The directory and admin listing queries should be answered from indexes,
+    without reading or sorting a whole table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        home = create_site().root_page
+        cls.index_page = home.add_child(instance=LinkIndexPage(title="Links", slug="links"))
+        meetups = ModelCategory.objects.create(name="Meetups", slug="meetups")
+        link_page = cls.index_page.add_child(
+            instance=LinkPage(title="Oxford Geek Nights", slug="ogn", link="https://example.com", description="Talks")
+        )
+        LinkPageCategory.objects.create(page=link_page, link_category=meetups)
+
+        # ...nor the indexes on Wagtail's page table, which are raw SQL
+        migration = importlib.import_module("links.migrations.0006_linkpagecategory_indexes")
+        with connection.cursor() as cursor:
+            for _name, sql in migration.PAGE_INDEXES:
+                cursor.execute(sql)
+            cursor.execute(importlib.import_module("links.migrations.0010_linkpage_popularity").FIRST_PUBLISHED_INDEX)
+
+    def setUp(self):
+        self.index_page.url
+
+    def assertUsesIndexes(self, sql, params=()):
+        if connection.vendor != "sqlite":
+            self.skipTest("Checks SQLite's query plans")
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        for step in plan:
+            if step.startswith("SCAN"):
+                self.assertIn("INDEX", step, plan)
+        if "ORDER BY" in sql:
+            # The rows should come out of an index in order, not be sorted
+            self.assertFalse(any("TEMP B-TREE FOR" in step and "ORDER BY" in step for step in plan), plan)
+
+    def assertDirectoryUsesIndexes(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            list(self.index_page.get_context(RequestFactory().get("/links/", params))["links"])
+        for query in queries:
+            self.assertUsesIndexes(query["sql"])
+
+    def test_directory(self):
+        self.assertDirectoryUsesIndexes()
+
+    def test_directory_filtered_by_category(self):
+        self.assertDirectoryUsesIndexes(category="meetups")
+
+    def test_directory_sorted(self):
+        for sort in SORTS:
+            with self.subTest(sort=sort):
+                self.assertDirectoryUsesIndexes(sort=sort)
+
+    def test_admin_listing(self):
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        for ordering in ["-last_published_at", "latest_revision_created_at"]:
+            with self.subTest(ordering=ordering):
+                request = RequestFactory().get(reverse("links:index_results"), {"ordering": ordering})
+                request.user = user
+                # The admin's templates need the static files collected otherwise
+                static = {"staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}}
+                with self.settings(STORAGES={**settings.STORAGES, **static}):
+                    with CaptureQueriesContext(connection) as queries:
+                        linkpage_viewset.index_results_view(request).render()
+                column = f'"wagtailcore_page"."{ordering.lstrip("-")}"'
+                listing = [query["sql"] for query in queries if f"ORDER BY {column}" in query["sql"]]
+                self.assertTrue(listing)
+                for sql in listing:
+                    self.assertUsesIndexes(sql)
+
+
+class RelatedLinksTests(WagtailPageTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        home = create_site().root_page
+        cls.index_page = home.add_child(instance=LinkIndexPage(title="Links", slug="links"))
+        meetups = ModelCategory.objects.create(name="Meetups", slug="meetups")
+        cls.pages = {}
+        for slug, description, category in [
+            ("ogn", "Evening talks about technology", meetups),
+            ("oxjs", "Evening talks about JavaScript", meetups),
+            ("bodleian", "A library", None),
+            ("museum", "A museum of natural history", None),
+        ]:
+            cls.pages[slug] = cls.index_page.add_child(
+                instance=LinkPage(title=slug, slug=slug, link="https://example.com", description=description)
+            )
+            if category:
+                LinkPageCategory.objects.create(page=cls.pages[slug], link_category=category)
+
+    def setUp(self):
+        cache.delete(LAST_RUN_KEY)
+
+    def related(self, slug):
+        return [page.title for page in self.pages[slug].get_context(RequestFactory().get("/"))["related_links"]]
+
+    def test_most_similar_first(self):
+        self.assertEqual(update_related_links(), 4)
+        self.assertEqual(self.related("ogn"), ["oxjs"])
+        self.assertEqual(self.related("bodleian"), [])
+
+    def test_one_query_to_show(self):
+        update_related_links()
+        self.pages["oxjs"].url
+        with self.assertNumQueries(1):
+            self.assertEqual(self.related("oxjs"), ["ogn"])
+
+    def test_incremental(self):
+        update_related_links()
+        # Nothing has been published since
+        self.assertEqual(update_related_links(), 0)
+
+        museum = self.pages["museum"]
+        museum.description = "A library and museum"
+        museum.save_revision().publish()
+        self.assertEqual(update_related_links(), 2)
+        self.assertEqual(self.related("bodleian"), ["museum"])
+
+    def test_category_rename_redone(self):
+        update_related_links()
+        category = ModelCategory.objects.get(slug="meetups")
+        category.slug = "gatherings"
+        category.save()
+        self.assertEqual(update_related_links(), 2)
+
+    def test_unpublished_link_dropped(self):
+        update_related_links()
+        self.pages["oxjs"].unpublish()
+        self.assertEqual(update_related_links(), 1)
+        self.assertEqual(self.related("ogn"), [])
+
+
+class ClickTests(WagtailPageTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        home = create_home_page()
+        index_page = home.add_child(instance=LinkIndexPage(title="Links", slug="links"))
+        cls.link_page = index_page.add_child(
+            instance=LinkPage(title="Oxford Geek Nights", slug="ogn", link="https://example.com", description="Talks")
+        )
+
+    def setUp(self):
+        # No flushing in the background while the tests run
+        patcher = mock.patch.object(clicks, "_flusher_pid", os.getpid())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        clicks._counts.clear()
+
+    def go(self, link_id):
+        return go(RequestFactory().get(f"/go/{link_id}/"), link_id)
+
+    def test_redirects_without_writing(self):
+        with self.assertNumQueries(1):
+            response = self.go(self.link_page.pk)
+        self.assertEqual((response.status_code, response["Location"]), (302, "https://example.com"))
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_unknown_link(self):
+        with self.assertRaises(Http404):
+            self.go(self.link_page.pk + 1)
+
+    def test_flush_adds_to_daily_count(self):
+        self.go(self.link_page.pk)
+        self.go(self.link_page.pk)
+        self.assertEqual(clicks.flush(), 1)
+        self.go(self.link_page.pk)
+        clicks.flush()
+        self.assertEqual(self.link_page.daily_clicks.get().clicks, 3)
+        # Nothing more to write
+        self.assertEqual(clicks.flush(), 0)
+
+    def test_popularity(self):
+        self.link_page.save_revision().publish()
+        LinkClicks.objects.create(link=self.link_page, date=timezone.localdate(), clicks=4)
+        # Only live today
+        self.assertEqual(refresh_link_scores(), 1)
+        self.link_page.refresh_from_db()
+        self.assertEqual(self.link_page.popularity, 4)
+
+        # Kept when a revision is published
+        self.link_page.save_revision().publish()
+        self.link_page.refresh_from_db()
+        self.assertEqual(self.link_page.popularity, 4)
+        self.assertEqual(refresh_link_scores(), 0)
+
+    def test_older_clicks_count_less(self):
+        self.assertEqual(popularity({0: 1}, 1), 1)
+        self.assertAlmostEqual(popularity({7: 2}, 14), popularity({0: 1}, 14))
+        self.assertEqual(popularity({}, 0), 0)
+
+    def test_deleted_link_dropped(self):
+        self.go(self.link_page.pk)
+        self.link_page.delete()
+        self.assertEqual(clicks.flush(), 0)
+
+    def test_failed_flush_keeps_counts(self):
+        self.go(self.link_page.pk)
+        with mock.patch.object(clicks.refresh_link_scores, "enqueue", side_effect=OperationalError("locked")):
+            with self.assertRaises(OperationalError):
+                clicks.flush()
+        self.assertFalse(LinkClicks.objects.exists())
+        self.go(self.link_page.pk)
+        self.assertEqual(clicks.flush(), 1)
+        self.assertEqual(self.link_page.daily_clicks.get().clicks, 2)
+
+
+class DuplicateTests(WagtailPageTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        home = create_home_page()
+        cls.index_page = home.add_child(instance=LinkIndexPage(title="Links", slug="links"))
+        cls.link_page = cls.index_page.add_child(
+            instance=LinkPage(
+                title="Oxford Geek Nights",
+                slug="ogn",
+                link="https://www.oxfordgeeknights.com/",
+                description="Evening talks about technology, design and the web in Oxford",
+            )
+        )
+
+    def test_canonical_url(self):
+        for url in [
+            "http://oxfordgeeknights.com",
+            "https://WWW.oxfordgeeknights.com:443/index.html",
+            "https://oxfordgeeknights.com/?utm_source=newsletter#talks",
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(canonical_url(url), "oxfordgeeknights.com")
+        self.assertEqual(canonical_url("https://example.com/a/?b=2&a=1&fbclid=x"), "example.com/a?a=1&b=2")
+        self.assertNotEqual(url_hash("https://example.com/a/"), url_hash("https://example.com/b/"))
+
+    def test_duplicates_found_by_hash(self):
+        duplicate = LinkPage(title="OGN", link="http://oxfordgeeknights.com?utm_medium=email", description="-")
+        with self.assertNumQueries(1):
+            self.assertEqual(list(duplicate.get_duplicates()), [self.link_page])
+        self.assertEqual(list(self.link_page.get_duplicates()), [])
+
+    def test_admin_warning(self):
+        duplicate = self.index_page.add_child(
+            instance=LinkPage(title="OGN", slug="ogn-2", link="http://oxfordgeeknights.com", description="-")
+        )
+        request = RequestFactory().get("/")
+        request.session = {}
+        request._messages = SessionStorage(request)
+        warn_about_duplicate_links(request, duplicate)
+        [message] = list(request._messages)
+        self.assertIn("Oxford Geek Nights", message.message)
+        self.assertIn(f"/pages/{self.link_page.pk}/edit/", message.message)
+
+    def test_near_duplicates(self):
+        texts = {
+            1: "Oxford Geek Nights: evening talks about technology, design and the web in Oxford",
+            2: "Oxford Geek Nights - evening talks about technology, design and the web, in Oxford",
+            3: "A museum of natural history",
+        }
+        pairs = near_duplicates(texts)
+        self.assertEqual([(pk, other) for _similarity, pk, other in pairs], [(1, 2)])
+
+    def test_report(self):
+        self.index_page.add_child(
+            instance=LinkPage(
+                title="Oxford Geek Nights",
+                slug="ogn-again",
+                link="http://oxfordgeeknights.com",
+                description="Evening talks about technology, design and the web in Oxford",
+            )
+        )
+        output = StringIO()
+        call_command("findduplicatelinks", stdout=output)
+        self.assertIn("1 sites with more than one link", output.getvalue())
+        self.assertIn("1 pairs of links with similar titles and descriptions", output.getvalue())
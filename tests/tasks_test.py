@@ -0,0 +1,171 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.session import SessionStorage
+from django.core import mail
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from django_tasks import task as django_task
+
+from tasks.backends import QueueBackend
+from tasks.mail import QueuedEmailBackend
+from tasks.models import QueuedTask
+from tasks.queue import claim, requeue_abandoned, run, task
+from tasks.wagtail_hooks import QueuedTaskViewSet
+
+calls = []
+
+
+@task(dedupe_key=lambda value: f"record:{value}")
+def record(value):
+    calls.append(value)
+
+
+@task(priority=5)
+def urgent(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def explode():
+    raise ValueError("Boom")
+
+
+@django_task()
+def wagtail_style(value):
+    calls.append(value)
+
+
+@override_settings(TASKS_IMMEDIATE=False)
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_is_one_insert(self):
+        with self.assertNumQueries(1):
+            record.enqueue("a")
+        queued_task = QueuedTask.objects.get()
+        self.assertEqual((queued_task.name, queued_task.args), ("tests.tasks_test.record", ["a"]))
+
+    def test_dedupe_while_queued(self):
+        record.enqueue("a")
+        record.enqueue("a")
+        record.enqueue("b")
+        self.assertEqual(QueuedTask.objects.count(), 2)
+
+        # Once it's running, the same work can be queued again
+        claim("worker")
+        record.enqueue("a")
+        self.assertEqual(QueuedTask.objects.filter(status=QueuedTask.Status.QUEUED).count(), 2)
+
+    def test_claim_order(self):
+        record.enqueue("later")
+        urgent.enqueue("first")
+        QueuedTask.objects.filter(args=["later"]).update(run_after=timezone.now() + timedelta(hours=1))
+        record.enqueue("second")
+
+        claimed = [claim("worker") for _ in range(3)]
+        self.assertEqual([queued_task.args for queued_task in claimed[:2]], [["first"], ["second"]])
+        # Not due yet
+        self.assertIsNone(claimed[2])
+
+    def test_claimed_once(self):
+        record.enqueue("a")
+        self.assertIsNotNone(claim("one"))
+        self.assertIsNone(claim("two"))
+
+    def test_run(self):
+        record.enqueue("a")
+        self.assertTrue(run(claim("worker")))
+        self.assertEqual(calls, ["a"])
+        queued_task = QueuedTask.objects.get()
+        self.assertEqual((queued_task.status, queued_task.attempts), (QueuedTask.Status.SUCCEEDED, 1))
+
+    def test_retry_with_backoff(self):
+        explode.enqueue()
+        self.assertFalse(run(claim("worker")))
+        queued_task = QueuedTask.objects.get()
+        self.assertEqual(queued_task.status, QueuedTask.Status.QUEUED)
+        self.assertGreater(queued_task.run_after, timezone.now() + timedelta(seconds=20))
+        self.assertIn("Boom", queued_task.last_error)
+
+        QueuedTask.objects.update(run_after=timezone.now())
+        self.assertFalse(run(claim("worker")))
+        queued_task.refresh_from_db()
+        self.assertEqual((queued_task.status, queued_task.attempts), (QueuedTask.Status.FAILED, 2))
+
+    def test_abandoned_tasks_requeued(self):
+        record.enqueue("a")
+        claim("worker")
+        QueuedTask.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+        requeue_abandoned()
+        self.assertEqual(claim("another").claimed_by, "another")
+
+    def test_abandoned_tasks_fail_after_max_attempts(self):
+        explode.enqueue()
+        for _ in range(2):
+            claim("worker")
+            QueuedTask.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+            requeue_abandoned()
+        queued_task = QueuedTask.objects.get()
+        self.assertEqual((queued_task.status, queued_task.attempts), (QueuedTask.Status.FAILED, 2))
+        self.assertIsNone(claim("worker"))
+
+    def test_django_tasks_backend(self):
+        backend = QueueBackend("default", {})
+        backend.enqueue(wagtail_style, ["a"], {})
+        backend.enqueue(wagtail_style, ["a"], {})
+        self.assertEqual(QueuedTask.objects.count(), 1)
+        run(claim("worker"))
+        self.assertEqual(calls, ["a"])
+
+    @override_settings(TASKS_EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+    def test_queued_email(self):
+        message = mail.EmailMultiAlternatives("Hello", "Text", "from@example.com", ["to@example.com"])
+        message.attach_alternative("<p>HTML</p>", "text/html")
+        QueuedEmailBackend().send_messages([message])
+        self.assertEqual(len(mail.outbox), 0)
+
+        run(claim("worker"))
+        self.assertEqual(mail.outbox[0].subject, "Hello")
+        self.assertEqual(mail.outbox[0].alternatives[0][0], "<p>HTML</p>")
+
+    def test_runtasks(self):
+        record.enqueue("a")
+        urgent.enqueue("b")
+        call_command("runtasks", "--once", stdout=StringIO())
+        self.assertEqual(calls, ["b", "a"])
+
+    def test_runtasks_waits_out_a_locked_database(self):
+        record.enqueue("a")
+        with (
+            mock.patch("tasks.management.commands.runtasks.claim", side_effect=[OperationalError("locked"), None]),
+            mock.patch("tasks.management.commands.runtasks.time.sleep") as sleep,
+        ):
+            call_command("runtasks", "--once", stdout=StringIO())
+        sleep.assert_called_once()
+
+    def test_requeueing_a_duplicate_shows_an_error(self):
+        QueuedTask.objects.create(name="tasks_test.record", dedupe_key="record:a")
+        failed = QueuedTask.objects.create(
+            name="tasks_test.record", dedupe_key="record:a", status=QueuedTask.Status.FAILED
+        )
+        data = {"status": "queued", "priority": 0, "run_after": "2026-01-01 00:00:00", "max_attempts": 3}
+        request = RequestFactory().post("/admin/tasks/", data)
+        request.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        request.session = {}
+        request._messages = SessionStorage(request)
+        # The admin's templates need the static files collected otherwise
+        static = {"staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}}
+        with self.settings(STORAGES={**settings.STORAGES, **static}):
+            response = QueuedTaskViewSet("tasks").edit_view(request, pk=failed.pk)
+            response.render()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("The same task is already queued.", response.content.decode())
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, QueuedTask.Status.FAILED)
@@ -0,0 +1,23 @@
+from wagtail.models import Locale, Page, Site
+
+from home.models import HomePage
+
+
+def create_root_page():
+    # Tests run without migrations, so there's no locale or root page
+    Locale.objects.get_or_create(language_code="en-gb")
+    return Page.get_first_root_node() or Page.add_root(instance=Page(title="Root"))
+
+
+def create_home_page():
+    """
+    A HomePage under the root page, without a site.
+    """
+    return create_root_page().add_child(instance=HomePage(title="Home", slug="home"))
+
+
+def create_site():
+    """
+    The default site, for testserver, with a new HomePage as its root page.
+    """
+    return Site.objects.create(hostname="testserver", root_page=create_home_page(), is_default_site=True)